@@ -0,0 +1,217 @@
+"""
+Admission control for audio ingestion.
+
+Every `audio_data` event costs decode and VAD work, and every utterance
+costs a Whisper decode, so one misbehaving client can starve everyone
+else. Two limits keep the server responsive:
+
+- `RateLimiter`: a token bucket per connection on audio bytes per second.
+  Chunks over the limit are dropped before any numpy work is done.
+- `TranscriptionAdmission`: a global cap on concurrent transcriptions.
+  Jobs beyond the cap wait in a bounded queue. Once a queue forms,
+  admitted jobs are marked degraded, so the caller can shed work (a
+  smaller model, no refinement). When the queue is full, jobs are
+  rejected and the client is told the server is busy. Speculative
+  decodes take a slot only if one is free: they never queue and are
+  never degraded.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+NORMAL, DEGRADED, BUSY = "normal", "degraded", "busy"
+
+
+class TokenBucket:
+    """Refills at `rate` tokens per second, holding at most `burst`."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, amount: float) -> bool:
+        """Spend amount tokens if they are available."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if amount > self.tokens:
+            return False
+        self.tokens -= amount
+        return True
+
+
+class RateLimiter:
+    """
+    Per-connection token buckets on bytes per second. The burst must be
+    larger than the biggest single chunk a client sends.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._buckets: Dict[Hashable, TokenBucket] = {}
+        self._limited: Dict[Hashable, bool] = {}
+        self._lock = threading.Lock()
+
+        # Metrics
+        self.accepted_bytes = 0
+        self.rejected_bytes = 0
+        self.rejected_chunks = 0
+
+    def allow(self, key: Hashable, size: int) -> bool:
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+            allowed = bucket.take(size)
+            if allowed:
+                self.accepted_bytes += size
+            else:
+                self.rejected_bytes += size
+                self.rejected_chunks += 1
+            return allowed
+
+    def limit_changed(self, key: Hashable, allowed: bool) -> bool:
+        """True the first time a connection is throttled, and again when it recovers."""
+        with self._lock:
+            changed = self._limited.get(key, False) == allowed
+            self._limited[key] = not allowed
+            return changed
+
+    def drop(self, key: Hashable):
+        """Forget a connection's bucket."""
+        with self._lock:
+            self._buckets.pop(key, None)
+            self._limited.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "connections": len(self._buckets),
+                "throttled": sum(self._limited.values()),
+                "accepted_bytes": self.accepted_bytes,
+                "rejected_bytes": self.rejected_bytes,
+                "rejected_chunks": self.rejected_chunks,
+            }
+
+
+class Ticket:
+    """A granted transcription slot."""
+
+    def __init__(self, degraded: bool, waited: float):
+        self.degraded = degraded  # the caller should shed optional work
+        self.waited = waited  # seconds spent queued
+
+
+class TranscriptionAdmission:
+    """
+    Caps concurrent transcriptions at max_in_flight, with up to max_queued
+    jobs waiting at most queue_timeout seconds for a slot. A job is
+    degraded if it had to wait, or if the load when it was admitted
+    (running plus waiting jobs, itself included) reached degrade_at.
+    Lower degrade_at to start shedding before the slots run out.
+    """
+
+    def __init__(self, max_in_flight: int = 2, max_queued: int = 4, queue_timeout: float = 5.0,
+                 degrade_at: Optional[int] = None):
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.degrade_at = degrade_at or max_in_flight + 1
+        self.in_flight = 0
+        self.waiting = 0
+        self._cond = threading.Condition()
+
+        # Metrics
+        self.admitted = 0
+        self.degraded = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.speculative_skipped = 0
+        self.wait_seconds = 0.0
+
+    def acquire(self, speculative: bool = False) -> Optional[Ticket]:
+        """
+        Wait for a slot; None means the server is too busy to take the job.
+        A speculative job doesn't wait: it gets a free slot, at full
+        quality, or None.
+        """
+        start = time.monotonic()
+        queued = False
+        with self._cond:
+            if speculative:
+                if self.in_flight >= self.max_in_flight or self.waiting:
+                    self.speculative_skipped += 1
+                    return None
+                self.in_flight += 1
+                self.admitted += 1
+                return Ticket(degraded=False, waited=0.0)
+            if self.in_flight >= self.max_in_flight:
+                queued = True
+                if self.waiting >= self.max_queued:
+                    self.rejected += 1
+                    return None
+                self.waiting += 1
+                try:
+                    admitted = self._cond.wait_for(lambda: self.in_flight < self.max_in_flight,
+                                                   timeout=self.queue_timeout)
+                finally:
+                    self.waiting -= 1
+                if not admitted:
+                    self.rejected += 1
+                    self.timed_out += 1
+                    return None
+
+            self.in_flight += 1
+            load = self.in_flight + self.waiting
+            waited = time.monotonic() - start
+            ticket = Ticket(degraded=queued or load >= self.degrade_at, waited=waited)
+            self.admitted += 1
+            self.degraded += ticket.degraded
+            self.wait_seconds += waited
+        if ticket.degraded:
+            logger.info("Transcription admitted degraded (load %d)", load)
+        return ticket
+
+    def release(self, ticket: Ticket):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    @contextmanager
+    def admit(self, speculative: bool = False):
+        """Hold a slot for the duration of the block; yields None if rejected."""
+        ticket = self.acquire(speculative)
+        try:
+            yield ticket
+        finally:
+            if ticket is not None:
+                self.release(ticket)
+
+    def level(self) -> str:
+        """NORMAL while there is a free slot, DEGRADED while jobs queue, BUSY once the queue is full."""
+        with self._cond:
+            if self.in_flight < self.max_in_flight:
+                return NORMAL
+            return BUSY if self.waiting >= self.max_queued else DEGRADED
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "in_flight": self.in_flight,
+                "waiting": self.waiting,
+                "max_in_flight": self.max_in_flight,
+                "max_queued": self.max_queued,
+                "admitted": self.admitted,
+                "degraded": self.degraded,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "speculative_skipped": self.speculative_skipped,
+                "wait_seconds": self.wait_seconds,
+            }
@@ -1,234 +1,803 @@
-from flask import Flask, render_template, request, redirect, url_for, session as flask_session
+from flask import Flask, Response, jsonify, render_template, request, redirect, url_for, session as flask_session
 from flask_socketio import SocketIO, emit
+import functools
+import logging
 import os
-from speechrecognition import SpeechRecognizer
-from database import init_db, create_session, store_interaction, get_session_interactions, store_entities, get_all_sessions, get_session_entities
-from entity_extraction import EntityExtractor
-from assistant_responses import AssistantResponder
+import threading
+import time
+from datetime import date, timedelta
+from database import init_db, create_session, store_interaction, get_session_interactions, store_entities, get_all_sessions, get_session_entities, resume_session
+from database import end_session as end_db_session
+from archive import ArchiveReader, export_closed_sessions
+from user_deletion import DeletionJobs
+from components import Component, ComponentRegistry
+from admission import NORMAL, RateLimiter, TranscriptionAdmission
+import metrics
+from metrics import span
+from logging_setup import configure_logging, log_context, bind, SAMPLED
+
+configure_logging()
+logger = logging.getLogger(__name__)
 
 # Initialize Flask app
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'speech-recognition-secret'
-socketio = SocketIO(app, cors_allowed_origins="*")
+# With several web processes, a shared message queue (e.g. redis://localhost:6379/0)
+# lets any process emit to clients connected to another one
+socketio = SocketIO(app, cors_allowed_origins="*", message_queue=os.getenv('SOCKETIO_MESSAGE_QUEUE'))
 
 # Initialize Database
-db_path = os.path.join(os.path.dirname(__file__), 'speech_app.db')
+db_path = os.getenv('DATABASE_PATH', os.path.join(os.path.dirname(__file__), 'speech_app.db'))
 Session = init_db(db_path)
 
+# Closed sessions are moved to compressed archive files to keep the live database small
+archive_dir = os.getenv('ARCHIVE_DIR', os.path.join(os.path.dirname(__file__), 'archive'))
+archive_reader = ArchiveReader(archive_dir)
+
+def run_archiver(interval_hours, older_than_days):
+    """Periodically archive sessions that closed more than older_than_days ago"""
+    while True:
+        try:
+            export_closed_sessions(Session, archive_dir, timedelta(days=older_than_days))
+        except Exception:
+            logger.exception("Error archiving sessions")
+        time.sleep(interval_hours * 3600)
+
+if os.getenv('ARCHIVE_INTERVAL_HOURS'):
+    threading.Thread(
+        target=run_archiver,
+        args=(float(os.getenv('ARCHIVE_INTERVAL_HOURS')), float(os.getenv('ARCHIVE_AFTER_DAYS', '7'))),
+        daemon=True
+    ).start()
+
 # Initialize components
-speech_recognizer = SpeechRecognizer()
-entity_extractor = EntityExtractor()
-assistant_responder = AssistantResponder(Session)
+# Nothing heavy is built at import so the HTTP surface comes up quickly.
+# Each component below is built on first use, or sooner by the warm-up
+# thread (WARM_UP=0 disables it); /ready reports which ones are warm.
+warm_up = os.getenv('WARM_UP', '1') == '1'
+components = ComponentRegistry(warm_steps=warm_up)
+
+def build_model_manager():
+    """
+    Whisper models are loaded on first use; short utterances can go to a
+    smaller model than long ones, and CPU inference can be int8-quantized.
+    When TRANSCRIPTION_BROKER is set, decoding is handed to a separate pool
+    of worker processes instead (see transcription_queue.py / serve.py).
+    """
+    if os.getenv('TRANSCRIPTION_BROKER'):
+        from transcription_queue import RemoteTranscriber
+        return RemoteTranscriber(
+            os.getenv('TRANSCRIPTION_BROKER'),
+            authkey=os.getenv('TRANSCRIPTION_BROKER_AUTHKEY', 'speech-recognition').encode(),
+            on_message=handle_broadcast
+        )
+    from model_manager import model_manager_from_env
+    return model_manager_from_env()
+
+def build_speech_recognizer():
+    """
+    WHISPER_REFINE_MODEL (e.g. small) re-decodes only the low-confidence
+    segments of an utterance; WHISPER_WORD_TIMESTAMPS=1 keeps word timings.
+    WHISPER_PROFILE picks the decoding profile (default or low_latency) and
+    WHISPER_LANGUAGE fixes the language instead of detecting it.
+    """
+    from speechrecognition import SpeechRecognizer
+    return SpeechRecognizer(
+        model_manager=model_manager.get(),
+        speculation_pause=speculation_pause,
+        refine_model=os.getenv('WHISPER_REFINE_MODEL') or None,
+        word_timestamps=os.getenv('WHISPER_WORD_TIMESTAMPS', '0') == '1',
+        profile=os.getenv('WHISPER_PROFILE', 'default'),
+        language=os.getenv('WHISPER_LANGUAGE') or None,
+        shed_model=os.getenv('WHISPER_SHED_MODEL') or os.getenv('WHISPER_MODEL', 'tiny')
+    )
+
+def build_entity_extractor():
+    from entity_extraction import EntityExtractor
+    return EntityExtractor()
+
+def build_assistant_responder():
+    """
+    Replies to repeated short prompts are cached (RESPONSE_CACHE_SIZE=0
+    disables it). RESPONSE_CACHE_SIMILARITY (e.g. 0.95) also reuses the
+    reply to a prompt whose embedding is at least that similar, embedded
+    through the RAG store at RAG_DB_PATH.
+    """
+    from assistant_responses import AssistantResponder
+    from response_cache import ResponseCache
+    cache = None
+    if int(os.getenv('RESPONSE_CACHE_SIZE', '256')) > 0:
+        embed, similarity = None, os.getenv('RESPONSE_CACHE_SIMILARITY')
+        if similarity:
+            embed = rag_store.get().generate_embedding
+        cache = ResponseCache(
+            max_entries=int(os.getenv('RESPONSE_CACHE_SIZE', '256')),
+            ttl_seconds=float(os.getenv('RESPONSE_CACHE_TTL', '3600')),
+            embed=embed,
+            similarity=float(similarity or 0.95)
+        )
+    return AssistantResponder(Session, cache=cache)
+
+def build_tts_service():
+    """Replies are spoken in the browser: synthesized by sentence and streamed as audio frames"""
+    from tts import tts_service_from_env
+    return tts_service_from_env()
+
+def transcribe_speculatively(audio, **options):
+    """Decode for a speculation, in a transcription slot that is free right now"""
+    with admission.admit(speculative=True) as ticket:
+        if ticket is None:
+            raise RuntimeError("No free transcription slot for speculation")
+        return model_manager.transcribe(audio, **options)
+
+def build_speculator():
+    from speculation import SpeculativeRunner
+    return SpeculativeRunner(
+        transcribe_speculatively,
+        assistant_responder.draft_response,
+        prepare=entity_extractor.extract_entities
+    )
+
+def build_rag():
+    from rag import RAG
+    return RAG(rag_db_path)
+
+def build_llm_client():
+    from llm_client import get_client
+    return get_client()
+
+def fallback_response():
+    from assistant_responses import FALLBACK_RESPONSE
+    return FALLBACK_RESPONSE
+
+# Optional speculative mode: start decoding and drafting a reply after a
+# short pause (e.g. SPECULATIVE_PAUSE=0.3) instead of the full silence window
+speculation_pause = float(os.getenv('SPECULATIVE_PAUSE', '0')) or None
+
+# Registration order is warm-up order: cheap components first, so a slow
+# Whisper load doesn't hold up the rest (and TTS workers fork before it)
+llm_client = components.register('llm_client', build_llm_client)
+entity_extractor = components.register('entity_extractor', build_entity_extractor)
+assistant_responder = components.register('assistant_responder', build_assistant_responder)
+tts_service = components.register('tts', build_tts_service, required=False,
+                                  warm=lambda tts: tts.warm([fallback_response()]))
+model_manager = components.register('whisper', build_model_manager, warm=lambda m: m.warm_up())
+speech_recognizer = components.register('speech_recognizer', build_speech_recognizer)
+speculator = components.register('speculator', build_speculator) if speculation_pause else None
+rag_db_path = os.getenv('RAG_DB_PATH', os.path.join(os.path.dirname(__file__), 'rag.db'))
+# Not registered for warm-up: building it creates the store's database file
+rag_store = Component('rag', build_rag, required=False)
 
-# Active session
-current_session_id = None
+def forget_cached(session_ids, texts):
+    """Drop a deleted user's replies and transcripts from the in-memory caches of every web process"""
+    session_ids, texts = list(session_ids), list(texts)
+    # Web processes behind the same transcription broker each have their own caches.
+    # One that never connected to it has never transcribed, so has nothing cached
+    if os.getenv('TRANSCRIPTION_BROKER'):
+        try:
+            model_manager.get().broadcast(('forget_cached', session_ids, texts))
+        except Exception:
+            logger.exception("Could not send the cache purge to the other web processes")
+    return forget_cached_locally(session_ids, texts)
+
+def forget_cached_locally(session_ids, texts):
+    """Drop a deleted user's replies and transcripts from this process's in-memory caches"""
+    removed = 0
+    # A cold component has nothing cached, and building one here would be wasted work
+    for component in (assistant_responder, entity_extractor):
+        if component.loaded:
+            removed += component.forget(session_ids, texts)
+    return removed
+
+def handle_broadcast(message):
+    """A message another web process sent through the transcription broker"""
+    kind, *args = message
+    if kind == 'forget_cached':
+        forget_cached_locally(*args)
+
+# GDPR erasure requests run in the background, one user at a time. Embeddings
+# only exist where a RAG store was set up, so only then is it cleaned too.
+uses_rag = os.path.exists(rag_db_path) or bool(os.getenv('RESPONSE_CACHE_SIMILARITY'))
+deletion_jobs = DeletionJobs(Session, rag=rag_store if uses_rag else None, archive_dir=archive_dir,
+                             forget_cached=forget_cached)
+
+if warm_up:
+    components.warm_up_async()
+
+# Admission control: each connection may send at most AUDIO_RATE_LIMIT bytes
+# of audio per second (0 = unlimited), and at most TRANSCRIPTION_MAX_IN_FLIGHT
+# utterances are decoded at once, by default one per Whisper instance in the
+# pool (WHISPER_POOL_SIZE). Further utterances queue, transcribed with less
+# work (WHISPER_SHED_MODEL, no refinement), and are rejected with a 'busy'
+# status once TRANSCRIPTION_MAX_QUEUED are already waiting. Speculative
+# decodes only run in a slot that is free.
+audio_rate_limit = float(os.getenv('AUDIO_RATE_LIMIT', str(256 * 1024)))
+rate_limiter = RateLimiter(
+    rate=audio_rate_limit,
+    burst=float(os.getenv('AUDIO_RATE_BURST', str(2 * audio_rate_limit)))
+) if audio_rate_limit > 0 else None
+admission = TranscriptionAdmission(
+    max_in_flight=int(os.getenv('TRANSCRIPTION_MAX_IN_FLIGHT') or os.getenv('WHISPER_POOL_SIZE', '2')),
+    max_queued=int(os.getenv('TRANSCRIPTION_MAX_QUEUED', '4')),
+    queue_timeout=float(os.getenv('TRANSCRIPTION_QUEUE_TIMEOUT', '5')),
+    degrade_at=int(os.getenv('TRANSCRIPTION_DEGRADE_AT', '0')) or None
+)
+
+# Send per-turn stage timings to the client's debug panel
+ATTACH_TIMINGS = os.getenv('DEBUG_TIMINGS', '1') == '1'
+
+def collect_component_metrics():
+    """Report cache, model and audio buffer state alongside the stage histograms"""
+    with connection_sessions_lock:
+        connections = len(connection_sessions)
+    readiness = components.readiness()['components']
+    families = [
+        ('socket_connections', 'gauge', 'Connected Socket.IO clients.',
+         [({}, connections)]),
+        ('component_ready', 'gauge', '1 once a deferred component is built and warmed up.',
+         [({'component': name}, 1 if status['state'] == 'ready' else 0) for name, status in readiness.items()]),
+    ]
+    admitted = admission.stats()
+    families += [
+        ('transcriptions_in_flight', 'gauge', 'Utterances being transcribed or waiting for a slot.',
+         [({'state': 'running'}, admitted['in_flight']), ({'state': 'queued'}, admitted['waiting'])]),
+        ('transcription_admissions_total', 'counter', 'Transcription admission decisions.',
+         [({'outcome': 'admitted'}, admitted['admitted'] - admitted['degraded']),
+          ({'outcome': 'degraded'}, admitted['degraded']),
+          ({'outcome': 'rejected'}, admitted['rejected']),
+          ({'outcome': 'speculation_skipped'}, admitted['speculative_skipped'])]),
+        ('transcription_queue_wait_seconds_total', 'counter', 'Time utterances spent waiting for a slot.',
+         [({}, admitted['wait_seconds'])]),
+    ]
+    if rate_limiter:
+        limited = rate_limiter.stats()
+        families += [
+            ('audio_received_bytes_total', 'counter', 'Audio bytes received, by rate limit outcome.',
+             [({'result': 'accepted'}, limited['accepted_bytes']), ({'result': 'rejected'}, limited['rejected_bytes'])]),
+            ('audio_rate_limited_connections', 'gauge', 'Connections currently over the audio rate limit.',
+             [({}, limited['throttled'])]),
+        ]
+    # Scraping must not build anything, so components still cold are skipped
+    if entity_extractor.loaded:
+        cache = entity_extractor.cache_stats()
+        families += [
+            ('entity_cache_lookups_total', 'counter', 'Entity extraction cache lookups.',
+             [({'result': 'hit'}, cache['hits']), ({'result': 'miss'}, cache['misses'])]),
+            ('entity_cache_coalesced_total', 'counter', 'Extraction requests that joined an in-flight call.',
+             [({}, cache['coalesced'])]),
+            ('entity_cache_entries', 'gauge', 'Entries in the entity extraction cache.',
+             [({}, cache['size'])]),
+        ]
+    responses = assistant_responder.cache_stats() if assistant_responder.loaded else None
+    if responses:
+        families += [
+            ('response_cache_lookups_total', 'counter', 'Assistant response cache lookups.',
+             [({'result': 'hit'}, responses['hits']), ({'result': 'miss'}, responses['misses'])]),
+            ('response_cache_similar_hits_total', 'counter', 'Response cache hits found by embedding similarity.',
+             [({}, responses['similar_hits'])]),
+            ('response_cache_hit_ratio', 'gauge', 'Share of response cache lookups that hit.',
+             [({}, responses['hit_rate'])]),
+            ('response_cache_turn_lookups_total', 'counter',
+             'Response cache lookups by turn type (opening turns are shared, follow-ups per session).',
+             [({'turn': turn, 'result': result}, counts[result + 's'])
+              for turn, counts in responses['turns'].items() for result in ('hit', 'miss')]),
+            ('response_cache_saved_seconds_total', 'counter', 'LLM latency avoided by serving cached replies.',
+             [({}, responses['saved_seconds'])]),
+            ('response_cache_entries', 'gauge', 'Entries in the assistant response cache.',
+             [({}, responses['size'])]),
+        ]
+    if model_manager.loaded:
+        models = model_manager.stats()
+        families.append(
+            ('whisper_real_time_factor', 'gauge', 'Decode time divided by audio time per model.',
+             [({'model': name}, stats['real_time_factor']) for name, stats in models.items()
+              if stats['real_time_factor'] is not None]))
+    if speech_recognizer.loaded:
+        memory = speech_recognizer.memory_stats()
+        families.append(
+            ('audio_buffer_bytes', 'gauge', 'Audio buffer memory across connections.',
+             [({'kind': 'allocated'}, memory['total_capacity_bytes']),
+              ({'kind': 'used'}, memory['total_used_bytes'])]))
+    if tts_service.loaded:
+        tts = tts_service.stats()
+        families += [
+            ('tts_phrase_cache_lookups_total', 'counter', 'Synthesized phrase cache lookups.',
+             [({'result': 'hit'}, tts['cache']['hits']), ({'result': 'miss'}, tts['cache']['misses'])]),
+            ('tts_sentences_synthesized_total', 'counter', 'Sentences rendered by the TTS workers.',
+             [({}, tts['synthesized'])]),
+        ]
+    if speculator and speculator.loaded:
+        speculation = speculator.stats()
+        families.append(
+            ('speculations_total', 'counter', 'Speculative turns by outcome.',
+             [({'outcome': outcome}, speculation[outcome]) for outcome in ('started', 'used', 'cancelled')]))
+    if llm_client.loaded:
+        llm = llm_client.stats()
+        families += [
+            ('llm_requests_total', 'counter', 'LLM API calls by outcome.',
+             [({'outcome': 'call'}, llm['calls']), ({'outcome': 'retry'}, llm['retries']),
+              ({'outcome': 'failure'}, llm['failures'])]),
+            ('llm_requests_in_flight', 'gauge', 'LLM API requests currently being sent.',
+             [({}, llm['in_flight'])]),
+            ('llm_circuit_open', 'gauge', '1 while the LLM circuit breaker is rejecting calls.',
+             [({}, 0 if llm['circuit'] == 'closed' else 1)]),
+        ]
+    return families
+
+metrics.REGISTRY.register_collector(collect_component_metrics)
+
+def timed_emit(*args, **kwargs):
+    """emit() that records its time under the 'emit' stage"""
+    with span('emit'):
+        emit(*args, **kwargs)
+
+# Conversation session bound to each Socket.IO connection (sid -> session id)
+connection_sessions = {}
+connection_sessions_lock = threading.Lock()
 
 @app.route('/')
 def index():
     """Render the main application page"""
-    global current_session_id
+    session_id = flask_session.get('session_id')
     
     # Check if we need to create a new session
-    if 'session_id' not in flask_session or not current_session_id:
+    if not session_id or not resume_session(Session, session_id):
         db_session = create_session(Session)
-        current_session_id = db_session.id
-        flask_session['session_id'] = current_session_id
-        print(f"Created new session with ID: {current_session_id}")
+        session_id = db_session.id
+        flask_session['session_id'] = session_id
+        logger.info("Created new session %s", session_id)
     else:
-        current_session_id = flask_session['session_id']
-        print(f"Using existing session with ID: {current_session_id}")
+        logger.debug("Using existing session %s", session_id)
     
-    return render_template('index.html', session_id=current_session_id)
+    return render_template('index.html', session_id=session_id)
 
 @app.route('/end_session')
 def end_session():
     """End the current session and start a new one"""
-    global current_session_id
+    if flask_session.get('session_id'):
+        end_db_session(Session, flask_session['session_id'])
     
     # Create a new session
     db_session = create_session(Session)
-    current_session_id = db_session.id
-    flask_session['session_id'] = current_session_id
-    print(f"Started new session with ID: {current_session_id}")
+    flask_session['session_id'] = db_session.id
+    logger.info("Started new session %s", db_session.id)
     
     return redirect(url_for('index'))
 
+def bind_connection_session(sid):
+    """Bind a Socket.IO connection to the conversation session in its Flask cookie"""
+    session_id = flask_session.get('session_id')
+    if not session_id or not resume_session(Session, session_id):
+        session_id = create_session(Session).id
+        flask_session['session_id'] = session_id
+        logger.info("Created new session %s for connection %s", session_id, sid)
+    
+    with connection_sessions_lock:
+        connection_sessions[sid] = session_id
+    return session_id
+
+def release_connection_session(sid):
+    """Forget a connection's session, ending it if no other connection still uses it"""
+    with connection_sessions_lock:
+        session_id = connection_sessions.pop(sid, None)
+        still_open = session_id in connection_sessions.values()
+    
+    if session_id and not still_open:
+        end_db_session(Session, session_id)
+        logger.info("Ended session %s", session_id)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Expose pipeline latency histograms in Prometheus text format"""
+    return Response(metrics.REGISTRY.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/ready')
+def ready():
+    """Readiness probe: 200 once every required component is warm, 503 until then"""
+    readiness = components.readiness()
+    return jsonify(readiness), 200 if readiness['ready'] else 503
+
+@app.route('/users/<user_id>/data', methods=['DELETE'])
+def delete_user(user_id):
+    """Start deleting everything stored for a user (password protected); returns the job to poll"""
+    if request.values.get('password') != '1234':
+        return jsonify({'error': 'Invalid password'}), 403
+    job = deletion_jobs.submit(user_id)
+    logger.info("Queued user deletion job %s", job.id)
+    return jsonify(job.progress()), 202, {'Location': url_for('deletion_status', job_id=job.id)}
+
+@app.route('/deletions/<job_id>')
+def deletion_status(job_id):
+    """Progress of a user deletion job (password protected)"""
+    if request.values.get('password') != '1234':
+        return jsonify({'error': 'Invalid password'}), 403
+    job = deletion_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job.progress())
+
 @app.route('/information', methods=['GET', 'POST'])
 def information():
     """Show database information (password protected)"""
     if request.method == 'POST':
-        password = request.form.get('password')
-        if password == '1234':
-            # Get all sessions with their interactions and entities
-            all_sessions = get_all_sessions(Session)
-            sessions_data = []
+        # The password is checked once; the filter form relies on the signed session cookie
+        if 'password' in request.form:
+            flask_session['information_authenticated'] = request.form['password'] == '1234'
+        if flask_session.get('information_authenticated'):
+            # Live sessions come from the database, older ones from the archive partitions
+            start, end = parse_date_range(request.form.get('from'), request.form.get('to'))
+            sessions_data = live_sessions_data(start, end)
+            # A crash between writing the archive and deleting the rows leaves a session in both.
+            # Ids can be reused once rows are deleted, so match on the start time too
+            live = {(s['id'], s['start_time'].isoformat()) for s in sessions_data}
+            sessions_data.extend(dict(session, archived=True)
+                                 for session in archive_reader.iter_sessions(start, end)
+                                 if (session['id'], session['start_time']) not in live)
             
-            for session in all_sessions:
-                interactions = get_session_interactions(Session, session.id)
-                session_entities = get_session_entities(Session, session.id)
-                
-                # Format the data
-                formatted_interactions = []
-                for interaction in interactions:
-                    interaction_entities = [e for e in session_entities if e.interaction_id == interaction.id]
-                    formatted_entities = [{"type": e.entity_type, "value": e.entity_value} for e in interaction_entities]
-                    
-                    formatted_interactions.append({
-                        "id": interaction.id,
-                        "timestamp": interaction.timestamp,
-                        "role": interaction.role,
-                        "transcript": interaction.transcript,
-                        "entities": formatted_entities
-                    })
-                
-                sessions_data.append({
-                    "id": session.id,
-                    "start_time": session.start_time,
-                    "end_time": session.end_time,
-                    "interactions": formatted_interactions
-                })
-            
-            return render_template('information.html', sessions=sessions_data, authenticated=True)
+            return render_template('information.html', sessions=sessions_data, authenticated=True,
+                                   archive=archive_reader.stats(), date_from=request.form.get('from', ''),
+                                   date_to=request.form.get('to', ''))
         else:
             return render_template('information.html', error="Invalid password", authenticated=False)
     
     return render_template('information.html', authenticated=False)
 
+def parse_date_range(date_from, date_to):
+    """Parse the dashboard's optional YYYY-MM-DD filters"""
+    def parse(value):
+        try:
+            return date.fromisoformat(value) if value else None
+        except ValueError:
+            return None
+    return parse(date_from), parse(date_to)
+
+def live_sessions_data(start=None, end=None):
+    """Sessions still in the live database, formatted for the dashboard"""
+    sessions_data = []
+    for session in get_all_sessions(Session):
+        day = session.start_time.date()
+        if (start and day < start) or (end and day > end):
+            continue
+        interactions = get_session_interactions(Session, session.id)
+        session_entities = get_session_entities(Session, session.id)
+        
+        # Format the data
+        formatted_interactions = []
+        for interaction in interactions:
+            interaction_entities = [e for e in session_entities if e.interaction_id == interaction.id]
+            formatted_entities = [{"type": e.entity_type, "value": e.entity_value} for e in interaction_entities]
+            
+            formatted_interactions.append({
+                "id": interaction.id,
+                "timestamp": interaction.timestamp,
+                "role": interaction.role,
+                "transcript": interaction.transcript,
+                "audio_duration": interaction.audio_duration,
+                "decode_seconds": interaction.decode_seconds,
+                "entities": formatted_entities
+            })
+        
+        sessions_data.append({
+            "id": session.id,
+            "start_time": session.start_time,
+            "end_time": session.end_time,
+            "interactions": formatted_interactions
+        })
+    return sessions_data
+
+def correlated(handler):
+    """Run a Socket.IO handler with the connection's sid and session id on its log records"""
+    @functools.wraps(handler)
+    def wrapper(*args, **kwargs):
+        with connection_sessions_lock:
+            session_id = connection_sessions.get(request.sid)
+        with log_context(sid=request.sid, session_id=session_id, interaction_id=None):
+            return handler(*args, **kwargs)
+    return wrapper
+
 @socketio.on('connect')
+@correlated
 def handle_connect():
     """Handle client connection"""
-    print('Client connected')
+    session_id = bind_connection_session(request.sid)
+    bind(session_id=session_id)
+    logger.info("Client connected")
     emit('status', {'message': 'Connected to server'})
+    emit('session', {'session_id': session_id})
 
 @socketio.on('disconnect')
+@correlated
 def handle_disconnect():
     """Handle client disconnection"""
-    print('Client disconnected')
+    logger.info("Client disconnected")
+    if speculator and speculator.loaded:
+        speculator.cancel(request.sid)
+    if speech_recognizer.loaded:
+        speech_recognizer.close_stream(request.sid)
+    if rate_limiter:
+        rate_limiter.drop(request.sid)
+    release_connection_session(request.sid)
+
+@socketio.on('audio_config')
+@correlated
+def handle_audio_config(data):
+    """Agree on the wire format for this connection's audio frames"""
+    from audio_codec import negotiate, TARGET_SAMPLE_RATE
+    encoding = negotiate(data.get('encodings'))
+    sample_rate = int(data.get('sample_rate') or TARGET_SAMPLE_RATE)
+    try:
+        speech_recognizer.configure_stream(request.sid, encoding, sample_rate)
+    except ValueError as e:
+        emit('error', {'message': str(e)})
+        return
+    logger.info("Audio format %s @ %d Hz", encoding, sample_rate)
+    emit('audio_config', {'encoding': encoding, 'sample_rate': sample_rate})
 
 @socketio.on('audio_data')
+@correlated
 def handle_audio_data(data):
     """Process incoming audio data"""
-    global current_session_id
-    
-    # Add audio chunk to buffer and check status
-    status = speech_recognizer.add_audio_chunk(data)
+    # Drop chunks beyond the connection's byte rate before doing any work on them
+    if rate_limiter:
+        allowed = rate_limiter.allow(request.sid, len(data))
+        if rate_limiter.limit_changed(request.sid, allowed):
+            emit('debug', {'event': 'rate_limited', 'limited': not allowed})
+        if not allowed:
+            logger.warning("Audio rate limit exceeded, dropping chunk", extra=SAMPLED)
+            return
+
+    # Add audio chunk to this connection's buffer and check status
+    status = speech_recognizer.add_audio_chunk(data, request.sid)
+
+    # Ask the client to pause or resume sending if its buffer is filling up
+    backpressure = speech_recognizer.backpressure_signal(request.sid)
+    if backpressure:
+        emit('backpressure', backpressure)
     
+    if status == "speculating":
+        start_speculation(request.sid)
+        return
+    if status == "listening" and speculator:
+        # Speech resumed, so anything started on the pause is stale
+        speculator.cancel(request.sid)
+
     # If status changed, inform client
     if status:
+        logger.debug("Status changed to %s", status)
         emit('status', {'status': status})
         
         # If we should start processing, do it
         if status == "processing":
-            process_audio_workflow()
+            with connection_sessions_lock:
+                session_id = connection_sessions.get(request.sid)
+            if session_id is None:
+                session_id = bind_connection_session(request.sid)
+                bind(session_id=session_id)
+            process_audio_workflow(session_id)
 
-def process_audio_workflow():
+def start_speculation(sid):
+    """Decode the utterance and draft a reply while waiting to see if the pause holds"""
+    if admission.level() != NORMAL:
+        # Speculative decodes are the first work to shed under load
+        return
+    key, audio = speech_recognizer.peek_utterance(sid)
+    if audio is None:
+        return
+    with connection_sessions_lock:
+        session_id = connection_sessions.get(sid)
+    if session_id is None:
+        return
+    speculator.start(sid, key, audio, session_id, options=speech_recognizer.decode_options(sid))
+
+def stream_response_to_speech(session_id, tts_stream):
+    """Generate the reply token by token, feeding each sentence to speech synthesis as it completes"""
+    parts = []
+    try:
+        for delta in assistant_responder.stream_response(session_id):
+            parts.append(delta)
+            tts_stream.feed(delta)
+    except Exception:
+        logger.exception("Error streaming assistant response")
+        if not parts:
+            tts_stream.feed(fallback_response())
+            return fallback_response()
+    return "".join(parts)
+
+def process_audio_workflow(session_id):
     """Complete workflow for processing audio and generating response"""
-    global current_session_id
+    with metrics.turn() as spans:
+        run_audio_workflow(session_id)
+    
+    # Attach this turn's stage timings to the debug stream
+    if ATTACH_TIMINGS:
+        timed_emit('debug', {'event': 'timings', 'spans': spans})
+
+def run_audio_workflow(session_id):
+    """Transcribe, store, extract and respond for one utterance, timing each stage"""
+    turn_started = time.perf_counter()
     
     # Process the audio buffer to get transcription with streaming
-    print("Starting transcription workflow")
+    logger.debug("Starting transcription workflow")
     # First emit a status update to show we're starting transcription
-    emit('status', {'status': 'transcribing'})
+    timed_emit('status', {'status': 'transcribing'})
+    
+    # Pick up speculative work if it was done on exactly this utterance
+    speculation = None
+    if speculator:
+        speculation = speculator.claim(request.sid, speech_recognizer.utterance_key(request.sid))
+    
+    # Take the utterance before waiting for a transcription slot: audio that
+    # keeps arriving meanwhile starts the next utterance instead
+    audio_data = speech_recognizer.take_utterance(request.sid)
     
-    transcription = speech_recognizer.transcribe_with_stream(socketio)
+    # Taking the utterance drained the buffer. A paused client sends nothing
+    # until it hears so, and otherwise only audio_data handlers report it
+    backpressure = speech_recognizer.backpressure_signal(request.sid)
+    if backpressure:
+        timed_emit('backpressure', backpressure)
+    
+    if audio_data is None or len(audio_data) < 1000:
+        logger.debug("Audio too short to transcribe")
+        if speculation is not None:
+            speculation.cancel()
+        timed_emit('status', {'status': 'ready'})
+        return
+    
+    with admission.admit() as ticket:
+        if ticket is None:
+            # Every transcription slot is taken and the queue is full
+            logger.warning("Transcription rejected, server busy")
+            if speculation is not None:
+                speculation.cancel()
+            timed_emit('status', {'status': 'busy', 'retry_after': admission.queue_timeout})
+            return
+        
+        segments = speech_recognizer.transcribe_with_stream(
+            socketio, request.sid, to=request.sid, speculation=speculation, degraded=ticket.degraded,
+            audio_data=audio_data)
+    transcription = segments.text if segments else None
+
+    timed_emit('debug', {
+        'event': 'audio_buffer',
+        'memory': speech_recognizer.get_stream(request.sid).memory_stats(),
+        'models': model_manager.stats()
+    })
     
     if not transcription:
         # No transcription, reset status and return
-        emit('status', {'status': 'ready'})
+        timed_emit('status', {'status': 'ready'})
         return
     
     # We've already emitted the preliminary transcription from the streaming method
     # Now we mark it as final
-    emit('transcription', {'text': transcription, 'final': True})
+    timed_emit('transcription', {'text': transcription, 'final': True})
     
     # Signal that we are now processing the transcription
-    emit('status', {'status': 'processing'})
+    timed_emit('status', {'status': 'processing'})
     
     try:
         # 1. Store the transcription in the database
-        interaction = store_interaction(
-            Session,
-            current_session_id,
-            transcription
-        )
+        with span('db_write'):
+            interaction = store_interaction(
+                Session,
+                session_id,
+                transcription,
+                audio_duration=segments.audio_duration,
+                decode_seconds=segments.decode_seconds,
+                segments=segments.to_bytes()
+            )
+        bind(interaction_id=interaction.id)
         
         # Send debug info
-        emit('debug', {
+        timed_emit('debug', {
             'event': 'stored_interaction',
             'id': interaction.id,
-            'session_id': current_session_id,
-            'text': transcription
+            'session_id': session_id,
+            'text': transcription,
+            'audio_duration': segments.audio_duration,
+            'real_time_factor': segments.real_time_factor,
+            'segments': segments.to_dict()
         })
         
         # 2. Extract entities
-        entities = entity_extractor.extract_entities(transcription)
+        with span('entity_extraction'):
+            entities = entity_extractor.extract_entities(transcription)
         
         # Send debug info about entities
-        emit('debug', {
+        timed_emit('debug', {
             'event': 'extracted_entities',
-            'entities': entities
+            'entities': entities,
+            'cache': entity_extractor.cache_stats()
         })
         
         # 3. Store entities in the database if any were found
         if entities:
-            stored_entities = store_entities(Session, interaction.id, entities)
-            print(f"Stored {len(stored_entities)} entities")
+            with span('db_write'):
+                stored_entities = store_entities(Session, interaction.id, entities)
+            logger.info("Stored %d entities", len(stored_entities))
             
             # Send debug info
-            emit('debug', {
+            timed_emit('debug', {
                 'event': 'stored_entities',
                 'count': len(stored_entities)
             })
         
         # Signal that we are now thinking/processing the response
-        print("Emitting thinking status and thinking_start event")
-        emit('status', {'status': 'thinking'})
-        emit('thinking', {'status': 'started'})
+        timed_emit('status', {'status': 'thinking'})
+        timed_emit('thinking', {'status': 'started'})
         
         # 4. Signal we're generating the assistant response
-        emit('debug', {
+        timed_emit('debug', {
             'event': 'generating_response',
-            'session_id': current_session_id
+            'session_id': session_id
         })
         
-        assistant_text = assistant_responder.get_response(current_session_id)
+        tts_stream = None
+        if tts_service.available:
+            sid = request.sid
+            tts_stream = tts_service.open_stream(
+                lambda frame: socketio.emit('tts_audio', frame, to=sid), started_at=turn_started)
+        
+        with span('llm_response'):
+            assistant_text = None
+            if speculation is not None:
+                try:
+                    # Only if drafted for the transcript that was stored and shown
+                    assistant_text = speculation.reply_for(transcription)
+                except Exception as e:
+                    logger.warning("Speculative reply unavailable: %s", e)
+            if assistant_text:
+                if tts_stream:
+                    tts_stream.feed(assistant_text)
+            elif tts_stream:
+                # Stream the reply so the first sentence is synthesized while the rest is generated
+                assistant_text = stream_response_to_speech(session_id, tts_stream)
+            else:
+                assistant_text = assistant_responder.get_response(session_id)
+        if tts_stream:
+            # The remaining audio keeps streaming to the client in the background
+            tts_stream.finish()
         
         # Signal end of thinking
-        print("Emitting thinking_end event")
-        emit('thinking', {'status': 'ended'})
+        timed_emit('thinking', {'status': 'ended'})
         
         # 5. Store the assistant's response
-        assistant_interaction = store_interaction(
-            Session,
-            current_session_id,
-            assistant_text,
-            role="assistant"
-        )
+        with span('db_write'):
+            assistant_interaction = store_interaction(
+                Session,
+                session_id,
+                assistant_text,
+                role="assistant"
+            )
         
         # Send debug info
-        emit('debug', {
+        timed_emit('debug', {
             'event': 'stored_assistant_response',
             'id': assistant_interaction.id,
             'text': assistant_text
         })
         
         # 6. Send the response to the client
-        emit('assistant_response', {'text': assistant_text})
+        timed_emit('assistant_response', {'text': assistant_text})
         
     except Exception as e:
-        print(f"Error in process_audio_workflow: {str(e)}")
-        emit('error', {'message': 'Processing failed'})
-        emit('debug', {
+        logger.exception("Error in process_audio_workflow")
+        timed_emit('error', {'message': 'Processing failed'})
+        timed_emit('debug', {
             'event': 'error',
             'message': str(e)
         })
         
         # End thinking state on error
-        print("Emitting thinking_end event due to error")
-        emit('thinking', {'status': 'ended'})
+        timed_emit('thinking', {'status': 'ended'})
     
     # Re-enable microphone
-    emit('status', {'status': 'ready'})
+    timed_emit('status', {'status': 'ready'})
 
 if __name__ == '__main__':
-    socketio.run(app, debug=True, host='0.0.0.0', port=5050) 
\ No newline at end of file
+    debug = os.getenv('APP_DEBUG', '1') == '1'
+    # Without debug, Flask-SocketIO refuses to start on Werkzeug (as it does
+    # without eventlet) unless told to: serve.py runs it that way under
+    # systemd and docker, with no TTY
+    socketio.run(app, debug=debug, use_reloader=debug, host='0.0.0.0', port=int(os.getenv('PORT', '5050')),
+                 allow_unsafe_werkzeug=True) 
\ No newline at end of file
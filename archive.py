@@ -0,0 +1,337 @@
+"""
+Cold storage for finished conversations.
+
+Closed sessions older than a cutoff are exported in chunks to gzip
+compressed JSONL, partitioned by the session's start date:
+
+    archive/date=2024-05-01/sessions-20240601T030000-1f2e3d4c.jsonl.gz
+
+Each line is one session with its interactions and entities nested. A
+chunk is written and flushed before its rows are deleted from the live
+database, so memory use is bounded by the chunk size and a crash can at
+worst leave a session both archived and live (readers keep the newest
+copy). Freed pages are then returned to the filesystem with incremental
+VACUUM.
+
+    python archive.py export --older-than-days 7
+    python archive.py vacuum
+"""
+import argparse
+import fcntl
+import glob
+import gzip
+import io
+import json
+import logging
+import os
+import threading
+import uuid
+import zlib
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional
+
+from sqlalchemy import select, text
+from sqlalchemy.orm import sessionmaker
+
+from database import Entity, Interaction, Session, init_db
+from segments import Segments
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ARCHIVE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "archive")
+
+# Exports append to archive files and purges rewrite them, so they take turns
+_write_lock = threading.Lock()
+
+
+@contextmanager
+def _archive_lock(archive_dir: str):
+    """
+    Held while archive files are written. Every web process started by
+    serve.py may archive into the same directory, so besides the lock for
+    this process's threads, an flock on a lock file there shuts out the
+    other processes.
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    with _write_lock, open(os.path.join(archive_dir, ".lock"), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _iso(value) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+
+class ArchiveWriter:
+    """Appends session documents to one gzip JSONL file per date partition."""
+
+    def __init__(self, archive_dir: str, run_id: str):
+        self.archive_dir = archive_dir
+        self.run_id = run_id
+        self._files = {}
+
+    def path_for(self, partition: str) -> str:
+        return os.path.join(self.archive_dir, f"date={partition}", f"sessions-{self.run_id}.jsonl.gz")
+
+    def write(self, document: Dict[str, Any]):
+        partition = (document["start_time"] or document["archived_at"])[:10]
+        handle = self._files.get(partition)
+        if handle is None:
+            path = self.path_for(partition)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            raw = open(path, "ab")
+            compressed = gzip.GzipFile(fileobj=raw, mode="ab")
+            handle = (io.TextIOWrapper(compressed, encoding="utf-8"), compressed, raw)
+            self._files[partition] = handle
+        handle[0].write(json.dumps(document, ensure_ascii=False) + "\n")
+
+    def flush(self):
+        """Make everything written so far durable, so the rows can be deleted."""
+        for text_file, compressed, raw in self._files.values():
+            text_file.flush()
+            compressed.flush()
+            raw.flush()
+            os.fsync(raw.fileno())
+
+    def close(self):
+        for text_file, _, raw in self._files.values():
+            text_file.close()
+            raw.close()
+        self._files.clear()
+
+
+def _load_documents(db_session, session_rows: List[Session], archived_at: str) -> List[Dict[str, Any]]:
+    """Build the nested documents for one chunk of sessions with two queries."""
+    session_ids = [s.id for s in session_rows]
+    interactions = (db_session.query(Interaction)
+                    .filter(Interaction.session_id.in_(session_ids))
+                    .order_by(Interaction.session_id, Interaction.timestamp)
+                    .all())
+    entities = (db_session.query(Entity)
+                .join(Interaction, Entity.interaction_id == Interaction.id)
+                .filter(Interaction.session_id.in_(session_ids))
+                .all())
+
+    entities_by_interaction = {}
+    for entity in entities:
+        entities_by_interaction.setdefault(entity.interaction_id, []).append(
+            {"type": entity.entity_type, "value": entity.entity_value})
+
+    interactions_by_session = {}
+    for interaction in interactions:
+        interactions_by_session.setdefault(interaction.session_id, []).append({
+            "id": interaction.id,
+            "timestamp": _iso(interaction.timestamp),
+            "role": interaction.role,
+            "transcript": interaction.transcript,
+            "audio_duration": interaction.audio_duration,
+            "decode_seconds": interaction.decode_seconds,
+            "segments": Segments.from_bytes(interaction.segments).to_dict() if interaction.segments else None,
+            "priority": bool(interaction.priority),
+            "entities": entities_by_interaction.get(interaction.id, []),
+        })
+
+    return [{
+        "id": s.id,
+        "start_time": _iso(s.start_time),
+        "end_time": _iso(s.end_time),
+        "user_id": s.user_id,
+        "archived_at": archived_at,
+        "interactions": interactions_by_session.get(s.id, []),
+    } for s in session_rows]
+
+
+def _delete_sessions(db_session, session_ids: List[int]):
+    interaction_ids = select(Interaction.id).where(Interaction.session_id.in_(session_ids))
+    db_session.query(Entity).filter(Entity.interaction_id.in_(interaction_ids)).delete(synchronize_session=False)
+    db_session.query(Interaction).filter(Interaction.session_id.in_(session_ids)).delete(synchronize_session=False)
+    db_session.query(Session).filter(Session.id.in_(session_ids)).delete(synchronize_session=False)
+
+
+def export_closed_sessions(session_factory: sessionmaker, archive_dir: str = DEFAULT_ARCHIVE_DIR,
+                           older_than: timedelta = timedelta(days=7), chunk_size: int = 200,
+                           vacuum: bool = True) -> Dict[str, int]:
+    """
+    Move sessions that ended before now - older_than into the archive.
+    Returns counts of sessions, interactions and freed pages.
+    """
+    with _archive_lock(archive_dir):
+        totals = _export(session_factory, archive_dir, older_than, chunk_size)
+    if vacuum and totals["sessions"]:
+        totals["freed_pages"] = incremental_vacuum(session_factory)
+    logger.info("Archived %d sessions (%d interactions) to %s", totals["sessions"], totals["interactions"], archive_dir)
+    return totals
+
+
+def _export(session_factory: sessionmaker, archive_dir: str, older_than: timedelta, chunk_size: int) -> Dict[str, int]:
+    cutoff = datetime.utcnow() - older_than
+    now = datetime.utcnow()
+    # Unique per run, so exports started in the same second never share a file
+    writer = ArchiveWriter(archive_dir, f"{now:%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}")
+    totals = {"sessions": 0, "interactions": 0, "freed_pages": 0}
+    last_id = 0
+
+    try:
+        while True:
+            db_session = session_factory()
+            try:
+                # Keyset pagination keeps each chunk query cheap however far we've got
+                chunk = (db_session.query(Session)
+                         .filter(Session.end_time.isnot(None), Session.end_time < cutoff, Session.id > last_id)
+                         .order_by(Session.id)
+                         .limit(chunk_size)
+                         .all())
+                if not chunk:
+                    break
+                last_id = chunk[-1].id
+
+                documents = _load_documents(db_session, chunk, _iso(now))
+                for document in documents:
+                    writer.write(document)
+                writer.flush()
+
+                _delete_sessions(db_session, [s.id for s in chunk])
+                db_session.commit()
+
+                totals["sessions"] += len(documents)
+                totals["interactions"] += sum(len(d["interactions"]) for d in documents)
+            except Exception:
+                db_session.rollback()
+                raise
+            finally:
+                db_session.close()
+    finally:
+        writer.close()
+    return totals
+
+
+def incremental_vacuum(session_factory: sessionmaker, max_pages: Optional[int] = None) -> int:
+    """
+    Return free pages to the filesystem. The first run on a database
+    created without auto_vacuum=INCREMENTAL does one full VACUUM to
+    switch modes; later runs only release free pages.
+    """
+    engine = session_factory.kw["bind"]
+    with engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        mode = conn.execute(text("PRAGMA auto_vacuum")).scalar()
+        free_before = conn.execute(text("PRAGMA freelist_count")).scalar()
+        if mode != 2:
+            logger.info("Switching database to incremental auto_vacuum (one-time full VACUUM)")
+            conn.execute(text("PRAGMA auto_vacuum = INCREMENTAL"))
+            conn.execute(text("VACUUM"))
+        else:
+            pages = f"({int(max_pages)})" if max_pages else ""
+            # sqlite3's execute() steps this pragma once (one page); executescript runs it to completion
+            conn.connection.driver_connection.executescript(f"PRAGMA incremental_vacuum{pages};")
+        free_after = conn.execute(text("PRAGMA freelist_count")).scalar()
+    return max(0, free_before - free_after)
+
+
+def purge_user_sessions(archive_dir: str, user_id: str) -> int:
+    """
+    Remove a user's sessions from every archive file (GDPR deletion).
+    Files are rewritten one at a time, streaming, and swapped in
+    atomically; files without the user's sessions are left untouched.
+    Returns the number of session records removed.
+    """
+    # Cheap substring test first, so only candidate lines are parsed
+    needle = json.dumps(user_id, ensure_ascii=False)
+    removed = 0
+    with _archive_lock(archive_dir):
+        for path in glob.glob(os.path.join(archive_dir, "date=*", "*.jsonl.gz")):
+            removed += _purge_file(path, user_id, needle)
+    return removed
+
+
+def _purge_file(path: str, user_id: str, needle: str) -> int:
+    temp_path = os.path.join(os.path.dirname(path), f".purge-{os.path.basename(path)}.tmp")
+    removed = 0
+    with gzip.open(path, "rt", encoding="utf-8") as source, \
+            gzip.open(temp_path, "wt", encoding="utf-8") as target:
+        for line in source:
+            if needle in line and json.loads(line).get("user_id") == user_id:
+                removed += 1
+                continue
+            target.write(line)
+    if removed:
+        with open(temp_path, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    else:
+        os.remove(temp_path)
+    return removed
+
+
+class ArchiveReader:
+    """Reads archived sessions, skipping partitions outside the requested date range."""
+
+    def __init__(self, archive_dir: str = DEFAULT_ARCHIVE_DIR):
+        self.archive_dir = archive_dir
+
+    def partitions(self) -> List[str]:
+        """Archived dates (YYYY-MM-DD), newest first."""
+        found = []
+        for path in glob.glob(os.path.join(self.archive_dir, "date=*")):
+            found.append(os.path.basename(path)[len("date="):])
+        return sorted(found, reverse=True)
+
+    def iter_sessions(self, start: Optional[date] = None, end: Optional[date] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Yield archived sessions whose start date is within [start, end],
+        newest partition first. A session exported twice is yielded once.
+        Corrupt files are logged and skipped from the point of damage.
+        """
+        for partition in self.partitions():
+            day = date.fromisoformat(partition)
+            if (start and day < start) or (end and day > end):
+                continue
+            latest = {}
+            files = sorted(glob.glob(os.path.join(self.archive_dir, f"date={partition}", "*.jsonl.gz")))
+            for path in files:
+                try:
+                    with gzip.open(path, "rt", encoding="utf-8") as handle:
+                        for line in handle:
+                            if line.strip():
+                                document = json.loads(line)
+                                latest[document["id"]] = document
+                except (EOFError, gzip.BadGzipFile, zlib.error, json.JSONDecodeError) as e:
+                    # e.g. a file cut short by a crash: sessions read before the damage are kept
+                    logger.warning("Skipping the rest of corrupt archive file %s: %s", path, e)
+            yield from sorted(latest.values(), key=lambda d: d["start_time"] or "", reverse=True)
+
+    def stats(self) -> Dict[str, Any]:
+        files = glob.glob(os.path.join(self.archive_dir, "date=*", "*.jsonl.gz"))
+        return {
+            "partitions": len(self.partitions()),
+            "files": len(files),
+            "bytes": sum(os.path.getsize(path) for path in files),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive closed sessions out of the live database")
+    parser.add_argument("command", choices=["export", "vacuum"])
+    parser.add_argument("--db", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "speech_app.db"))
+    parser.add_argument("--archive-dir", default=os.getenv("ARCHIVE_DIR", DEFAULT_ARCHIVE_DIR))
+    parser.add_argument("--older-than-days", type=float, default=float(os.getenv("ARCHIVE_AFTER_DAYS", "7")))
+    parser.add_argument("--chunk-size", type=int, default=200)
+    args = parser.parse_args()
+
+    from logging_setup import configure_logging
+    configure_logging()
+    session_factory = init_db(args.db)
+    if args.command == "export":
+        totals = export_closed_sessions(session_factory, args.archive_dir,
+                                        timedelta(days=args.older_than_days), args.chunk_size)
+        logger.info("Export finished: %s", totals)
+    else:
+        logger.info("Freed %d pages", incremental_vacuum(session_factory))
+
+
+if __name__ == "__main__":
+    main()
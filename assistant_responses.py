@@ -1,31 +1,41 @@
-import os
-import openai
+import logging
+import time
+from typing import Dict, Iterator, List, Optional
 from database import get_session_interactions
 from dotenv import load_dotenv
 from flask_socketio import emit
+from llm_client import get_client
+from response_cache import ResponseCache
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Said when the reply can't be generated
+FALLBACK_RESPONSE = "I'm sorry, but I ran into an error. Could you please try again?"
+
 
 class AssistantResponder:
     """
-    A class that uses OpenAI to generate responses and also provides
-    text-to-speech capabilities for speaking the generated response.
+    A class that uses OpenAI to generate responses. Speech output lives
+    in tts.py, which streams audio to the client instead of the server's
+    speakers.
     """
 
-    def __init__(self, session_factory):
+    def __init__(self, session_factory, deadline: float = 20.0, cache: Optional[ResponseCache] = None):
         self.session_factory = session_factory
-        api_key = os.getenv("OPENAI_API_KEY")
-        openai.api_key = api_key
-        
-        # Initialize TTS engine (optional)
-        self.engine = None
-        try:
-            import pyttsx3
-            self.engine = pyttsx3.init()
-            print("Text-to-speech engine initialized successfully")
-        except Exception as e:
-            print(f"Text-to-speech engine initialization failed: {e}")
-            print("Running without text-to-speech support")
+        self.llm = get_client()
+        # Seconds allowed for one response, retries included
+        self.deadline = deadline
+        # Replies to repeated short prompts (greetings, confirmations) are reused
+        self.cache = cache
+
+    def forget(self, session_ids=(), texts=()) -> int:
+        """Drop cached replies that came from a deleted user's sessions or transcripts."""
+        return self.cache.forget(session_ids, texts) if self.cache else 0
+
+    def cache_stats(self) -> Optional[Dict]:
+        """Return hit/miss and saved-latency metrics for the response cache."""
+        return self.cache.stats() if self.cache else None
 
     def get_response(self, session_id: int) -> str:
         
@@ -35,64 +45,91 @@ class AssistantResponder:
         """
         db_session = self.session_factory()
         try:
-            print(f"Starting to generate response for session ID: {session_id}")
-            # 1) Get all interactions for the session
-            interactions = get_session_interactions(self.session_factory, session_id)
-
-            # 2) Build a conversation context list of messages
-            #    We add a system prompt at the beginning to set the tone or instructions of the assistant
-            messages = [
-                {
-                    "role": "system",
-                    "content": (
-                        "You are a helpful AI assistant that specializes in helping users plan events. "
-                        "You have access to the conversation so far. Respond in a concise, polite, and helpful way."
-                    )
-                }
-            ]
-
-            # Sort interactions by timestamp (just in case they aren't sorted).
-            interactions_sorted = sorted(interactions, key=lambda x: x.timestamp)
-
-            # Convert each interaction to the appropriate role/content for the chat
-            for interaction in interactions_sorted:
-                if interaction.role == "assistant":
-                    messages.append({"role": "assistant", "content": interaction.transcript})
-                else:
-                    # We'll treat "user" as a normal user message
-                    messages.append({"role": "user", "content": interaction.transcript})
-
-            # 3) Call the OpenAI Chat Completion endpoint
-            print("Calling OpenAI API to generate response...")
+            logger.debug("Generating response for session %s", session_id)
             # This is intentionally a blocking call - we want to show the thinking status while we wait
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=messages,
-                max_tokens=200,
-                temperature=0.7)
-            
-            # 4) Extract the assistant's text from the response
-            assistant_text = response.choices[0].message.content
-            print("Response generated successfully")
-
-            return assistant_text
+            return self.draft_response(session_id)
 
         except Exception as e:
-            print(f"Error in generate_openai_response: {e}")
-            return "I'm sorry, but I ran into an error. Could you please try again?"
+            logger.exception("Error in generate_openai_response")
+            return FALLBACK_RESPONSE
         finally:
             db_session.close()
 
-
-    def speak_response(self, text: str):
+    def draft_response(self, session_id: int, pending_text: str = None) -> str:
         """
-        Convert the given text to speech using pyttsx3.
+        Generate a response without the error fallback. pending_text is
+        treated as the next user message even though it isn't stored yet,
+        which lets a reply be drafted speculatively. Raises on API errors.
         """
-        if not text or not self.engine:
-            return  # Don't speak empty text or if engine not available
-        
-        try:
-            self.engine.say(text)
-            self.engine.runAndWait()
-        except Exception as e:
-            print(f"Error in text-to-speech: {e}")
+        messages = self.build_messages(session_id, pending_text)
+        lookup = self.cache.lookup(messages, scope=session_id) if self.cache else None
+        if lookup and lookup.hit:
+            logger.debug("Response cache hit for session %s", session_id)
+            return lookup.text
+
+        # Call the OpenAI Chat Completion endpoint
+        started = time.perf_counter()
+        text = self.llm.chat_sync(
+            messages,
+            model="gpt-3.5-turbo",
+            deadline=self.deadline,
+            max_tokens=200,
+            temperature=0.7)
+        if lookup:
+            self.cache.store(lookup, text, time.perf_counter() - started)
+        return text
+
+    def stream_response(self, session_id: int, pending_text: str = None) -> Iterator[str]:
+        """Like draft_response(), but yields the reply as it is generated."""
+        messages = self.build_messages(session_id, pending_text)
+        lookup = self.cache.lookup(messages, scope=session_id) if self.cache else None
+        if lookup and lookup.hit:
+            logger.debug("Response cache hit for session %s", session_id)
+            yield lookup.text
+            return
+
+        started = time.perf_counter()
+        parts = []
+        for delta in self.llm.chat_stream_sync(
+                messages,
+                model="gpt-3.5-turbo",
+                deadline=self.deadline,
+                max_tokens=200,
+                temperature=0.7):
+            parts.append(delta)
+            yield delta
+        # Only a reply that streamed to the end is cached
+        if lookup:
+            self.cache.store(lookup, "".join(parts), time.perf_counter() - started)
+
+    def build_messages(self, session_id: int, pending_text: str = None) -> List[Dict[str, str]]:
+        """Build the chat messages for a session, optionally ending with an unsaved user message."""
+        # 1) Get all interactions for the session
+        interactions = get_session_interactions(self.session_factory, session_id)
+
+        # 2) Build a conversation context list of messages
+        #    We add a system prompt at the beginning to set the tone or instructions of the assistant
+        messages = [
+            {
+                "role": "system",
+                "content": (
+                    "You are a helpful AI assistant that specializes in helping users plan events. "
+                    "You have access to the conversation so far. Respond in a concise, polite, and helpful way."
+                )
+            }
+        ]
+
+        # Sort interactions by timestamp (just in case they aren't sorted).
+        interactions_sorted = sorted(interactions, key=lambda x: x.timestamp)
+
+        # Convert each interaction to the appropriate role/content for the chat
+        for interaction in interactions_sorted:
+            if interaction.role == "assistant":
+                messages.append({"role": "assistant", "content": interaction.transcript})
+            else:
+                # We'll treat "user" as a normal user message
+                messages.append({"role": "user", "content": interaction.transcript})
+
+        if pending_text:
+            messages.append({"role": "user", "content": pending_text})
+        return messages
@@ -0,0 +1,95 @@
+import numpy as np
+
+
+class AudioRingBuffer:
+    """
+    Fixed-capacity float32 ring buffer for one audio stream.
+
+    Memory is allocated once up front, so a stream can never hold more
+    than `capacity` samples no matter how long the client keeps talking.
+    Offsets passed to read()/energy_profile() are relative to the oldest
+    sample still in the buffer.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._data = np.zeros(capacity, dtype=np.float32)
+        self._head = 0  # index of the oldest sample
+        self._size = 0
+        self.dropped_samples = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def free(self) -> int:
+        return self.capacity - self._size
+
+    @property
+    def fill_ratio(self) -> float:
+        return self._size / self.capacity
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes allocated for this buffer."""
+        return self._data.nbytes
+
+    @property
+    def used_bytes(self) -> int:
+        """Bytes currently holding audio."""
+        return self._size * self._data.itemsize
+
+    def write(self, samples: np.ndarray) -> int:
+        """
+        Append samples. Anything that doesn't fit is dropped (and counted)
+        rather than growing the buffer. Returns the number of samples written.
+        """
+        n = min(len(samples), self.free)
+        self.dropped_samples += len(samples) - n
+        if n == 0:
+            return 0
+
+        tail = (self._head + self._size) % self.capacity
+        first = min(n, self.capacity - tail)
+        self._data[tail:tail + first] = samples[:first]
+        if n > first:
+            self._data[:n - first] = samples[first:n]
+        self._size += n
+        return n
+
+    def read(self, start: int = 0, end: int = None) -> np.ndarray:
+        """Return a contiguous copy of samples [start, end)."""
+        end = self._size if end is None else min(end, self._size)
+        start = max(0, start)
+        if end <= start:
+            return np.zeros(0, dtype=np.float32)
+
+        begin = (self._head + start) % self.capacity
+        n = end - start
+        if begin + n <= self.capacity:
+            return self._data[begin:begin + n].copy()
+        first = self.capacity - begin
+        return np.concatenate([self._data[begin:], self._data[:n - first]])
+
+    def discard(self, n: int) -> None:
+        """Drop the n oldest samples."""
+        n = min(n, self._size)
+        self._head = (self._head + n) % self.capacity
+        self._size -= n
+
+    def clear(self) -> None:
+        self._head = 0
+        self._size = 0
+
+    def lowest_energy_point(self, start: int, end: int, frame_size: int) -> int:
+        """
+        Return the offset of the centre of the quietest frame in [start, end),
+        used to pick a cut point that is least likely to split a word.
+        """
+        audio = self.read(start, end)
+        n_frames = len(audio) // frame_size
+        if n_frames == 0:
+            return end
+        frames = audio[:n_frames * frame_size].reshape(n_frames, frame_size)
+        quietest = int(np.argmin(np.mean(frames * frames, axis=1)))
+        return start + quietest * frame_size + frame_size // 2
@@ -0,0 +1,175 @@
+from functools import lru_cache
+from math import gcd
+from typing import List
+
+import numpy as np
+
+# Opus support is optional; without opuslib the server simply doesn't offer it
+try:
+    import opuslib
+except Exception:
+    opuslib = None
+
+TARGET_SAMPLE_RATE = 16000
+
+# Wire formats for 'audio_data' frames, in order of preference
+PCM_S16LE = "pcm_s16le"  # 16-bit little-endian PCM, half the size of float32
+F32LE = "f32le"          # raw Float32Array frames (legacy clients)
+OPUS = "opus"            # Opus packets, each prefixed with its 16-bit little-endian length
+
+DEFAULT_ENCODING = F32LE
+
+
+def supported_encodings():
+    """Encodings this server can decode, most compact first."""
+    encodings = [PCM_S16LE, F32LE]
+    if opuslib is not None:
+        encodings.insert(0, OPUS)
+    return encodings
+
+
+def negotiate(offered) -> str:
+    """Pick the most compact encoding both sides support."""
+    offered = set(offered or [])
+    for encoding in supported_encodings():
+        if encoding in offered:
+            return encoding
+    return DEFAULT_ENCODING
+
+
+class AudioDecoder:
+    """Decode client audio frames to float32 samples at 16 kHz."""
+
+    # Largest Opus frame is 120 ms
+    MAX_OPUS_FRAME = int(TARGET_SAMPLE_RATE * 0.12)
+
+    def __init__(self, encoding: str = DEFAULT_ENCODING, sample_rate: int = TARGET_SAMPLE_RATE):
+        if encoding not in supported_encodings():
+            raise ValueError(f"Unsupported audio encoding: {encoding}")
+        self.encoding = encoding
+        self.sample_rate = sample_rate
+        self.bytes_received = 0
+        self.samples_decoded = 0
+
+        self._opus = None
+        if encoding == OPUS:
+            # Opus decodes at any of its native rates, so ask for 16 kHz directly
+            self._opus = opuslib.Decoder(TARGET_SAMPLE_RATE, 1)
+            self.sample_rate = TARGET_SAMPLE_RATE
+        # One resampler per stream, so its filter runs on across chunk boundaries
+        self._resampler = None
+        if self.sample_rate != TARGET_SAMPLE_RATE:
+            self._resampler = Resampler(self.sample_rate, TARGET_SAMPLE_RATE)
+
+    def decode(self, data: bytes) -> np.ndarray:
+        self.bytes_received += len(data)
+
+        if self.encoding == PCM_S16LE:
+            samples = np.frombuffer(data, dtype="<i2").astype(np.float32) / 32768.0
+        elif self.encoding == OPUS:
+            pcm = b"".join(self._opus.decode(packet, self.MAX_OPUS_FRAME) for packet in split_opus_packets(data))
+            samples = np.frombuffer(pcm, dtype="<i2").astype(np.float32) / 32768.0
+        else:
+            samples = np.frombuffer(data, dtype=np.float32)
+
+        if self._resampler is not None:
+            samples = self._resampler.process(samples)
+
+        self.samples_decoded += len(samples)
+        return samples
+
+    @property
+    def bytes_per_second(self) -> float:
+        """Average wire bytes per second of audio received so far."""
+        if not self.samples_decoded:
+            return 0.0
+        return self.bytes_received * TARGET_SAMPLE_RATE / self.samples_decoded
+
+
+def split_opus_packets(data: bytes) -> List[bytes]:
+    """Split a message of length-prefixed Opus packets (the client batches ~200 ms per message)."""
+    data = bytes(data)
+    packets, offset = [], 0
+    while offset < len(data):
+        if offset + 2 > len(data):
+            raise ValueError("Truncated Opus packet length")
+        length = int.from_bytes(data[offset:offset + 2], "little")
+        offset += 2
+        if offset + length > len(data):
+            raise ValueError("Truncated Opus packet")
+        packets.append(data[offset:offset + length])
+        offset += length
+    return packets
+
+
+@lru_cache(maxsize=16)
+def _polyphase_filter(up: int, down: int, taps_per_phase: int) -> np.ndarray:
+    """
+    Kaiser-windowed sinc low-pass for resampling by up/down, cut off just
+    below the lower of the two Nyquist frequencies, split into its `up`
+    phases: row p holds taps p, p + up, p + 2 * up, ...
+    """
+    n_taps = taps_per_phase * up
+    cutoff = 0.9 / max(up, down)  # as a fraction of the upsampled rate's Nyquist
+    t = np.arange(n_taps) - (n_taps - 1) / 2
+    taps = np.sinc(cutoff * t) * np.kaiser(n_taps, 8.0)
+    taps *= up / taps.sum()  # unity gain after zero-stuffing by `up`
+    return taps.reshape(taps_per_phase, up).T.astype(np.float32)
+
+
+class Resampler:
+    """
+    Streaming polyphase resampler with an anti-aliasing low-pass filter.
+
+    It keeps the last input samples and the output phase between calls,
+    so a stream resampled chunk by chunk comes out the same as if it were
+    resampled in one go, without clicks at chunk boundaries. Each call
+    holds back the last taps_per_phase / 2 input samples (a few ms at
+    most) until the next chunk arrives, so outputs line up with the input
+    instead of lagging it.
+    """
+
+    def __init__(self, from_rate: int, to_rate: int, taps_per_phase: int = 64):
+        common = gcd(from_rate, to_rate)
+        self.up = to_rate // common
+        self.down = from_rate // common
+        self.taps_per_phase = taps_per_phase
+        self._phases = _polyphase_filter(self.up, self.down, taps_per_phase)
+        self._offset = (taps_per_phase * self.up - 1) // 2  # filter centre, in upsampled samples
+        self._history = np.zeros(taps_per_phase - 1, dtype=np.float32)
+        self._samples_in = 0
+        self._samples_out = 0
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        """Resample the next chunk of the stream."""
+        if self.up == self.down:
+            return samples
+        samples = np.asarray(samples, dtype=np.float32)
+        start = self._samples_in
+        self._samples_in += len(samples)
+        buffer = np.concatenate([self._history, samples])
+        self._history = buffer[len(buffer) - (self.taps_per_phase - 1):]
+
+        # Emit every output whose newest input sample has arrived
+        available = self._samples_in * self.up - self._offset
+        end = max(self._samples_out, -(-available // self.down))
+        positions = np.arange(self._samples_out, end, dtype=np.int64) * self.down + self._offset
+        self._samples_out = end
+        if not len(positions):
+            return np.zeros(0, dtype=np.float32)
+
+        newest, phase = np.divmod(positions, self.up)
+        index = (newest - start + self.taps_per_phase - 1)[:, None] - np.arange(self.taps_per_phase)
+        return np.einsum("ij,ij->i", buffer[index], self._phases[phase])
+
+
+def resample(samples: np.ndarray, from_rate: int, to_rate: int) -> np.ndarray:
+    """Resample a whole signal at once (see Resampler for streams)."""
+    if from_rate == to_rate or len(samples) == 0:
+        return samples
+    n_out = int(round(len(samples) * to_rate / from_rate))
+    resampler = Resampler(from_rate, to_rate)
+    # Trailing zeros push the last outputs through the filter
+    out = np.concatenate([resampler.process(samples),
+                          resampler.process(np.zeros(resampler.taps_per_phase, dtype=np.float32))])
+    return out[:n_out]
@@ -0,0 +1,109 @@
+"""
+Compare Whisper decoding profiles on a conversation-like sequence of utterances.
+
+The clip is cut into utterances of --utterance-seconds and decoded in
+order on one stream, so language pinning and prompt carry-over behave
+as they would in a live session. --silent clips of background noise are
+mixed in to exercise the no-speech early exit.
+
+Usage:
+    python benchmarks/decoding_profiles.py --audio conversation.wav --model tiny --profiles default low_latency
+
+Use a recording with real speech; the synthetic fallback clip only
+compares timings, and the printed texts show whether accuracy held up.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model_manager import DECODING_PROFILES, ModelManager, SAMPLE_RATE  # noqa: E402
+from speechrecognition import SpeechRecognizer  # noqa: E402
+from whisper_rtf import load_audio  # noqa: E402
+
+
+def utterances(audio, seconds, silent, seed=0):
+    """Split audio into utterances and interleave background-noise clips."""
+    size = int(seconds * SAMPLE_RATE)
+    clips = [("speech", audio[i:i + size]) for i in range(0, len(audio), size) if len(audio[i:i + size]) >= SAMPLE_RATE // 2]
+    rng = np.random.default_rng(seed)
+    for n in range(silent):
+        noise = (rng.standard_normal(size) * 0.003).astype(np.float32)
+        clips.insert(min(len(clips), 1 + n * 2), ("noise", noise))
+    return clips
+
+
+def run_profile(manager, profile, clips, language):
+    recognizer = SpeechRecognizer(model_manager=manager, profile=profile, language=language)
+    rows = []
+    for kind, clip in clips:
+        options = recognizer.decode_options("bench")
+        result = manager.transcribe(clip, **options)
+        recognizer.remember("bench", result)
+        rows.append({
+            "kind": kind,
+            "audio_seconds": round(len(clip) / SAMPLE_RATE, 3),
+            "decode_seconds": round(result["decode_seconds"], 4),
+            "skipped": bool(result.get("skipped")),
+            "language": result.get("language"),
+            "text": result["text"].strip(),
+        })
+    speech = [r for r in rows if r["kind"] == "speech"]
+    noise = [r for r in rows if r["kind"] == "noise"]
+    decode = sum(r["decode_seconds"] for r in rows)
+    return {
+        "profile": profile,
+        "utterances": rows,
+        "mean_speech_decode_seconds": round(statistics.mean(r["decode_seconds"] for r in speech), 4) if speech else None,
+        "mean_noise_decode_seconds": round(statistics.mean(r["decode_seconds"] for r in noise), 4) if noise else None,
+        "real_time_factor": round(decode / sum(r["audio_seconds"] for r in rows), 4),
+        "noise_skipped": sum(r["skipped"] for r in noise),
+        "speech_skipped": sum(r["skipped"] for r in speech),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--audio", help="16 kHz mono WAV with several sentences of speech")
+    parser.add_argument("--seconds", type=float, default=20.0, help="length of the synthetic clip")
+    parser.add_argument("--utterance-seconds", type=float, default=4.0)
+    parser.add_argument("--silent", type=int, default=3, help="background-noise clips to mix in")
+    parser.add_argument("--model", default="tiny")
+    parser.add_argument("--profiles", nargs="+", default=list(DECODING_PROFILES), choices=list(DECODING_PROFILES))
+    parser.add_argument("--language", help="fix the language for every profile instead of detecting it")
+    parser.add_argument("--runs", type=int, default=2, help="passes per profile; the fastest is reported")
+    parser.add_argument("--output", help="write the full report as JSON here")
+    args = parser.parse_args()
+
+    clips = utterances(load_audio(args.audio, args.seconds), args.utterance_seconds, args.silent)
+    manager = ModelManager(short_model=args.model)
+    manager.warm_up()
+
+    reports = []
+    for profile in args.profiles:
+        runs = [run_profile(manager, profile, clips, args.language) for _ in range(args.runs)]
+        reports.append(min(runs, key=lambda r: r["real_time_factor"]))
+
+    print(f"\nmodel: {args.model}, utterances: {len(clips)} ({args.silent} noise), runs: {args.runs}\n")
+    print(f"{'profile':<14} {'speech s':>9} {'noise s':>9} {'RTF':>7} {'noise skipped':>14} {'speech skipped':>15}")
+    for r in reports:
+        print(f"{r['profile']:<14} {r['mean_speech_decode_seconds'] or 0:>9.3f} {r['mean_noise_decode_seconds'] or 0:>9.3f} "
+              f"{r['real_time_factor']:>7.3f} {r['noise_skipped']:>14} {r['speech_skipped']:>15}")
+    for r in reports:
+        print(f"\n{r['profile']}:")
+        for row in r["utterances"]:
+            marker = "skip" if row["skipped"] else f"{row['decode_seconds']:.3f}s"
+            print(f"  [{row['kind']:<6} {marker:>7}] {row['text']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Local stand-in for the OpenAI HTTP API, for load tests.
+
+Serves /v1/chat/completions (including `stream: true`) and /v1/embeddings
+with a configurable delay, so runs measure our pipeline rather than the
+network or OpenAI's queue.
+
+    python benchmarks/fake_openai.py --port 8089 --latency 0.4 --jitter 0.1
+
+Point the app at it with OPENAI_BASE_URL=http://127.0.0.1:8089/v1 and any
+non-empty OPENAI_API_KEY.
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ASSISTANT_REPLY = ("Sounds great! How many guests are you expecting, "
+                   "and do you have a budget in mind?")
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    latency = 0.3
+    jitter = 0.0
+    embedding_dim = 1536
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass  # keep the console quiet under load
+
+    def _delay(self):
+        time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+
+        if self.path.endswith("/chat/completions"):
+            self._chat(request)
+        elif self.path.endswith("/embeddings"):
+            self._embeddings(request)
+        else:
+            self._send_json({"error": {"message": f"Unknown path {self.path}"}}, status=404)
+
+    def _chat(self, request):
+        messages = request.get("messages", [])
+        system = messages[0]["content"] if messages and messages[0]["role"] == "system" else ""
+        # The entity extractor asks for JSON only
+        content = "{}" if "entity extraction" in system else ASSISTANT_REPLY
+
+        if request.get("stream"):
+            self._stream_chat(request, content)
+            return
+
+        self._delay()
+        self._send_json({
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "fake"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        })
+
+    def _stream_chat(self, request, content):
+        """Server-sent events, one word per chunk, latency spent before the first token."""
+        self._delay()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        words = content.split(" ")
+        for i, word in enumerate(words):
+            delta = {"content": word + (" " if i < len(words) - 1 else "")}
+            chunk = {"id": "chatcmpl-fake", "object": "chat.completion.chunk",
+                     "model": request.get("model", "fake"),
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+            time.sleep(0.01)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+    def _embeddings(self, request):
+        self._delay()
+        inputs = request.get("input", "")
+        inputs = inputs if isinstance(inputs, list) else [inputs]
+        data = []
+        for index, text in enumerate(inputs):
+            # Deterministic per text so similarity lookups behave consistently
+            rng = random.Random(hashlib.sha1(str(text).encode()).hexdigest())
+            data.append({"object": "embedding", "index": index,
+                         "embedding": [rng.uniform(-1, 1) for _ in range(self.embedding_dim)]})
+        self._send_json({"object": "list", "data": data, "model": request.get("model", "fake"),
+                         "usage": {"prompt_tokens": 0, "total_tokens": 0}})
+
+
+def start_fake_openai(host="127.0.0.1", port=0, latency=0.3, jitter=0.0):
+    """Start the fake API on a daemon thread; returns (server, base_url)."""
+    handler = type("Handler", (FakeOpenAIHandler,), {"latency": latency, "jitter": jitter})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds before each response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- seconds of random extra latency")
+    args = parser.parse_args()
+
+    server, base_url = start_fake_openai(args.host, args.port, args.latency, args.jitter)
+    print(f"Fake OpenAI API on {base_url} (latency {args.latency}s +/- {args.jitter}s)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+End-to-end load test with simulated voice clients.
+
+Each client opens a Socket.IO connection, streams a prerecorded 16 kHz
+clip into 'audio_data' at real-time pace (followed by silence, like a
+live microphone), and records when each status transition arrives:
+listening -> processing -> transcribing -> assistant_response -> ready.
+The run is repeated for every concurrency level and summarised as
+latency percentiles and completed turns per second.
+
+Typical setup, with OpenAI replaced by the local fake:
+
+    python benchmarks/fake_openai.py --port 8089 --latency 0.4 &
+    OPENAI_BASE_URL=http://127.0.0.1:8089/v1 OPENAI_API_KEY=test APP_DEBUG=0 python app.py &
+    python benchmarks/loadtest.py --audio speech.wav --concurrency 1 2 4 8 --turns 3
+
+Use a WAV with real speech: Whisper returns nothing for synthetic tones,
+so the built-in fallback clip only exercises the VAD and transcription path.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import socketio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import Histogram  # noqa: E402
+
+SAMPLE_RATE = 16000
+CHUNK_SECONDS = 0.2
+
+# Intervals reported, as (name, start event, end event)
+INTERVALS = (
+    ("vad_trigger", "speech_end", "processing"),
+    ("transcription", "processing", "transcription_final"),
+    ("response", "transcription_final", "assistant_response"),
+    ("end_to_end", "speech_end", "assistant_response"),
+    ("first_audio", "speech_end", "tts_audio"),
+)
+
+
+def load_clip(path):
+    if path:
+        import soundfile as sf
+        audio, rate = sf.read(path, dtype="float32")
+        if audio.ndim > 1:
+            audio = audio.mean(axis=1)
+        if rate != SAMPLE_RATE:
+            from audio_codec import resample
+            audio = resample(audio, rate, SAMPLE_RATE)
+        return audio
+
+    print("WARNING: no --audio given, using a synthetic clip (Whisper will likely return no text)")
+    t = np.arange(int(2.0 * SAMPLE_RATE)) / SAMPLE_RATE
+    voiced = sum(np.sin(2 * np.pi * 140 * k * t) / k for k in range(1, 12)) * 0.05
+    return voiced.astype(np.float32)
+
+
+def to_pcm16(samples):
+    return (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+
+class SimulatedClient:
+    """One voice client running a number of turns against the server."""
+
+    def __init__(self, url, clip, turns, timeout):
+        self.url = url
+        self.clip = clip
+        self.turns = turns
+        self.timeout = timeout
+        self.results = []
+        self.errors = []
+
+        self.sio = socketio.Client(reconnection=False)
+        self._events = {}
+        self._turn_done = threading.Event()
+        self._configured = threading.Event()
+        self._paused = False
+
+        self.sio.on("status", self._on_status)
+        self.sio.on("transcription", self._on_transcription)
+        self.sio.on("assistant_response", self._on_assistant_response)
+        self.sio.on("tts_audio", lambda frame: self._mark("tts_audio"))
+        self.sio.on("audio_config", lambda data: self._configured.set())
+        self.sio.on("backpressure", self._on_backpressure)
+        self.sio.on("error", lambda data: self.errors.append(data.get("message")))
+
+    def _mark(self, name):
+        self._events.setdefault(name, time.perf_counter())
+
+    def _on_status(self, data):
+        status = data.get("status")
+        if status:
+            self._mark(status)
+        # A 'busy' status means the server turned the utterance away
+        if status in ("ready", "busy") and "processing" in self._events:
+            self._turn_done.set()
+
+    def _on_transcription(self, data):
+        self._mark("transcription_final" if data.get("final") else "transcription_partial")
+
+    def _on_assistant_response(self, data):
+        self._mark("assistant_response")
+
+    def _on_backpressure(self, data):
+        self._paused = bool(data.get("pause"))
+
+    def _stream(self, samples, until=None):
+        """Send samples in real-time-paced chunks; stop early once until() is true."""
+        chunk = int(CHUNK_SECONDS * SAMPLE_RATE)
+        next_send = time.perf_counter()
+        for start in range(0, len(samples), chunk):
+            if until and until():
+                return
+            if not self._paused:
+                self.sio.emit("audio_data", to_pcm16(samples[start:start + chunk]))
+            next_send += CHUNK_SECONDS
+            time.sleep(max(0.0, next_send - time.perf_counter()))
+
+    def run(self):
+        try:
+            self.sio.connect(self.url, transports=["websocket"])
+            self.sio.emit("audio_config", {"encodings": ["pcm_s16le"], "sample_rate": SAMPLE_RATE})
+            self._configured.wait(timeout=5)
+
+            silence = np.zeros(int(self.timeout * SAMPLE_RATE), dtype=np.float32)
+            for _ in range(self.turns):
+                self._events = {}
+                self._turn_done.clear()
+
+                self._stream(self.clip)
+                self._events["speech_end"] = time.perf_counter()
+                # Keep the "microphone" open with silence until the turn completes
+                self._stream(silence, until=self._turn_done.is_set)
+
+                if not self._turn_done.is_set():
+                    self.errors.append("turn timed out")
+                    continue
+                self.results.append(dict(self._events))
+        except Exception as e:
+            self.errors.append(str(e))
+        finally:
+            if self.sio.connected:
+                self.sio.disconnect()
+
+
+def run_level(url, clip, concurrency, turns, timeout):
+    clients = [SimulatedClient(url, clip, turns, timeout) for _ in range(concurrency)]
+    threads = [threading.Thread(target=client.run) for client in clients]
+
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    histograms = {name: Histogram(window=100000) for name, _, _ in INTERVALS}
+    completed = rejected = 0
+    for client in clients:
+        for events in client.results:
+            if "assistant_response" in events:
+                completed += 1
+            elif "busy" in events:
+                rejected += 1
+            for name, start, end in INTERVALS:
+                if start in events and end in events:
+                    histograms[name].observe(events[end] - events[start])
+
+    report = {
+        "concurrency": concurrency,
+        "turns_attempted": concurrency * turns,
+        "turns_completed": completed,
+        "turns_rejected": rejected,
+        "errors": sum(len(client.errors) for client in clients),
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_turns_per_second": round(completed / elapsed, 3) if elapsed else 0.0,
+        "latency": {}
+    }
+    for name, histogram in histograms.items():
+        quantiles = histogram.quantiles()
+        report["latency"][name] = {
+            "count": histogram.count,
+            **{f"p{int(q * 100)}": round(value, 3) for q, value in quantiles.items()}
+        }
+    return report
+
+
+def print_report(reports):
+    print()
+    header = f"{'conc':>5} {'done':>6} {'busy':>5} {'err':>4} {'turns/s':>8}"
+    for name, _, _ in INTERVALS:
+        header += f" {name + ' p50/p95/p99':>30}"
+    print(header)
+    for report in reports:
+        line = (f"{report['concurrency']:>5} {report['turns_completed']:>6} {report['turns_rejected']:>5} "
+                f"{report['errors']:>4} {report['throughput_turns_per_second']:>8.3f}")
+        for name, _, _ in INTERVALS:
+            stats = report["latency"][name]
+            line += f" {stats['p50']:>9.3f}/{stats['p95']:>9.3f}/{stats['p99']:>9.3f}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:5050")
+    parser.add_argument("--audio", help="16 kHz mono WAV with one spoken utterance")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--turns", type=int, default=3, help="turns per client")
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds to wait for each turn")
+    parser.add_argument("--output", help="write the full report as JSON here")
+    args = parser.parse_args()
+
+    clip = load_clip(args.audio)
+    reports = []
+    for concurrency in args.concurrency:
+        print(f"Running {concurrency} client(s) x {args.turns} turn(s)...")
+        reports.append(run_level(args.url, clip, concurrency, args.turns, args.timeout))
+
+    print_report(reports)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
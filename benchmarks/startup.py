@@ -0,0 +1,190 @@
+"""
+Measure how long the app takes to start.
+
+Three numbers are reported, each the median of --runs fresh processes:
+
+- import: cumulative `python -X importtime -c "import app"` time for app,
+  with the costliest modules app imports directly listed under it.
+- http: from launching `python app.py` until GET / answers.
+- ready: from launching until /ready returns 200 (every required
+  component built and warm). Stays empty if that never happens within
+  --timeout, e.g. when Whisper isn't installed.
+
+If app.py exits on its own, the benchmark fails and prints the end of
+its stderr.
+
+Append each run to a history file to track startup time across changes:
+
+    python benchmarks/startup.py --runs 5 --history benchmarks/startup_history.jsonl
+"""
+import argparse
+import json
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+@contextmanager
+def scratch_data(env):
+    """
+    env with the app's database, archive and RAG store in a temporary
+    directory, so a run neither writes into the repo's files nor starts
+    from data an earlier run left behind.
+    """
+    with tempfile.TemporaryDirectory(prefix="startup-") as directory:
+        yield dict(env,
+                   DATABASE_PATH=os.path.join(directory, "speech_app.db"),
+                   ARCHIVE_DIR=os.path.join(directory, "archive"),
+                   RAG_DB_PATH=os.path.join(directory, "rag.db"))
+
+
+def measure_imports(env):
+    """Cumulative import time of app and of each module app imports directly, in seconds."""
+    with scratch_data(env) as env:
+        completed = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"],
+                                   cwd=ROOT, env=env, capture_output=True, text=True, timeout=300)
+    # Lines come out in post-order: a module's own imports are listed just before it,
+    # indented two more spaces
+    children, direct = [], None
+    for line in completed.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        _, cumulative_us, indent, name = match.groups()
+        depth = (len(indent) - 1) // 2
+        if depth == 1:
+            children.append((name, int(cumulative_us) / 1e6))
+        elif depth == 0:
+            if name == "app":
+                direct = (int(cumulative_us) / 1e6, dict(children))
+            children = []
+    if completed.returncode != 0 or direct is None:
+        raise RuntimeError(f"import app failed:\n{completed.stderr[-2000:]}")
+    return direct
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def get_status(url):
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except (urllib.error.URLError, OSError):
+        return None
+
+
+def measure_server(env, timeout):
+    """Seconds from launch until GET / answers and until /ready is 200 (None if it never is)."""
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    # stderr goes to a file rather than a pipe nobody reads, which could fill up and block the server
+    with scratch_data(dict(env, PORT=str(port), APP_DEBUG="0")) as env, tempfile.TemporaryFile(mode="w+") as stderr:
+        started = time.perf_counter()
+        process = subprocess.Popen([sys.executable, "app.py"], cwd=ROOT, env=env,
+                                   stdout=subprocess.DEVNULL, stderr=stderr)
+        http = ready = None
+        try:
+            while time.perf_counter() - started < timeout and process.poll() is None:
+                if http is None and get_status(base + "/") == 200:
+                    http = time.perf_counter() - started
+                if http is not None and get_status(base + "/ready") == 200:
+                    ready = time.perf_counter() - started
+                    break
+                time.sleep(0.02)
+            exited = process.poll()
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if exited is not None:
+            stderr.seek(0)
+            raise RuntimeError(f"app.py exited with code {exited}:\n{stderr.read()[-2000:]}")
+    return http, ready
+
+
+def median(values):
+    values = [v for v in values if v is not None]
+    return round(statistics.median(values), 4) if values else None
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds to wait for the server per run")
+    parser.add_argument("--top", type=int, default=10, help="how many of the costliest modules to list")
+    parser.add_argument("--skip-server", action="store_true", help="only measure import time")
+    parser.add_argument("--output", help="write the report as JSON here")
+    parser.add_argument("--history", help="append the report as one JSON line to this file")
+    args = parser.parse_args()
+
+    # Warm-up threads would compete with the import being measured
+    env = dict(os.environ, WARM_UP="0", PYTHONDONTWRITEBYTECODE="1")
+    import_runs = [measure_imports(env) for _ in range(args.runs)]
+    server_runs = []
+    if not args.skip_server:
+        server_env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+        server_runs = [measure_server(server_env, args.timeout) for _ in range(args.runs)]
+
+    _, last_children = import_runs[-1]
+    slowest = sorted(last_children.items(), key=lambda item: item[1], reverse=True)[:args.top]
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "python": sys.version.split()[0],
+        "runs": args.runs,
+        "import_seconds": median([total for total, _ in import_runs]),
+        "http_seconds": median([http for http, _ in server_runs]),
+        "ready_seconds": median([ready for _, ready in server_runs]),
+        "slowest_imports": {name: round(seconds, 4) for name, seconds in slowest},
+    }
+
+    def seconds(value):
+        return f"{value}s" if value is not None else "not reached"
+
+    print(f"import app:  {seconds(report['import_seconds'])}")
+    if not args.skip_server:
+        print(f"HTTP up:     {seconds(report['http_seconds'])}")
+        print(f"ready:       {seconds(report['ready_seconds'])}")
+    print("slowest imports made by app:")
+    for name, seconds in report["slowest_imports"].items():
+        print(f"  {seconds:8.4f}s  {name}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.history:
+        with open(args.history, "a") as f:
+            f.write(json.dumps(report) + "\n")
+
+
+if __name__ == "__main__":
+    main()
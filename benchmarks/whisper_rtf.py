@@ -0,0 +1,71 @@
+"""
+Measure Whisper real-time factor (decode time / audio time) per model.
+
+Usage:
+    python benchmarks/whisper_rtf.py --audio sample.wav --models tiny base --quantize both --threads 4
+
+Without --audio a synthetic 16 kHz clip is used, which is only useful for
+comparing configurations against each other, not for absolute numbers.
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model_manager import ModelManager, SAMPLE_RATE  # noqa: E402
+
+
+def load_audio(path, seconds):
+    if path:
+        import soundfile as sf
+        audio, rate = sf.read(path, dtype="float32")
+        if audio.ndim > 1:
+            audio = audio.mean(axis=1)
+        if rate != SAMPLE_RATE:
+            from audio_codec import resample
+            audio = resample(audio, rate, SAMPLE_RATE)
+        return audio
+
+    # Harmonic tone with noise, roughly speech-shaped
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    audio = sum(np.sin(2 * np.pi * 140 * k * t) / k for k in range(1, 12)) * 0.05
+    audio += np.random.default_rng(0).standard_normal(len(t)) * 0.005
+    return audio.astype(np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--audio", help="16 kHz mono WAV file to decode")
+    parser.add_argument("--seconds", type=float, default=10.0, help="length of the synthetic clip")
+    parser.add_argument("--models", nargs="+", default=["tiny"])
+    parser.add_argument("--quantize", choices=["off", "on", "both"], default="both")
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    audio = load_audio(args.audio, args.seconds)
+    duration = len(audio) / SAMPLE_RATE
+    quantize_modes = {"off": [False], "on": [True], "both": [False, True]}[args.quantize]
+
+    rows = []
+    for name in args.models:
+        for quantize in quantize_modes:
+            manager = ModelManager(short_model=name, quantize=quantize, num_threads=args.threads)
+            manager.warm_up()
+            for _ in range(args.runs):
+                manager.transcribe(audio, language="en")
+            stats = manager.stats()[name]
+            rows.append((name, quantize, stats["load_seconds"],
+                         stats["decode_seconds"] / stats["calls"], stats["real_time_factor"]))
+
+    print(f"\naudio: {duration:.1f}s, runs: {args.runs}, threads: {args.threads or 'default'}\n")
+    print(f"{'model':<10} {'int8':<6} {'load s':>8} {'decode s':>10} {'RTF':>8}")
+    for name, quantize, load_seconds, decode_seconds, rtf in rows:
+        print(f"{name:<10} {'yes' if quantize else 'no':<6} {load_seconds:>8.2f} {decode_seconds:>10.3f} {rtf:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
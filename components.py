@@ -0,0 +1,131 @@
+"""
+Deferred construction of the app's heavy components.
+
+Whisper models, the speech synthesis pool and the OpenAI-backed helpers
+are not needed to serve the first HTTP request, so app.py registers them
+here instead of building them at import. Each one is built the first time
+it is used, or earlier by a background warm-up thread, and its state is
+reported by the /ready endpoint.
+"""
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+COLD, LOADING, READY, FAILED = "cold", "loading", "ready", "failed"
+
+
+class Component:
+    """
+    A lazily built object. Attribute access is forwarded to the built
+    instance, so a Component can stand in for the object it wraps.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Any],
+                 warm: Optional[Callable[[Any], None]] = None, required: bool = True):
+        self.name = name
+        self.factory = factory
+        self.warm = warm  # optional extra work (e.g. a first decode) that makes the instance fast
+        self.required = required  # whether /ready waits for this component
+        self.state = COLD
+        self.error: Optional[str] = None
+        self.seconds = 0.0
+        self._instance = None
+        self._built = False
+        self._lock = threading.RLock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._built
+
+    def get(self):
+        """The instance, built on first call."""
+        if self._built:
+            return self._instance
+        with self._lock:
+            if not self._built:
+                self._build()
+            return self._instance
+
+    def warm_up(self):
+        """Build the instance and run its warm-up; failures are recorded, not raised."""
+        try:
+            instance = self.get()
+            if self.warm is not None and self.state != READY:
+                start = time.perf_counter()
+                self.warm(instance)
+                self.seconds += time.perf_counter() - start
+        except Exception as e:
+            self.state = FAILED
+            self.error = str(e)
+            logger.exception("Error warming up %s", self.name)
+            return
+        self.state = READY
+
+    def _build(self):
+        self.state = LOADING
+        start = time.perf_counter()
+        try:
+            self._instance = self.factory()
+        except Exception as e:
+            self.state = FAILED
+            self.error = str(e)
+            raise
+        self.seconds = time.perf_counter() - start
+        self._built = True
+        # Without a warm-up step, a built instance is as ready as it gets
+        self.state = LOADING if self.warm is not None else READY
+        logger.info("Initialized %s in %.2fs", self.name, self.seconds)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "required": self.required,
+            "seconds": round(self.seconds, 3),
+            "error": self.error,
+        }
+
+    def __getattr__(self, attr):
+        # Only reached for attributes not set in __init__
+        return getattr(self.get(), attr)
+
+
+class ComponentRegistry:
+    """
+    The app's deferred components, in the order they are warmed up. With
+    warm_steps=False (no warm-up thread), nothing would ever run a
+    component's warm step, so it is dropped and a built component is ready.
+    """
+
+    def __init__(self, warm_steps: bool = True):
+        self.components: Dict[str, Component] = {}
+        self.warm_steps = warm_steps
+        self.started_at = time.perf_counter()
+
+    def register(self, name: str, factory: Callable[[], Any],
+                 warm: Optional[Callable[[Any], None]] = None, required: bool = True) -> Component:
+        component = Component(name, factory, warm if self.warm_steps else None, required)
+        self.components[name] = component
+        return component
+
+    def warm_up(self, names: Optional[List[str]] = None):
+        for name in names or list(self.components):
+            self.components[name].warm_up()
+        logger.info("Warm-up finished %.2fs after startup", time.perf_counter() - self.started_at)
+
+    def warm_up_async(self, names: Optional[List[str]] = None) -> threading.Thread:
+        """Warm components in a background thread."""
+        thread = threading.Thread(target=self.warm_up, args=(names,), daemon=True, name="warm-up")
+        thread.start()
+        return thread
+
+    def readiness(self) -> Dict[str, Any]:
+        """Whether every required component is ready, and the state of each."""
+        statuses = {name: component.status() for name, component in self.components.items()}
+        return {
+            "ready": all(s["state"] == READY for s in statuses.values() if s["required"]),
+            "uptime_seconds": round(time.perf_counter() - self.started_at, 3),
+            "components": statuses,
+        }
@@ -1,9 +1,15 @@
+import logging
+import os
+import time
 from datetime import datetime
-from typing import Optional, List, Dict, Any
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Float, ForeignKey, Boolean
+from typing import Optional, List, Dict, Any, Callable
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, Float, ForeignKey, Boolean, LargeBinary
+from sqlalchemy import delete, func, select
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 
+logger = logging.getLogger(__name__)
+
 Base = declarative_base()
 
 
@@ -13,8 +19,8 @@ class Session(Base):
 
     id = Column(Integer, primary_key=True)
     start_time = Column(DateTime, nullable=False, default=datetime.utcnow)
-    end_time = Column(DateTime)
-    user_id = Column(String, nullable=True)  # Optional for GDPR compliance
+    end_time = Column(DateTime, index=True)
+    user_id = Column(String, nullable=True, index=True)  # Optional for GDPR compliance
 
     # Relationships
     interactions = relationship("Interaction", back_populates="session", cascade="all, delete-orphan")
@@ -25,10 +31,12 @@ class Interaction(Base):
     __tablename__ = "interactions"
 
     id = Column(Integer, primary_key=True)
-    session_id = Column(Integer, ForeignKey('sessions.id'), nullable=False)
+    session_id = Column(Integer, ForeignKey('sessions.id'), nullable=False, index=True)
     timestamp = Column(DateTime, nullable=False, default=datetime.utcnow)
     transcript = Column(String, nullable=False)
     audio_duration = Column(Float)  # Duration in seconds
+    decode_seconds = Column(Float)  # Whisper decode time, so audio_duration gives the real-time factor
+    segments = Column(LargeBinary)  # Packed Whisper segments (see segments.py)
     priority = Column(Boolean, default=False)  # Priority flag for important interactions
 
     # Relationships
@@ -43,7 +51,7 @@ class Entity(Base):
     __tablename__ = "entities"
 
     id = Column(Integer, primary_key=True)
-    interaction_id = Column(Integer, ForeignKey('interactions.id'), nullable=False)
+    interaction_id = Column(Integer, ForeignKey('interactions.id'), nullable=False, index=True)
     entity_type = Column(String, nullable=False)
     entity_value = Column(String, nullable=False)
 
@@ -51,13 +59,59 @@ class Entity(Base):
     interaction = relationship("Interaction", back_populates="entities")
 
 
-def init_db(db_path: str) -> sessionmaker:
-    """Initialize the database and return a session factory."""
-    engine = create_engine(f"sqlite:///{db_path}", echo=True)
+def init_db(db_path: str, sql_echo: Optional[bool] = None) -> sessionmaker:
+    """
+    Initialize the database and return a session factory.
+
+    SQL statements are only logged when sql_echo (or SQL_ECHO=1) is set,
+    and then through the logging queue rather than straight to stdout.
+    """
+    if sql_echo is None:
+        sql_echo = os.getenv("SQL_ECHO", "0") == "1"
+    if sql_echo:
+        logging.getLogger("sqlalchemy.engine").setLevel(logging.INFO)
+    engine = create_engine(f"sqlite:///{db_path}")
+    with engine.begin() as conn:
+        # Only takes effect on a new file; archive.incremental_vacuum() converts older ones
+        conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
     Base.metadata.create_all(engine)
+    _ensure_columns(engine)
+    _ensure_indexes(engine)
     return sessionmaker(bind=engine)
 
 
+# Columns added after the first release, as (table, column, SQL type)
+_ADDED_COLUMNS = [
+    ("interactions", "decode_seconds", "FLOAT"),
+    ("interactions", "segments", "BLOB"),
+]
+
+
+def _ensure_columns(engine) -> None:
+    """Add columns declared after a database was first created (create_all skips existing tables)."""
+    with engine.begin() as conn:
+        for table, column, sql_type in _ADDED_COLUMNS:
+            existing = {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table})")}
+            if column not in existing:
+                conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column} {sql_type}")
+
+
+# Indexes added after the first release, as (table, column); named the way create_all names them
+_ADDED_INDEXES = [
+    ("sessions", "end_time"),
+    ("sessions", "user_id"),
+    ("interactions", "session_id"),
+    ("entities", "interaction_id"),
+]
+
+
+def _ensure_indexes(engine) -> None:
+    """Add indexes declared after a database was first created (create_all skips existing tables)."""
+    with engine.begin() as conn:
+        for table, column in _ADDED_INDEXES:
+            conn.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS ix_{table}_{column} ON {table} ({column})")
+
+
 def create_session(session_factory: sessionmaker, user_id: Optional[str] = None) -> Session:
     """Create a new session."""
     db_session = session_factory()
@@ -93,13 +147,33 @@ def end_session(session_factory: sessionmaker, session_id: int) -> None:
         db_session.close()
 
 
+def resume_session(session_factory: sessionmaker, session_id: int) -> bool:
+    """
+    Reopen an existing session (clearing its end time) for a returning
+    connection. Returns False if the session no longer exists.
+    """
+    db_session = session_factory()
+    try:
+        session = db_session.query(Session).filter_by(id=session_id).first()
+        if not session:
+            return False
+        if session.end_time is not None:
+            session.end_time = None
+            db_session.commit()
+        return True
+    finally:
+        db_session.close()
+
+
 def store_interaction(
         session_factory: sessionmaker,
         session_id: int,
         transcript: str,
         audio_duration: Optional[float] = None,
         priority: bool = False,
-        role: str = "user"
+        role: str = "user",
+        decode_seconds: Optional[float] = None,
+        segments: Optional[bytes] = None
 ) -> Interaction:
     """Store a new interaction in the database with priority flag."""
     db_session = session_factory()
@@ -109,6 +183,8 @@ def store_interaction(
             session_id=session_id,
             transcript=transcript,
             audio_duration=audio_duration,
+            decode_seconds=decode_seconds,
+            segments=segments,
             priority=priority,
             role=role
         )
@@ -125,6 +201,8 @@ def store_interaction(
             timestamp=interaction.timestamp,
             transcript=interaction.transcript,
             audio_duration=interaction.audio_duration,
+            decode_seconds=interaction.decode_seconds,
+            segments=interaction.segments,
             priority=interaction.priority,
             role=interaction.role
         )
@@ -154,18 +232,89 @@ def get_user_sessions(
     finally:
         db_session.close()
 
-def delete_user_data(session_factory: sessionmaker, user_id: str) -> None:
-    """Delete all data associated with a user (GDPR compliance)."""
+def count_user_data(session_factory: sessionmaker, user_id: str) -> Dict[str, int]:
+    """Count a user's sessions and interactions (both lookups are indexed)."""
     db_session = session_factory()
-    
+
     try:
-        # This will cascade delete all associated interactions
-        db_session.query(Session).filter_by(user_id=user_id).delete()
-        db_session.commit()
+        sessions = db_session.execute(
+            select(func.count()).select_from(Session).where(Session.user_id == user_id)).scalar()
+        interactions = db_session.execute(
+            select(func.count()).select_from(Interaction).join(Session, Interaction.session_id == Session.id)
+            .where(Session.user_id == user_id)).scalar()
+        return {"sessions": sessions, "interactions": interactions}
     finally:
         db_session.close()
 
 
+def delete_user_data(
+        session_factory: sessionmaker,
+        user_id: str,
+        batch_size: int = 500,
+        pause: float = 0.0,
+        on_interactions: Optional[Callable[[List[int]], None]] = None,
+        on_transcripts: Optional[Callable[[List[str]], None]] = None,
+        on_progress: Optional[Callable[[Dict[str, int]], None]] = None
+) -> Dict[str, int]:
+    """
+    Delete all data associated with a user (GDPR compliance).
+
+    Rows are removed children first (entities, interactions, then
+    sessions) in transactions of at most batch_size interactions, each
+    found through an index, so the write lock is only held briefly and
+    other requests can run between batches (sleeping `pause` seconds).
+    on_interactions(ids) is called before each batch of interactions is
+    deleted, to remove copies held elsewhere (e.g. embeddings), and
+    on_transcripts(texts) with their transcripts (e.g. for caches keyed
+    on text). Safe to run again after an interruption. Returns the
+    deleted row counts.
+    """
+    deleted = {"sessions": 0, "interactions": 0, "entities": 0}
+
+    while True:
+        db_session = session_factory()
+        try:
+            session_ids = db_session.execute(
+                select(Session.id).where(Session.user_id == user_id).limit(batch_size)).scalars().all()
+            if not session_ids:
+                break
+
+            while True:
+                rows = db_session.execute(
+                    select(Interaction.id, Interaction.transcript).where(Interaction.session_id.in_(session_ids))
+                    .limit(batch_size)).all()
+                if not rows:
+                    break
+                interaction_ids = [row.id for row in rows]
+                if on_interactions is not None:
+                    on_interactions(interaction_ids)
+                if on_transcripts is not None:
+                    on_transcripts([row.transcript for row in rows if row.transcript])
+                deleted["entities"] += db_session.execute(
+                    delete(Entity).where(Entity.interaction_id.in_(interaction_ids))).rowcount
+                deleted["interactions"] += db_session.execute(
+                    delete(Interaction).where(Interaction.id.in_(interaction_ids))).rowcount
+                db_session.commit()
+                if on_progress is not None:
+                    on_progress(dict(deleted))
+                if pause:
+                    time.sleep(pause)
+
+            deleted["sessions"] += db_session.execute(
+                delete(Session).where(Session.id.in_(session_ids))).rowcount
+            db_session.commit()
+            if on_progress is not None:
+                on_progress(dict(deleted))
+        except Exception:
+            db_session.rollback()
+            raise
+        finally:
+            db_session.close()
+
+    logger.info("Deleted user data: %s", deleted)
+    return deleted
+
+
 def store_entities(
         session_factory: sessionmaker,
         interaction_id: int,
@@ -217,7 +366,7 @@ def store_entities(
         return result
     except Exception as e:
         db_session.rollback()
-        print(f"Error storing entities: {str(e)}")
+        logger.exception("Error storing entities")
         return []
     finally:
         db_session.close()
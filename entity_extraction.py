@@ -1,23 +1,44 @@
+import copy
 import json
+import logging
 import re
 import os
-import openai
 from typing import Dict, Any, List, Optional
 from datetime import datetime
 from dotenv import load_dotenv
+from cache import TTLCache, SingleFlight, normalize_text
+from llm_client import get_client
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 class EntityExtractor:
     """Extract entities from text using OpenAI API."""
 
-    def __init__(self):
+    def __init__(self, cache_size: int = 512, cache_ttl: float = 600.0, deadline: float = 10.0):
         """Initialize the entity extractor."""
-        print(f"Setting up entity extraction with OpenAI")
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            print("WARNING: OPENAI_API_KEY not found in environment variables")
-        openai.api_key = api_key
+        if not os.getenv("OPENAI_API_KEY"):
+            logger.warning("OPENAI_API_KEY not found in environment variables")
+        self.llm = get_client()
+        # Seconds allowed for one extraction, retries included
+        self.deadline = deadline
+
+        # Results keyed on normalized text, so repeated confirmations and
+        # retries don't each pay for an OpenAI round-trip
+        self.cache = TTLCache(max_entries=cache_size, ttl_seconds=cache_ttl)
+        self.inflight = SingleFlight()
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Return hit/miss metrics for the extraction cache."""
+        stats = self.cache.stats()
+        stats["coalesced"] = self.inflight.coalesced
+        return stats
+
+    def forget(self, session_ids=(), texts=()) -> int:
+        """Drop cached extractions of these texts (a deleted user's transcripts)."""
+        keys = {normalize_text(text) for text in texts}
+        return self.cache.remove_where(lambda key: key in keys) if keys else 0
 
     def extract_entities(self, text: str) -> Dict[str, Any]:
         """
@@ -40,12 +61,44 @@ class EntityExtractor:
             return entities
 
         except Exception as e:
-            print(f"Error in entity extraction with OpenAI: {str(e)}")
+            logger.exception("Error in entity extraction with OpenAI")
             # Fall back to simple extraction if there's any error
             return self._extract_entities_with_regex(text)
     
     def _extract_entities_with_openai(self, text: str) -> Dict[str, Any]:
-        """Extract entities using OpenAI."""
+        """
+        Extract entities using OpenAI, served from the cache when the same
+        normalized text was seen recently. Concurrent requests for the same
+        text share a single in-flight call.
+        """
+        key = normalize_text(text)
+        if not key:
+            return {}
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            return copy.deepcopy(cached)
+
+        try:
+            entities = self.inflight.do(key, lambda: self._fetch_entities(key, text))
+            return copy.deepcopy(entities)
+        except Exception as e:
+            logger.warning("Error in OpenAI entity extraction: %s", e)
+            return {}
+
+    def _fetch_entities(self, key: str, text: str) -> Dict[str, Any]:
+        """Call OpenAI and cache the parsed result. Errors are not cached."""
+        # Another caller may have filled the cache while we waited for the lock
+        cached = self.cache.peek(key)
+        if cached is not None:
+            return cached
+
+        entities = self._call_openai(text)
+        self.cache.set(key, entities)
+        return entities
+
+    def _call_openai(self, text: str) -> Dict[str, Any]:
+        """Run the OpenAI extraction prompt. Raises on API or parse errors."""
         system_prompt = """
         You are an expert entity extraction system. Extract entities from the input text related to event planning.
         Return a JSON object with the following structure (only include fields if they are present in the text):
@@ -71,36 +124,29 @@ class EntityExtractor:
         IMPORTANT: If a list field has only one item, still format it as a list.
         """
         
-        try:
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": text}
-                ],
-                temperature=0.1  # Lower temperature for more deterministic outputs
-            )
-            
-            # Extract the response content
-            response_text = response.choices[0].message.content
-            
-            # Parse the JSON response
-            entities = json.loads(response_text)
-            
-            # Ensure we have a consistent format
-            if "contacts" in entities:
-                if "email" in entities["contacts"] and entities["contacts"]["email"]:
-                    entities["email"] = entities["contacts"]["email"]
-                if "phone" in entities["contacts"] and entities["contacts"]["phone"]:
-                    entities["phone"] = entities["contacts"]["phone"]
-                del entities["contacts"]
-                
-            return entities
+        response_text = self.llm.chat_sync(
+            [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": text}
+            ],
+            model="gpt-3.5-turbo",
+            deadline=self.deadline,
+            temperature=0.1  # Lower temperature for more deterministic outputs
+        )
+        
+        # Parse the JSON response
+        entities = json.loads(response_text)
+        
+        # Ensure we have a consistent format
+        if "contacts" in entities:
+            if "email" in entities["contacts"] and entities["contacts"]["email"]:
+                entities["email"] = entities["contacts"]["email"]
+            if "phone" in entities["contacts"] and entities["contacts"]["phone"]:
+                entities["phone"] = entities["contacts"]["phone"]
+            del entities["contacts"]
             
-        except Exception as e:
-            print(f"Error in OpenAI entity extraction: {str(e)}")
-            return {}
-    
+        return entities
+
     def _extract_entities_with_regex(self, text: str) -> Dict[str, Any]:
         """Extract entities using regex patterns."""
         entities = {}
@@ -1,4 +1,5 @@
 from datetime import datetime, timedelta
+import logging
 import math
 from typing import List
 
@@ -7,6 +8,8 @@ from sqlalchemy.orm import sessionmaker
 
 from database import Interaction, Entity
 
+logger = logging.getLogger(__name__)
+
 
 class ForgettingModel:
     """Memory manager with Ebbinghaus forgetting curve implementation."""
@@ -61,7 +64,7 @@ class ForgettingModel:
             return count
         except Exception as e:
             db_session.rollback()
-            print(f"Error forgetting memories: {str(e)}")
+            logger.exception("Error forgetting memories")
             return 0
         finally:
             db_session.close()
\ No newline at end of file
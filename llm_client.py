@@ -0,0 +1,400 @@
+"""
+Shared client for the OpenAI-compatible HTTP API.
+
+One httpx.AsyncClient keeps a pool of keep-alive connections for the
+whole process. Every call has a deadline covering all of its attempts.
+Transient failures (connection errors, 429 and 5xx) are retried with
+full-jitter exponential backoff, and Retry-After is honoured. A circuit
+breaker fails fast while the API is down, and a semaphore caps
+concurrent requests so bursts stay under the account's rate limits.
+
+The async methods can be awaited directly. Synchronous code (Flask
+handlers, worker threads) uses the *_sync wrappers, which run the call
+on the client's own event loop thread.
+
+Configuration comes from the environment: OPENAI_BASE_URL (or the older
+OPENAI_API_BASE), OPENAI_API_KEY, LLM_TIMEOUT, LLM_MAX_RETRIES and
+LLM_MAX_CONCURRENCY.
+"""
+import asyncio
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASE_URL = "https://api.openai.com/v1"
+RETRY_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """A call to the LLM API failed."""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+class LLMTimeoutError(LLMError):
+    """The call's deadline passed before a response arrived."""
+
+
+class CircuitOpenError(LLMError):
+    """The circuit breaker is open, so the call was not attempted."""
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures. Calls are then
+    rejected for `reset_timeout` seconds, after which a single trial call
+    is allowed (half-open). The breaker closes if that call succeeds.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.times_opened = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def release(self):
+        """
+        An attempt ended without a verdict on the API (e.g. it was
+        cancelled), so let another trial call through.
+        """
+        with self._lock:
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.trial_in_flight or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self.trial_in_flight:
+                    self.times_opened += 1
+                self.opened_at = time.monotonic()
+            self.trial_in_flight = False
+
+
+class LLMClient:
+    """Pooled, rate-limited and retrying client for chat completions and embeddings."""
+
+    def __init__(self, base_url: Optional[str] = None, api_key: Optional[str] = None,
+                 timeout: float = 30.0, max_retries: int = 3, backoff_base: float = 0.5,
+                 backoff_max: float = 8.0, max_concurrency: int = 8, max_connections: int = 20,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.base_url = (base_url or DEFAULT_BASE_URL).rstrip("/")
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_concurrency = max_concurrency
+        self.max_connections = max_connections
+        self.breaker = breaker or CircuitBreaker()
+
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.in_flight = 0
+
+        # Created lazily on the event loop that first uses them
+        self._client = None
+        self._semaphore = None
+        self._loop = None
+        self._loop_thread = None
+        self._loop_lock = threading.Lock()
+
+    # Async API
+
+    async def chat(self, messages: List[Dict[str, str]], model: str = "gpt-3.5-turbo",
+                   deadline: Optional[float] = None, **params) -> str:
+        """Return the assistant message content of a chat completion."""
+        payload = {"model": model, "messages": messages, **params}
+        data = await self._post("/chat/completions", payload, deadline)
+        try:
+            return data["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError):
+            raise LLMError("Malformed chat completion response")
+
+    async def chat_stream(self, messages: List[Dict[str, str]], model: str = "gpt-3.5-turbo",
+                          deadline: Optional[float] = None, **params) -> AsyncIterator[str]:
+        """
+        Yield content deltas of a streamed chat completion as they arrive.
+        Opening the stream is retried like any call; once tokens have been
+        yielded a failure is raised, since the caller has already used them.
+        """
+        payload = {"model": model, "messages": messages, "stream": True, **params}
+        response, expires = await self._open("/chat/completions", payload, deadline, stream=True)
+        try:
+            lines = response.aiter_lines()
+            while True:
+                remaining = expires - time.monotonic()
+                if remaining <= 0:
+                    raise LLMTimeoutError("/chat/completions stream deadline exceeded")
+                try:
+                    line = await asyncio.wait_for(lines.__anext__(), timeout=remaining)
+                except StopAsyncIteration:
+                    return
+                except asyncio.TimeoutError:
+                    raise LLMTimeoutError("/chat/completions stream deadline exceeded")
+                except httpx.TransportError as e:
+                    raise LLMError(f"/chat/completions stream interrupted: {e}")
+
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    return
+                try:
+                    delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                except (ValueError, KeyError, IndexError, TypeError):
+                    raise LLMError("Malformed chat completion chunk")
+                if delta:
+                    yield delta
+        finally:
+            await response.aclose()
+
+    async def embeddings(self, inputs, model: str = "text-embedding-3-small",
+                         deadline: Optional[float] = None) -> List[List[float]]:
+        """Return one embedding per input string, in input order."""
+        single = isinstance(inputs, str)
+        data = await self._post("/embeddings", {"model": model, "input": inputs}, deadline)
+        try:
+            vectors = [item["embedding"] for item in sorted(data["data"], key=lambda item: item["index"])]
+        except (KeyError, TypeError):
+            raise LLMError("Malformed embeddings response")
+        return vectors[:1] if single else vectors
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # Synchronous wrappers
+
+    def chat_sync(self, messages, model: str = "gpt-3.5-turbo", deadline: Optional[float] = None, **params) -> str:
+        return self.run(self.chat(messages, model=model, deadline=deadline, **params))
+
+    def embeddings_sync(self, inputs, model: str = "text-embedding-3-small",
+                        deadline: Optional[float] = None) -> List[List[float]]:
+        return self.run(self.embeddings(inputs, model=model, deadline=deadline))
+
+    def chat_stream_sync(self, messages, model: str = "gpt-3.5-turbo", deadline: Optional[float] = None,
+                         **params) -> Iterator[str]:
+        """Iterate over chat_stream() from synchronous code. Closing the iterator cancels the request."""
+        deltas = queue.Queue()
+
+        async def pump():
+            try:
+                async for delta in self.chat_stream(messages, model=model, deadline=deadline, **params):
+                    deltas.put(("delta", delta))
+                deltas.put(("done", None))
+            except Exception as e:
+                deltas.put(("error", e))
+
+        future = asyncio.run_coroutine_threadsafe(pump(), self._ensure_loop())
+        try:
+            while True:
+                kind, value = deltas.get()
+                if kind == "delta":
+                    yield value
+                elif kind == "done":
+                    return
+                else:
+                    raise value
+        finally:
+            future.cancel()
+
+    def run(self, coro):
+        """Run a coroutine on the client's event loop thread and wait for its result."""
+        loop = self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._loop_thread = threading.Thread(target=self._loop.run_forever,
+                                                     name="llm-client", daemon=True)
+                self._loop_thread.start()
+            return self._loop
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "base_url": self.base_url,
+            "calls": self.calls,
+            "retries": self.retries,
+            "failures": self.failures,
+            "in_flight": self.in_flight,
+            "circuit": self.breaker.state,
+            "circuit_opened": self.breaker.times_opened,
+        }
+
+    # Request handling
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None:
+            headers = {"Content-Type": "application/json"}
+            if self.api_key:
+                headers["Authorization"] = f"Bearer {self.api_key}"
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=headers,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections,
+                                    keepalive_expiry=60.0)
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._client
+
+    def _backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Full jitter: a random delay up to the exponential cap, or the server's Retry-After."""
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def _send(self, client: httpx.AsyncClient, path: str, payload: Dict[str, Any],
+                    timeout: float, stream: bool = False) -> httpx.Response:
+        # The slot is held until the response headers arrive; streamed bodies are read outside it
+        async with self._semaphore:
+            self.in_flight += 1
+            try:
+                request = client.build_request("POST", path, json=payload, timeout=timeout)
+                return await client.send(request, stream=stream)
+            finally:
+                self.in_flight -= 1
+
+    async def _post(self, path: str, payload: Dict[str, Any], deadline: Optional[float]) -> Dict[str, Any]:
+        response, _ = await self._open(path, payload, deadline)
+        try:
+            return response.json()
+        except ValueError:
+            raise LLMError(f"{path} returned malformed JSON")
+
+    async def _open(self, path: str, payload: Dict[str, Any], deadline: Optional[float],
+                    stream: bool = False):
+        """Send a request with retries; returns (response, deadline expiry on the monotonic clock)."""
+        client = self._http()
+        budget = deadline if deadline is not None else self.timeout
+        expires = time.monotonic() + budget
+        self.calls += 1
+        last_error = None
+
+        for attempt in range(self.max_retries + 1):
+            remaining = expires - time.monotonic()
+            if remaining <= 0:
+                break
+            if not self.breaker.allow():
+                self.failures += 1
+                raise CircuitOpenError(f"Circuit open for {self.base_url}")
+
+            retry_after = None
+            try:
+                # Waiting for a concurrency slot counts against the deadline too
+                response = await asyncio.wait_for(
+                    self._send(client, path, payload, remaining, stream), timeout=remaining)
+            except (httpx.TransportError, asyncio.TimeoutError) as e:
+                self.breaker.record_failure()
+                last_error = LLMTimeoutError(f"{path} timed out") if isinstance(
+                    e, (httpx.TimeoutException, asyncio.TimeoutError)) else LLMError(f"{path}: {e}")
+            except BaseException:
+                # Cancelled (e.g. the caller closed a stream) or failed on our side:
+                # no verdict on the API, but a half-open trial must not stay claimed
+                self.breaker.release()
+                raise
+            else:
+                if response.status_code < 400:
+                    self.breaker.record_success()
+                    return response, expires
+                retryable = response.status_code in RETRY_STATUS
+                # Settle the breaker before reading the body, which can fail too.
+                # A status that isn't retried means the request itself is wrong; the API is fine
+                if retryable:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                if stream:
+                    await response.aread()
+                    await response.aclose()
+                last_error = LLMError(f"{path} returned HTTP {response.status_code}: {response.text[:200]}",
+                                      status=response.status_code)
+                if not retryable:
+                    self.failures += 1
+                    raise last_error
+                retry_after = _parse_retry_after(response.headers.get("retry-after"))
+
+            if attempt == self.max_retries:
+                break
+            delay = self._backoff(attempt, retry_after)
+            if time.monotonic() + delay >= expires:
+                break
+            self.retries += 1
+            logger.warning("Retrying %s in %.2fs after: %s", path, delay, last_error)
+            await asyncio.sleep(delay)
+
+        self.failures += 1
+        raise last_error or LLMTimeoutError(f"{path} deadline of {budget}s exceeded")
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    try:
+        return max(0.0, float(value)) if value else None
+    except ValueError:
+        return None
+
+
+_shared_client = None
+_shared_lock = threading.Lock()
+
+
+def get_client() -> LLMClient:
+    """The process-wide client, configured from the environment on first use."""
+    global _shared_client
+    with _shared_lock:
+        if _shared_client is None:
+            _shared_client = LLMClient(
+                base_url=os.getenv("OPENAI_BASE_URL") or os.getenv("OPENAI_API_BASE"),
+                api_key=os.getenv("OPENAI_API_KEY"),
+                timeout=float(os.getenv("LLM_TIMEOUT", "30")),
+                max_retries=int(os.getenv("LLM_MAX_RETRIES", "3")),
+                max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+            )
+        return _shared_client
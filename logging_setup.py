@@ -0,0 +1,182 @@
+"""
+Logging for the voice pipeline.
+
+Records are handed to a queue on the calling thread and written by a
+background listener, so request handlers never block on console I/O.
+Each record carries the correlation ids bound with `log_context()`
+(connection sid, session id, interaction id). Output is JSON lines by
+default, or plain text with LOG_FORMAT=text.
+
+Hot-path messages (one per audio chunk) are logged with
+`extra=SAMPLED` and only 1 in LOG_SAMPLE_EVERY of them is kept per
+message template; the next kept record reports how many were dropped.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Correlation ids for the work currently being done on this thread/task
+CONTEXT_FIELDS = ("sid", "session_id", "interaction_id")
+_context = {field: contextvars.ContextVar(field, default=None) for field in CONTEXT_FIELDS}
+
+# Pass as `extra=` on per-chunk messages so they are sampled
+SAMPLED = {"sampled": True}
+
+_listener = None
+_configure_lock = threading.Lock()
+
+
+def bind(**ids):
+    """Set correlation ids for the rest of the current context."""
+    for field, value in ids.items():
+        _context[field].set(value)
+
+
+@contextmanager
+def log_context(**ids):
+    """Set correlation ids for the duration of a block."""
+    tokens = [(_context[field], _context[field].set(value)) for field, value in ids.items()]
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+def current_context():
+    return {field: var.get() for field, var in _context.items() if var.get() is not None}
+
+
+class ContextFilter(logging.Filter):
+    """
+    Copy the correlation ids onto each record. It is attached to the queue
+    handler, so it runs on the thread that logged, where the ids are still
+    set, before the record is queued for the listener thread.
+    """
+
+    def filter(self, record):
+        for field, var in _context.items():
+            if not hasattr(record, field):
+                setattr(record, field, var.get())
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep 1 in `every` records marked `sampled`, counted per logger and message template."""
+
+    def __init__(self, every=100):
+        super().__init__()
+        self.every = max(1, int(every))
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if not getattr(record, "sampled", False) or self.every == 1:
+            return True
+        key = (record.name, record.msg)
+        with self._lock:
+            count = self._counts.get(key, 0)
+            self._counts[key] = count + 1
+        if count % self.every:
+            return False
+        if count:
+            record.suppressed = self.every - 1
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with the correlation ids as top-level keys."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS + ("suppressed",):
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines with whichever correlation ids are set."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s: %(message)s%(ids)s")
+
+    def format(self, record):
+        ids = [f"{field}={getattr(record, field)}" for field in CONTEXT_FIELDS + ("suppressed",)
+               if getattr(record, field, None) is not None]
+        record.ids = f" [{' '.join(ids)}]" if ids else ""
+        return super().format(record)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Merge args and render tracebacks before queueing, but leave formatting to the listener."""
+
+    def prepare(self, record):
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def configure_logging(level=None, fmt=None, sample_every=None, stream=None):
+    """Route all logging through a non-blocking queue. Safe to call more than once."""
+    global _listener
+    level = level or os.getenv("LOG_LEVEL", "INFO")
+    fmt = fmt or os.getenv("LOG_FORMAT", "json")
+    sample_every = sample_every or int(os.getenv("LOG_SAMPLE_EVERY", "100"))
+
+    with _configure_lock:
+        if _listener is not None:
+            _listener.stop()
+
+        output = logging.StreamHandler(stream or sys.stderr)
+        output.setFormatter(TextFormatter() if fmt == "text" else JsonFormatter())
+
+        log_queue = queue.SimpleQueue()
+        handler = _QueueHandler(log_queue)
+        handler.addFilter(ContextFilter())
+        handler.addFilter(SamplingFilter(sample_every))
+
+        root = logging.getLogger()
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(handler)
+        root.setLevel(level.upper() if isinstance(level, str) else level)
+
+        _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+        _listener.start()
+
+    return handler
+
+
+def shutdown_logging():
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    with _configure_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+atexit.register(shutdown_logging)
@@ -0,0 +1,202 @@
+"""
+In-process latency metrics for the voice pipeline.
+
+Stages are timed with `span(name)` (monotonic clock). Each stage feeds a
+Prometheus histogram plus a bounded sample window used for p50/p95/p99.
+`render_prometheus()` produces the text exposition format for /metrics.
+"""
+import bisect
+import contextvars
+import logging
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Bucket upper bounds in seconds, from sub-millisecond VAD work up to slow LLM calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+logger = logging.getLogger(__name__)
+
+
+class Histogram:
+    """Cumulative-bucket histogram with a sliding window for quantiles."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, window: int = 2048):
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self._window = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                self.bucket_counts[index] += 1
+            self.count += 1
+            self.sum += value
+            self._window.append(value)
+
+    def quantiles(self, qs=QUANTILES) -> Dict[float, float]:
+        """Nearest-rank quantiles over the most recent observations."""
+        with self._lock:
+            values = sorted(self._window)
+        if not values:
+            return {q: math.nan for q in qs}
+        return {q: values[min(len(values) - 1, int(math.ceil(q * len(values))) - 1)] for q in qs}
+
+    def snapshot(self):
+        with self._lock:
+            cumulative, running = [], 0
+            for n in self.bucket_counts:
+                running += n
+                cumulative.append(running)
+            return cumulative, self.count, self.sum
+
+
+# A collector returns [(name, type, help, [(labels, value), ...]), ...]
+Collector = Callable[[], List[Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]]]
+
+
+class MetricsRegistry:
+    """Holds stage histograms and callbacks that report other gauges/counters."""
+
+    def __init__(self, stage_metric: str = "voice_stage_duration_seconds"):
+        self.stage_metric = stage_metric
+        self.histograms: Dict[str, Histogram] = {}
+        self.collectors: List[Collector] = []
+        self._lock = threading.Lock()
+
+    def histogram(self, stage: str) -> Histogram:
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(stage, Histogram())
+        return histogram
+
+    def observe(self, stage: str, seconds: float):
+        self.histogram(stage).observe(seconds)
+
+    def register_collector(self, collector: Collector):
+        self.collectors.append(collector)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Count and p50/p95/p99 per stage, for JSON/debug output."""
+        result = {}
+        for stage, histogram in sorted(self.histograms.items()):
+            quantiles = histogram.quantiles()
+            result[stage] = {
+                "count": histogram.count,
+                **{f"p{int(q * 100)}": round(v, 4) for q, v in quantiles.items()}
+            }
+        return result
+
+    def render_prometheus(self) -> str:
+        lines = []
+        name = self.stage_metric
+        stages = sorted(self.histograms.items())
+
+        lines.append(f"# HELP {name} Duration of each voice pipeline stage.")
+        lines.append(f"# TYPE {name} histogram")
+        for stage, histogram in stages:
+            cumulative, count, total = histogram.snapshot()
+            for bound, n in zip(histogram.buckets, cumulative):
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{_format(bound)}"}} {n}')
+            lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {count}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {_format(total)}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {count}')
+
+        quantile_name = name.replace("_seconds", "_quantile_seconds")
+        lines.append(f"# HELP {quantile_name} Recent p50/p95/p99 of each voice pipeline stage.")
+        lines.append(f"# TYPE {quantile_name} summary")
+        for stage, histogram in stages:
+            for q, value in histogram.quantiles().items():
+                lines.append(f'{quantile_name}{{stage="{stage}",quantile="{q}"}} {_format(value)}')
+            _, count, total = histogram.snapshot()
+            lines.append(f'{quantile_name}_sum{{stage="{stage}"}} {_format(total)}')
+            lines.append(f'{quantile_name}_count{{stage="{stage}"}} {count}')
+
+        for collector in self.collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                logger.exception("Error collecting metrics")
+                continue
+            for metric, metric_type, help_text, samples in families:
+                lines.append(f"# HELP {metric} {help_text}")
+                lines.append(f"# TYPE {metric} {metric_type}")
+                for labels, value in samples:
+                    lines.append(f"{metric}{_labels(labels)} {_format(value)}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels.items():
+        escaped = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{key}="{escaped}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _format(value) -> str:
+    if value is None:
+        return "NaN"
+    value = float(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value)
+
+
+REGISTRY = MetricsRegistry()
+
+# Spans recorded during the current turn, so they can be sent to the client
+_current_turn: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar(
+    "current_turn", default=None)
+
+
+@contextmanager
+def span(stage: str, registry: MetricsRegistry = None):
+    """Time a pipeline stage and record it (and on the current turn, if any)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        (registry or REGISTRY).observe(stage, elapsed)
+        turn = _current_turn.get()
+        if turn is not None:
+            turn[stage] = round(turn.get(stage, 0.0) + elapsed, 6)
+
+
+def record(stage: str, seconds: float, registry: MetricsRegistry = None):
+    """Record a duration measured elsewhere (e.g. across threads), like span() would."""
+    (registry or REGISTRY).observe(stage, seconds)
+    turn = _current_turn.get()
+    if turn is not None:
+        turn[stage] = round(turn.get(stage, 0.0) + seconds, 6)
+
+
+@contextmanager
+def turn():
+    """Collect the spans of one conversational turn into a dict."""
+    spans: Dict[str, float] = {}
+    token = _current_turn.set(spans)
+    start = time.perf_counter()
+    try:
+        yield spans
+    finally:
+        _current_turn.reset(token)
+        elapsed = time.perf_counter() - start
+        REGISTRY.observe("turn_total", elapsed)
+        spans["turn_total"] = round(elapsed, 6)
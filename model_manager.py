@@ -0,0 +1,318 @@
+import contextlib
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+# Decoding profiles: Whisper transcribe() options plus a few of our own.
+# "default" leaves Whisper's behaviour alone; "low_latency" trims the work
+# done on short conversational utterances.
+#   no_speech_skip: skip the decode when a one-step probe of the first
+#       window says no speech is more likely than this. Only probed while
+#       the language is unknown, when the probe replaces detection (ModelManager)
+#   pin_language: reuse the language detected on a stream's first
+#       utterance instead of detecting it every time (SpeechRecognizer)
+#   prompt_chars: pass the end of the previous utterance as initial_prompt
+#       (SpeechRecognizer)
+DECODING_PROFILES = {
+    "default": {},
+    "low_latency": {
+        "temperature": (0.0, 0.4),  # one fallback instead of Whisper's five
+        "best_of": 1,  # sample once at the fallback temperature instead of five times
+        "no_speech_skip": 0.6,
+        "pin_language": True,
+        "prompt_chars": 200,
+    },
+}
+
+logger = logging.getLogger(__name__)
+
+
+class ModelStats:
+    """Running decode statistics for one model."""
+
+    def __init__(self):
+        self.load_seconds = 0.0
+        self.warm = False
+        self.calls = 0
+        self.skipped = 0  # decodes skipped by the no-speech probe
+        self.audio_seconds = 0.0
+        self.decode_seconds = 0.0
+
+    def record(self, audio_seconds: float, decode_seconds: float):
+        self.calls += 1
+        self.audio_seconds += audio_seconds
+        self.decode_seconds += decode_seconds
+
+    @property
+    def real_time_factor(self) -> Optional[float]:
+        """Decode time divided by audio time; below 1.0 is faster than real time."""
+        if not self.audio_seconds:
+            return None
+        return self.decode_seconds / self.audio_seconds
+
+
+class ModelPool:
+    """
+    Up to `size` instances of one model. Whisper keeps per-call decoding
+    state (the kv-cache hooks) on the model's modules, so an instance must
+    only run one decode at a time; each decode checks one out.
+    """
+
+    def __init__(self, size: int):
+        self.size = max(1, size)
+        self.created = 0  # instances loaded, or being loaded
+        self.idle: List[Any] = []
+        self.warmed = set()  # ids of instances that have run their warm-up decode
+        self.cond = threading.Condition()
+
+    def reserve(self):
+        """An idle instance, or None after reserving a slot the caller must load."""
+        with self.cond:
+            while not self.idle and self.created >= self.size:
+                self.cond.wait()
+            if self.idle:
+                return self.idle.pop()
+            self.created += 1
+            return None
+
+    def release(self, model):
+        with self.cond:
+            self.idle.append(model)
+            self.cond.notify()
+
+    def unreserve(self):
+        """Give back a slot whose load failed."""
+        with self.cond:
+            self.created -= 1
+            self.cond.notify()
+
+
+class ModelManager:
+    """
+    Loads Whisper models on demand and routes utterances between them.
+
+    Models are loaded (and optionally int8-quantized and warmed up) the
+    first time they're needed. Short utterances go to `short_model`;
+    anything longer than `long_threshold` seconds goes to `long_model`.
+    Each model is kept as a pool of up to `pool_size` instances, so that
+    many utterances can be decoded at once; further callers wait.
+    """
+
+    def __init__(
+            self,
+            short_model: str = "tiny",
+            long_model: Optional[str] = None,
+            long_threshold: float = 8.0,
+            quantize: bool = False,
+            num_threads: Optional[int] = None,
+            device: str = "cpu",
+            pool_size: int = 1
+    ):
+        self.short_model = short_model
+        self.long_model = long_model or short_model
+        self.long_threshold = long_threshold
+        self.quantize = quantize and device == "cpu"
+        self.num_threads = num_threads
+        self.device = device
+        self.pool_size = max(1, pool_size)
+
+        self._pools: Dict[str, ModelPool] = {}
+        self._lock = threading.Lock()
+        self.stats_by_model: Dict[str, ModelStats] = {}
+
+        self._threads_pinned = False
+
+    @property
+    def model_names(self) -> List[str]:
+        return list(dict.fromkeys([self.short_model, self.long_model]))
+
+    def _pin_threads(self):
+        """Pin torch's intra-op threads so parallel workers don't oversubscribe cores."""
+        if self._threads_pinned or not self.num_threads:
+            return
+        import torch
+        torch.set_num_threads(self.num_threads)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            # Can only be set once, before any inter-op work has started
+            pass
+        self._threads_pinned = True
+
+    def _pool(self, name: str) -> ModelPool:
+        with self._lock:
+            self.stats_by_model.setdefault(name, ModelStats())
+            pool = self._pools.get(name)
+            if pool is None:
+                pool = self._pools[name] = ModelPool(self.pool_size)
+            return pool
+
+    @contextlib.contextmanager
+    def checkout(self, name: str):
+        """Hold an instance of the named model for one decode, loading one if none is free."""
+        pool = self._pool(name)
+        model = pool.reserve()
+        if model is None:
+            try:
+                model = self._load(name)
+            except BaseException:
+                pool.unreserve()
+                raise
+        try:
+            yield model
+        finally:
+            pool.release(model)
+
+    def _load(self, name: str):
+        import whisper
+        self._pin_threads()
+
+        logger.info("Loading Whisper model %s", name)
+        start = time.perf_counter()
+        model = whisper.load_model(name, device=self.device)
+        if self.quantize:
+            model = quantize_model(model)
+        seconds = time.perf_counter() - start
+        stats = self.stats_by_model[name]
+        stats.load_seconds = stats.load_seconds or seconds
+        logger.info("Loaded Whisper model %s in %.2fs%s", name, seconds,
+                    " (int8 quantized)" if self.quantize else "")
+        return model
+
+    def is_loaded(self, name: str) -> bool:
+        pool = self._pools.get(name)
+        return pool is not None and pool.created > 0
+
+    def warm_up(self, names: Optional[List[str]] = None):
+        """Load every instance and run one short decode on each so the first real requests aren't cold."""
+        for name in names or self.model_names:
+            pool = self._pool(name)
+            start = time.perf_counter()
+            # Check the whole pool out at once, so every instance gets loaded
+            with contextlib.ExitStack() as stack:
+                models = [stack.enter_context(self.checkout(name)) for _ in range(pool.size)]
+                for model in models:
+                    if id(model) not in pool.warmed:
+                        model.transcribe(np.zeros(SAMPLE_RATE, dtype=np.float32), fp16=False, language="en")
+                        pool.warmed.add(id(model))
+            if not self.stats_by_model[name].warm:
+                self.stats_by_model[name].warm = True
+                logger.info("Warmed up %d instance(s) of Whisper model %s in %.2fs",
+                            pool.size, name, time.perf_counter() - start)
+
+    def warm_up_async(self, names: Optional[List[str]] = None) -> threading.Thread:
+        """Warm models in a background thread."""
+        thread = threading.Thread(target=self._warm_up_safely, args=(names,), daemon=True)
+        thread.start()
+        return thread
+
+    def _warm_up_safely(self, names):
+        try:
+            self.warm_up(names)
+        except Exception as e:
+            logger.exception("Error warming up Whisper models")
+
+    def select_model(self, duration: float) -> str:
+        """Pick a model for an utterance of the given length in seconds."""
+        return self.long_model if duration > self.long_threshold else self.short_model
+
+    def transcribe(self, audio: np.ndarray, model_name: Optional[str] = None, **options) -> Dict[str, Any]:
+        """
+        Transcribe 16 kHz float32 audio. The chosen model name and timing
+        are added to the result under "model" and "decode_seconds".
+        """
+        duration = len(audio) / SAMPLE_RATE
+        name = model_name or self.select_model(duration)
+        audio = audio.astype(np.float32, copy=False)
+
+        no_speech_skip = options.pop("no_speech_skip", None)
+        options.setdefault("fp16", self.device != "cpu")
+        with self.checkout(name) as model:
+            start = time.perf_counter()
+            # The probe costs an encoder pass. Only while the language is
+            # unknown is it free, standing in for transcribe()'s own detection
+            if no_speech_skip is not None and options.get("language") is None:
+                language, no_speech_prob = self.probe(model, audio, None, options["fp16"])
+                if no_speech_prob > no_speech_skip:
+                    elapsed = time.perf_counter() - start
+                    stats = self.stats_by_model[name]
+                    stats.record(duration, elapsed)
+                    stats.skipped += 1
+                    return {"text": "", "segments": [], "language": language, "no_speech_prob": no_speech_prob,
+                            "skipped": True, "model": name, "decode_seconds": elapsed}
+                # The probe detected the language, so transcribe() doesn't have to
+                options["language"] = language
+            result = model.transcribe(audio, **options)
+            elapsed = time.perf_counter() - start
+
+        self.stats_by_model[name].record(duration, elapsed)
+        result["model"] = name
+        result["decode_seconds"] = elapsed
+        return result
+
+    @staticmethod
+    def probe(model, audio: np.ndarray, language: Optional[str], fp16: bool):
+        """
+        Run the encoder and a single decoder step on the first 30 s window.
+        Returns (language, no-speech probability). Costs one encoder pass
+        that transcribe() won't reuse, so it only pays for itself when
+        transcribe() would otherwise run language detection, which costs
+        the same.
+        """
+        import whisper
+
+        mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), model.dims.n_mels).to(model.device)
+        result = whisper.decode(model, mel, whisper.DecodingOptions(
+            language=language, sample_len=1, without_timestamps=True, fp16=fp16))
+        return result.language, result.no_speech_prob
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-model load state and real-time factor."""
+        return {
+            name: {
+                "loaded": self.is_loaded(name),
+                "instances": self._pools[name].created if name in self._pools else 0,
+                "warm": stats.warm,
+                "quantized": self.quantize,
+                "load_seconds": round(stats.load_seconds, 3),
+                "calls": stats.calls,
+                "skipped": stats.skipped,
+                "audio_seconds": round(stats.audio_seconds, 3),
+                "decode_seconds": round(stats.decode_seconds, 3),
+                "real_time_factor": (round(stats.real_time_factor, 3)
+                                     if stats.real_time_factor is not None else None)
+            }
+            for name, stats in self.stats_by_model.items()
+        }
+
+
+def quantize_model(model):
+    """Apply dynamic int8 quantization to every linear layer (CPU only)."""
+    import torch
+
+    # Whisper's Linear subclass only exists to cast weights for fp16; on
+    # CPU in fp32 it behaves exactly like nn.Linear, which is the type the
+    # dynamic quantizer knows how to swap out.
+    for module in model.modules():
+        if isinstance(module, torch.nn.Linear):
+            module.__class__ = torch.nn.Linear
+
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def model_manager_from_env() -> ModelManager:
+    """Build a ModelManager from the WHISPER_* environment variables."""
+    return ModelManager(
+        short_model=os.getenv('WHISPER_MODEL', 'tiny'),
+        long_model=os.getenv('WHISPER_LONG_MODEL'),
+        long_threshold=float(os.getenv('WHISPER_LONG_THRESHOLD', '8.0')),
+        quantize=os.getenv('WHISPER_QUANTIZE', '0') == '1',
+        num_threads=int(os.getenv('WHISPER_THREADS', '0')) or None,
+        pool_size=int(os.getenv('WHISPER_POOL_SIZE', '2'))
+    )
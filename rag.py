@@ -1,19 +1,22 @@
+import logging
 import os
 import sqlite3
 import sqlite_vec
 from sqlite_vec import serialize_float32
 from typing import List, Dict, Any, Optional
-from openai import OpenAI
+from llm_client import get_client
 from dotenv import load_dotenv
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Currently using openai's embeddings because they're fast & cheap, but we can replace if need
 # Artistic inspiration: https://towardsdatascience.com/retrieval-augmented-generation-in-sqlite/
 class RAG:
     def __init__(self, db_path: str, embedding_dim: int = 1536):
         self.db_path = db_path
         self.embedding_dim = embedding_dim
-        self.client = OpenAI(api_key=os.getenv('OPENAI_API_KEY')) if os.getenv('OPENAI_API_KEY') else None
+        self.client = get_client() if os.getenv('OPENAI_API_KEY') else None
         self.setup_db()
 
     def make_connect(self):
@@ -27,18 +30,24 @@ class RAG:
         try:
             conn = self.make_connect()
             conn.execute(f'CREATE VIRTUAL TABLE IF NOT EXISTS interaction_embeddings USING vec0(embedding float[{self.embedding_dim}], +interaction_id INTEGER, +session_id INTEGER, +transcript TEXT)')
+            # vec0 can only look rows up by rowid, so keep an indexed interaction_id -> rowid map for deletes
+            has_map = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'interaction_embedding_rows'").fetchone()
+            if not has_map:
+                conn.execute('CREATE TABLE interaction_embedding_rows (interaction_id INTEGER NOT NULL, embedding_rowid INTEGER PRIMARY KEY)')
+                conn.execute('CREATE INDEX ix_interaction_embedding_rows_interaction_id ON interaction_embedding_rows (interaction_id)')
+                # One-time backfill for embeddings stored before the map existed
+                conn.execute('INSERT INTO interaction_embedding_rows (interaction_id, embedding_rowid) SELECT interaction_id, rowid FROM interaction_embeddings')
             conn.commit()
             conn.close()
         except Exception as e:
-            print("Exception in setup_db", e)
+            logger.exception("Exception in setup_db")
 
     def generate_embedding(self, text: str) -> Optional[List[float]]:
         if not self.client or not text or text.strip() == "": return None
         try:
-            response = self.client.embeddings.create(model="text-embedding-3-small", input=text)
-            return response.data[0].embedding
+            return self.client.embeddings_sync(text, model="text-embedding-3-small", deadline=10.0)[0]
         except Exception as e:
-            print("Exception in generate_embedding:", e)
+            logger.warning("Exception in generate_embedding: %s", e)
             return None
 
     # Store the embeddings per segment with relevant info
@@ -47,15 +56,33 @@ class RAG:
         if not embedding: return False
         try:
             conn = self.make_connect()
-            conn.execute('INSERT INTO interaction_embeddings (embedding, interaction_id, session_id, transcript) VALUES (?, ?, ?, ?)',
+            cursor = conn.execute('INSERT INTO interaction_embeddings (embedding, interaction_id, session_id, transcript) VALUES (?, ?, ?, ?)',
                 (serialize_float32(embedding), interaction_id, session_id, transcript))
+            conn.execute('INSERT INTO interaction_embedding_rows (interaction_id, embedding_rowid) VALUES (?, ?)',
+                (interaction_id, cursor.lastrowid))
             conn.commit()
             conn.close()
             return True
         except Exception as e:
-            print("Exception in store_interaction_embedding:", e)
+            logger.exception("Exception in store_interaction_embedding")
             return False
 
+    # Remove the embeddings of deleted interactions (GDPR); raises so the caller can retry
+    def delete_interactions(self, interaction_ids: List[int]) -> int:
+        if not interaction_ids: return 0
+        conn = self.make_connect()
+        try:
+            placeholders = ",".join("?" * len(interaction_ids))
+            rowids = [r[0] for r in conn.execute(
+                f'SELECT embedding_rowid FROM interaction_embedding_rows WHERE interaction_id IN ({placeholders})',
+                interaction_ids).fetchall()]
+            conn.executemany('DELETE FROM interaction_embeddings WHERE rowid = ?', [(r,) for r in rowids])
+            conn.execute(f'DELETE FROM interaction_embedding_rows WHERE interaction_id IN ({placeholders})', interaction_ids)
+            conn.commit()
+            return len(rowids)
+        finally:
+            conn.close()
+
     def query_vector_db(self, query: str, limit: int):
         query_embedding = self.generate_embedding(query)
         if not query_embedding: return []
@@ -66,7 +93,7 @@ class RAG:
             conn.close()
             return rows
         except Exception as e:
-            print("Exception in query_vector_db:", e)
+            logger.exception("Exception in query_vector_db")
             return []
 
 
@@ -95,5 +122,5 @@ def initialize_rag(db_path: str) -> Optional[RAG]:
     try:
         return RAG(db_path)
     except Exception as e:
-        print(f"Error initializing RAG: {e}")
+        logger.exception("Error initializing RAG")
         return None
\ No newline at end of file
@@ -0,0 +1,195 @@
+"""
+Cache of assistant replies for repeated prompts.
+
+Greetings, "what can you help me with" and confirmations come up in
+almost every conversation and would otherwise each cost a full chat
+completion. A reply is cached under the normalized last user message
+plus a hash of a compact context: the system prompt and the last
+assistant turn, which is what a short reply like "yes" or "thanks"
+answers. The rest of the history is left out so the key can repeat.
+
+A reply may still draw on the history the key leaves out, and anything
+earlier in a conversation (names, dates, emails, retrieved memories) may
+belong to one user. So only opening turns, with nothing before them but
+the system prompt, are shared across sessions. Follow-up turns are
+scoped to their session: they hit when a session repeats an answer to
+the same assistant turn, and when a drafted reply is reused by the turn
+it was drafted for, but never across sessions. stats() reports hit rates
+for both kinds of turn.
+
+With an `embed` function (e.g. `rag.RAG.generate_embedding`), an exact
+miss falls back to the most similar cached prompt under the same scope
+and context, accepted only above a strict cosine similarity threshold.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence
+
+import numpy as np
+
+from cache import TTLCache, normalize_text
+
+OPENING, FOLLOWUP = "opening", "followup"
+
+
+class Lookup:
+    """The outcome of one cache lookup; pass it back to store() on a miss."""
+
+    def __init__(self, key=None, text: Optional[str] = None, embedding: Optional[np.ndarray] = None,
+                 similarity: Optional[float] = None):
+        self.key = key
+        self.text = text
+        self.embedding = embedding
+        self.similarity = similarity  # set when the hit came from embedding similarity
+
+    @property
+    def hit(self) -> bool:
+        return self.text is not None
+
+
+class ResponseCache:
+    """
+    TTL/LRU cache of replies keyed on (scope, compact context hash,
+    normalized prompt), where scope is None for shared opening turns. Only short
+    prompts are cached: long ones rarely repeat.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 3600.0, max_prompt_chars: int = 200,
+                 embed: Optional[Callable[[str], Optional[Sequence[float]]]] = None, similarity: float = 0.95):
+        self.entries = TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self.max_prompt_chars = max_prompt_chars
+        self.embed = embed
+        self.similarity = similarity
+
+        # Unit-length prompt embeddings of cached keys, in insertion order, for similarity lookups
+        self._vectors: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Metrics
+        self.similar_hits = 0
+        self.saved_seconds = 0.0
+        self.turns = {OPENING: {"hits": 0, "misses": 0}, FOLLOWUP: {"hits": 0, "misses": 0}}
+
+    def key(self, messages: List[Dict[str, str]], scope: Hashable = None) -> Optional[tuple]:
+        """
+        The cache key for a reply to these messages, or None if it shouldn't
+        be cached. scope (e.g. the session id) is required once the
+        conversation has any history.
+        """
+        if not messages or messages[-1]["role"] != "user":
+            return None
+        prompt = normalize_text(messages[-1]["content"])
+        if not prompt or len(prompt) > self.max_prompt_chars:
+            return None
+        context = [m for m in messages[:-1] if m["role"] == "system"]
+        if len(context) == len(messages) - 1:
+            scope = None  # an opening turn: nothing in it is anyone's history
+        elif scope is None:
+            return None
+        else:
+            replies = [m for m in messages[:-1] if m["role"] == "assistant"]
+            context += replies[-1:]
+        digest = hashlib.sha256(json.dumps(
+            [(m["role"], m["content"]) for m in context]).encode("utf-8")).hexdigest()[:16]
+        return (scope, digest, prompt)
+
+    def lookup(self, messages: List[Dict[str, str]], scope: Hashable = None) -> Lookup:
+        key = self.key(messages, scope)
+        if key is None:
+            return Lookup()
+        result = self._lookup(key)
+        with self._lock:
+            self.turns[OPENING if key[0] is None else FOLLOWUP]["hits" if result.hit else "misses"] += 1
+        return result
+
+    def _lookup(self, key: tuple) -> Lookup:
+        cached = self.entries.get(key)
+        if cached is not None:
+            return self._hit(key, cached)
+        if self.embed is None:
+            return Lookup(key)
+
+        embedding = self._embedding(key[2])
+        if embedding is None:
+            return Lookup(key)
+        match, score = self._nearest(key[:2], embedding)
+        if match is not None and score >= self.similarity:
+            cached = self.entries.peek(match)
+            if cached is not None:
+                with self._lock:
+                    self.similar_hits += 1
+                return self._hit(key, cached, embedding, score)
+        return Lookup(key, embedding=embedding)
+
+    def store(self, lookup: Lookup, text: str, seconds: float):
+        """Cache a generated reply along with how long it took to generate."""
+        if lookup.key is None or not text or not text.strip():
+            return
+        self.entries.set(lookup.key, (text, seconds))
+        if lookup.embedding is not None:
+            with self._lock:
+                self._vectors[lookup.key] = lookup.embedding
+                self._vectors.move_to_end(lookup.key)
+                while len(self._vectors) > self.entries.max_entries:
+                    self._vectors.popitem(last=False)
+
+    def forget(self, session_ids=(), texts=()) -> int:
+        """
+        Drop replies cached for these sessions, and shared replies to these
+        prompts (a deleted user's transcripts). Returns how many.
+        """
+        sessions = set(session_ids)
+        prompts = {normalize_text(text) for text in texts}
+
+        def owned(key):
+            return key[0] in sessions or key[2] in prompts
+
+        removed = self.entries.remove_where(owned)
+        with self._lock:
+            for key in [key for key in self._vectors if owned(key)]:
+                del self._vectors[key]
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters (similarity hits count as hits) and seconds of generation saved."""
+        stats = self.entries.stats()
+        with self._lock:
+            # The underlying cache saw similarity hits as misses of the exact key
+            stats["hits"] += self.similar_hits
+            stats["misses"] -= self.similar_hits
+            stats["similar_hits"] = self.similar_hits
+            stats["saved_seconds"] = self.saved_seconds
+            turns = {kind: dict(counts) for kind, counts in self.turns.items()}
+        for counts in turns.values():
+            lookups = counts["hits"] + counts["misses"]
+            counts["hit_rate"] = counts["hits"] / lookups if lookups else 0.0
+        stats["turns"] = turns
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def _hit(self, key, cached, embedding=None, similarity=None) -> Lookup:
+        text, seconds = cached
+        with self._lock:
+            self.saved_seconds += seconds
+        return Lookup(key, text, embedding, similarity)
+
+    def _embedding(self, prompt: str) -> Optional[np.ndarray]:
+        vector = self.embed(prompt)
+        if not vector:
+            return None
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def _nearest(self, context: tuple, embedding: np.ndarray):
+        """The cached key under the same scope and context whose prompt is most similar."""
+        with self._lock:
+            candidates = [(key, vector) for key, vector in self._vectors.items() if key[:2] == context]
+        if not candidates:
+            return None, 0.0
+        scores = np.stack([vector for _, vector in candidates]) @ embedding
+        best = int(np.argmax(scores))
+        return candidates[best][0], float(scores[best])
@@ -0,0 +1,162 @@
+"""
+Compact per-utterance transcription segments.
+
+Whisper returns a list of segment dicts (and, with word_timestamps, a
+list of word dicts inside each one) carrying token ids and other decoder
+state we don't need. `Segments` keeps only the timings and confidences,
+in numpy structured arrays, with the texts alongside, and packs them into
+a small binary blob stored on the interaction row:
+
+    b"SG" | version u8 | segment count u16 | word count u16
+    segment rows | word rows | text end offsets (u32) | utf-8 texts
+"""
+import struct
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+SEGMENT_DTYPE = np.dtype([
+    ("start", "<f4"),
+    ("end", "<f4"),
+    ("avg_logprob", "<f4"),
+    ("no_speech_prob", "<f4"),
+    ("refined", "u1"),  # 1 if the text came from re-decoding this segment with a larger model
+])
+WORD_DTYPE = np.dtype([
+    ("start", "<f4"),
+    ("end", "<f4"),
+    ("probability", "<f4"),
+    ("segment", "<u2"),
+])
+
+_MAGIC = b"SG"
+_VERSION = 1
+_HEADER = struct.Struct("<2sBHH")
+
+# Whisper's own defaults for "this window decoded badly" and "this window is silence"
+LOW_LOGPROB = -1.0
+NO_SPEECH_PROB = 0.6
+
+
+class Segments:
+    """Timings, confidences and texts of one utterance's Whisper segments."""
+
+    def __init__(self, rows: np.ndarray, texts: List[str], words: Optional[np.ndarray] = None,
+                 word_texts: Optional[List[str]] = None, audio_duration: Optional[float] = None,
+                 decode_seconds: Optional[float] = None, model: Optional[str] = None):
+        self.rows = rows
+        self.texts = texts
+        self.words = words if words is not None else np.zeros(0, dtype=WORD_DTYPE)
+        self.word_texts = word_texts or []
+        self.audio_duration = audio_duration  # seconds of audio decoded
+        self.decode_seconds = decode_seconds  # wall-clock decode time, refinement included
+        self.model = model
+
+    @classmethod
+    def from_whisper(cls, result: Dict[str, Any], audio_duration: Optional[float] = None) -> "Segments":
+        """Keep what we need from a model.transcribe() result."""
+        segments = result.get("segments") or []
+        rows = np.zeros(len(segments), dtype=SEGMENT_DTYPE)
+        texts, word_rows, word_texts = [], [], []
+        for i, segment in enumerate(segments):
+            rows[i] = (segment.get("start", 0.0), segment.get("end", 0.0),
+                       segment.get("avg_logprob", 0.0), segment.get("no_speech_prob", 0.0), 0)
+            texts.append(segment.get("text", ""))
+            for word in segment.get("words") or []:
+                word_rows.append((word.get("start", 0.0), word.get("end", 0.0),
+                                  word.get("probability", 0.0), i))
+                word_texts.append(word.get("word", ""))
+
+        if not segments and result.get("text"):
+            # Decoders that don't report segments still give us one span of text
+            rows = np.array([(0.0, audio_duration or 0.0, 0.0, 0.0, 0)], dtype=SEGMENT_DTYPE)
+            texts = [result["text"]]
+
+        return cls(rows, texts, np.array(word_rows, dtype=WORD_DTYPE), word_texts,
+                   audio_duration=audio_duration, decode_seconds=result.get("decode_seconds"),
+                   model=result.get("model"))
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @property
+    def text(self) -> str:
+        return "".join(self.texts).strip()
+
+    @property
+    def real_time_factor(self) -> Optional[float]:
+        """Decode time divided by audio time for this utterance."""
+        if not self.audio_duration or self.decode_seconds is None:
+            return None
+        return self.decode_seconds / self.audio_duration
+
+    def low_confidence(self, min_logprob: float = LOW_LOGPROB, max_no_speech: float = NO_SPEECH_PROB) -> np.ndarray:
+        """
+        Indices of segments that contain speech but decoded with a low
+        average log-probability: candidates for re-decoding.
+        """
+        mask = (self.rows["avg_logprob"] < min_logprob) & (self.rows["no_speech_prob"] < max_no_speech)
+        return np.flatnonzero(mask)
+
+    def replace_text(self, index: int, text: str, avg_logprob: float):
+        """Swap in a re-decoded segment's text; its word timings no longer apply and are dropped."""
+        self.texts[index] = text
+        self.rows["avg_logprob"][index] = avg_logprob
+        self.rows["refined"][index] = 1
+        keep = self.words["segment"] != index
+        self.word_texts = [w for w, k in zip(self.word_texts, keep) if k]
+        self.words = self.words[keep]
+
+    def to_bytes(self) -> bytes:
+        texts = self.texts + self.word_texts
+        encoded = [t.encode("utf-8") for t in texts]
+        offsets = np.cumsum([len(e) for e in encoded], dtype="<u4") if encoded else np.zeros(0, dtype="<u4")
+        return b"".join([
+            _HEADER.pack(_MAGIC, _VERSION, len(self.rows), len(self.words)),
+            self.rows.astype(SEGMENT_DTYPE, copy=False).tobytes(),
+            self.words.astype(WORD_DTYPE, copy=False).tobytes(),
+            offsets.tobytes(),
+            *encoded,
+        ])
+
+    @classmethod
+    def from_bytes(cls, data: bytes, audio_duration: Optional[float] = None,
+                   decode_seconds: Optional[float] = None) -> "Segments":
+        magic, version, n_segments, n_words = _HEADER.unpack_from(data)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"Unsupported segment blob (magic {magic!r}, version {version})")
+        offset = _HEADER.size
+        rows = np.frombuffer(data, SEGMENT_DTYPE, n_segments, offset).copy()
+        offset += n_segments * SEGMENT_DTYPE.itemsize
+        words = np.frombuffer(data, WORD_DTYPE, n_words, offset).copy()
+        offset += n_words * WORD_DTYPE.itemsize
+        ends = np.frombuffer(data, "<u4", n_segments + n_words, offset)
+        offset += (n_segments + n_words) * 4
+
+        texts, start = [], 0
+        for end in ends:
+            texts.append(data[offset + start:offset + int(end)].decode("utf-8"))
+            start = int(end)
+        return cls(rows, texts[:n_segments], words, texts[n_segments:],
+                   audio_duration=audio_duration, decode_seconds=decode_seconds)
+
+    def to_dict(self) -> List[Dict[str, Any]]:
+        """Plain segments (with their words, if any) for JSON."""
+        segments = []
+        for row, text in zip(self.rows, self.texts):
+            segments.append({
+                "start": round(float(row["start"]), 3),
+                "end": round(float(row["end"]), 3),
+                "text": text,
+                "avg_logprob": round(float(row["avg_logprob"]), 4),
+                "no_speech_prob": round(float(row["no_speech_prob"]), 4),
+                "refined": bool(row["refined"]),
+            })
+        for word, text in zip(self.words, self.word_texts):
+            segments[int(word["segment"])].setdefault("words", []).append({
+                "start": round(float(word["start"]), 3),
+                "end": round(float(word["end"]), 3),
+                "word": text,
+                "probability": round(float(word["probability"]), 4),
+            })
+        return segments
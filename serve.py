@@ -0,0 +1,85 @@
+"""
+Run the app as several processes on one machine:
+
+- one transcription broker (transcription_queue.py broker)
+- N transcription workers, each with its own Whisper models and a share of the cores
+- M web processes on consecutive ports, to be put behind a sticky proxy
+  (see deploy/nginx.conf)
+
+    python serve.py --web-workers 4 --transcription-workers 4 --base-port 5050
+
+Set SOCKETIO_MESSAGE_QUEUE (e.g. redis://localhost:6379/0) so the web
+processes can emit to each other's clients.
+"""
+import argparse
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    cpu_count = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="Multi-process launcher")
+    parser.add_argument("--web-workers", type=int, default=2)
+    parser.add_argument("--transcription-workers", type=int, default=max(1, cpu_count // 2))
+    parser.add_argument("--base-port", type=int, default=5050)
+    parser.add_argument("--broker", default=os.getenv("TRANSCRIPTION_BROKER", "127.0.0.1:5600"))
+    args = parser.parse_args()
+
+    from logging_setup import configure_logging
+    configure_logging()
+    if args.web_workers > 1 and not os.getenv("SOCKETIO_MESSAGE_QUEUE"):
+        logger.warning("SOCKETIO_MESSAGE_QUEUE is not set; web processes can only emit to their own clients")
+
+    env = dict(os.environ, TRANSCRIPTION_BROKER=args.broker, APP_DEBUG="0")
+    # Split the cores between transcription workers so torch doesn't oversubscribe
+    threads = max(1, cpu_count // args.transcription_workers)
+    # A worker decodes one job at a time, so one instance of each model is enough
+    worker_env = dict(env, WHISPER_THREADS=os.getenv("WHISPER_THREADS", str(threads)), WHISPER_POOL_SIZE="1")
+
+    processes = []
+
+    def spawn(name, command, process_env):
+        logger.info("Starting %s: %s", name, " ".join(command))
+        processes.append((name, subprocess.Popen(command, cwd=ROOT, env=process_env)))
+
+    queue_script = os.path.join(ROOT, "transcription_queue.py")
+    spawn("broker", [sys.executable, queue_script, "broker", "--address", args.broker], env)
+    for i in range(args.transcription_workers):
+        spawn(f"transcriber-{i}", [sys.executable, queue_script, "worker", "--address", args.broker], worker_env)
+    for i in range(args.web_workers):
+        port = args.base_port + i
+        spawn(f"web-{port}", [sys.executable, os.path.join(ROOT, "app.py")], dict(env, PORT=str(port)))
+
+    def shutdown(signum=None, frame=None):
+        for _, process in processes:
+            if process.poll() is None:
+                process.terminate()
+        for _, process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    # If any process dies, take the rest down with it
+    while True:
+        for name, process in processes:
+            if process.poll() is not None:
+                logger.error("%s exited with code %s, shutting down", name, process.returncode)
+                shutdown()
+        time.sleep(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Speculative turn processing.
+
+When the VAD reports a short pause (well before the full silence window),
+the buffered utterance is decoded and a reply drafted on a background
+thread. If the pause holds and the final utterance is the same audio, the
+turn picks up the finished work instead of starting from scratch. If
+speech resumes, the speculation is cancelled and its results discarded.
+"""
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Speculation:
+    """Transcription and draft reply for one snapshot of an utterance."""
+
+    def __init__(self, key: Hashable, session_id: Optional[int]):
+        self.key = key
+        self.session_id = session_id
+        self.started_at = time.perf_counter()
+        self.cancelled = threading.Event()
+        self.drafted_from: Optional[str] = None  # the transcript the reply was drafted for
+        self._transcription = Future()
+        self._reply = Future()
+
+    def transcription(self, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """The Whisper result; raises if the speculative decode failed."""
+        return self._transcription.result(timeout)
+
+    def reply(self, timeout: Optional[float] = None) -> Optional[str]:
+        """The drafted assistant reply, or None if none was drafted."""
+        return self._reply.result(timeout)
+
+    def reply_for(self, transcript: str, timeout: Optional[float] = None) -> Optional[str]:
+        """
+        The drafted reply if it was drafted for this transcript, or None.
+        The stored transcript can differ from the speculative one, e.g.
+        after low-confidence segments were decoded again.
+        """
+        reply = self.reply(timeout)
+        if reply is None or self.drafted_from is None:
+            return None
+        if " ".join(self.drafted_from.split()) != " ".join(transcript.split()):
+            logger.debug("Discarding draft: transcript changed after speculation")
+            return None
+        return reply
+
+    def cancel(self):
+        self.cancelled.set()
+
+
+class SpeculativeRunner:
+    """
+    Runs at most one speculation per stream on a small thread pool.
+
+    transcribe(audio, **options) returns a Whisper result dict, draft_reply(session_id,
+    text) returns the assistant reply for text as the next user message,
+    and prepare(text), if given, warms anything else the turn will need
+    (e.g. the entity extraction cache).
+    """
+
+    def __init__(self, transcribe: Callable, draft_reply: Callable,
+                 prepare: Optional[Callable] = None, max_workers: int = 4):
+        self.transcribe = transcribe
+        self.draft_reply = draft_reply
+        self.prepare = prepare
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="speculation")
+        self.active: Dict[Hashable, Speculation] = {}
+        self._lock = threading.Lock()
+
+        self.started = 0
+        self.used = 0
+        self.cancelled = 0
+
+    def start(self, stream_id, key, audio, session_id, options=None) -> Speculation:
+        """
+        Begin speculating on audio, replacing any speculation already
+        running for stream_id. options are passed on to transcribe().
+        """
+        speculation = Speculation(key, session_id)
+        with self._lock:
+            previous = self.active.get(stream_id)
+            self.active[stream_id] = speculation
+            self.started += 1
+        if previous is not None:
+            self._discard(previous)
+
+        # Carry the caller's log correlation ids onto the worker thread
+        context = contextvars.copy_context()
+        self.executor.submit(context.run, self._run, speculation, audio, options or {})
+        return speculation
+
+    def cancel(self, stream_id):
+        """Discard the speculation for stream_id, e.g. because speech resumed."""
+        with self._lock:
+            speculation = self.active.pop(stream_id, None)
+        if speculation is not None:
+            self._discard(speculation)
+
+    def claim(self, stream_id, key) -> Optional[Speculation]:
+        """
+        Hand over the speculation for stream_id if it was made on the
+        utterance identified by key; otherwise discard it and return None.
+        """
+        with self._lock:
+            speculation = self.active.pop(stream_id, None)
+        if speculation is None:
+            return None
+        if speculation.key != key or speculation.cancelled.is_set():
+            self._discard(speculation)
+            return None
+        with self._lock:
+            self.used += 1
+        return speculation
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "started": self.started,
+                "used": self.used,
+                "cancelled": self.cancelled,
+                "active": len(self.active),
+            }
+
+    def _discard(self, speculation: Speculation):
+        speculation.cancel()
+        with self._lock:
+            self.cancelled += 1
+        logger.debug("Discarded speculation after %.3fs", time.perf_counter() - speculation.started_at)
+
+    def _run(self, speculation: Speculation, audio, options):
+        if speculation.cancelled.is_set():
+            speculation._transcription.cancel()
+            speculation._reply.cancel()
+            return
+
+        try:
+            result = self.transcribe(audio, **options)
+        except Exception as e:
+            logger.warning("Speculative transcription failed: %s", e)
+            speculation._transcription.set_exception(e)
+            speculation._reply.set_result(None)
+            return
+        speculation._transcription.set_result(result)
+
+        # Stop here if speech resumed while we were decoding
+        text = result.get("text", "").strip()
+        if not text or speculation.cancelled.is_set():
+            speculation._reply.set_result(None)
+            return
+
+        try:
+            if self.prepare is not None:
+                self.prepare(text)
+            reply = None
+            if not speculation.cancelled.is_set():
+                speculation.drafted_from = text
+                reply = self.draft_reply(speculation.session_id, text)
+        except Exception as e:
+            logger.warning("Speculative reply failed: %s", e)
+            reply = None
+        speculation._reply.set_result(reply)
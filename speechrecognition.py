@@ -1,152 +1,565 @@
+import logging
 import numpy as np
-import whisper
+import threading
 import time
-import tempfile
-import soundfile as sf
-import os
 from flask_socketio import emit
+from vad import VoiceActivityDetector
+from audio_buffer import AudioRingBuffer
+from audio_codec import AudioDecoder
+from model_manager import ModelManager, DECODING_PROFILES
+from metrics import REGISTRY, span
+from logging_setup import SAMPLED
+from segments import Segments, LOW_LOGPROB
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+
+
+class AudioStream:
+    """
+    Per-connection audio state: a preallocated ring buffer plus the voice
+    activity detector and the sample positions of the current utterance.
+    """
+
+    def __init__(
+            self,
+            silence_threshold: float = 1.0,
+            max_utterance: float = 30.0,
+            pre_roll: float = 0.3,
+            padding: float = 0.2,
+            min_speech: float = 0.1,
+            segment_search: float = 5.0,
+            speculation_pause: float = None
+    ):
+        self.silence_threshold = silence_threshold  # seconds of silence before processing
+        self.max_utterance = max_utterance  # seconds of speech before a forced cut
+        self.pre_roll = pre_roll  # seconds of audio kept before speech onset
+        self.padding = padding  # seconds of silence kept around speech when trimming
+        self.min_speech = min_speech  # seconds of detected speech needed to transcribe
+        self.segment_search = segment_search  # seconds before the limit searched for a cut point
+        self.speculation_pause = speculation_pause  # seconds of silence before a speculative decode (None = off)
+
+        # Backpressure hysteresis on buffer fill
+        self.high_watermark = 0.75
+        self.low_watermark = 0.5
+
+        # A full utterance plus the trailing silence window and some headroom
+        # for audio arriving while the previous segment is decoded must fit
+        # below the high watermark, so the forced cut comes before backpressure
+        capacity = int((pre_roll + max_utterance + silence_threshold + 2.0) * SAMPLE_RATE / self.high_watermark)
+        self.buffer = AudioRingBuffer(capacity)
+        self.vad = VoiceActivityDetector(sample_rate=SAMPLE_RATE)
+        self.decoder = AudioDecoder()  # float32 until the client negotiates
+        self.lock = threading.Lock()
+        self.backpressure = False
+        self._backpressure_changed = False
+
+        self.forced_segments = 0
+        self.is_speaking = False
+        # End of a finished utterance waiting for take_utterance(): a forced
+        # cut, or where the silence window ran out. Nothing before it may be
+        # trimmed until it is taken.
+        self.cut_at = None
+        self.cut_forced = False
+        self.utterance_id = 0
+        self._reset_positions()
+
+        # Decoding context carried between this stream's utterances
+        self.language = None  # pinned after the first utterance with text
+        self.previous_text = ""
+
+    def _reset_positions(self):
+        """Reset sample positions for the next utterance."""
+        # All positions are sample offsets from the oldest buffered sample,
+        # so silence is measured in audio time, not packet arrival time.
+        self.classified_samples = 0
+        self.speech_start = None
+        self.speech_end = None
+        self.speech_samples = 0
+        self.speculated = False
+        # Speech detected while an utterance is pending belongs to the next one
+        self.next_start = None
+        self.next_end = None
+        self.next_samples = 0
+
+    def add_samples(self, audio_chunk: np.ndarray):
+        """Buffer samples, run the VAD and return a status change (or None)."""
+        with self.lock:
+            written = self.buffer.write(audio_chunk)
+            self._update_backpressure()
+            if written == 0:
+                return None
+
+            # Classify the new audio frame by frame
+            frame_size = self.vad.frame_size
+            decisions = self.vad.process(audio_chunk[:written])
+            had_speech = False
+            for is_speech in decisions:
+                if is_speech and self.cut_at is not None:
+                    if self.next_start is None:
+                        self.next_start = self.classified_samples
+                    self.next_end = self.classified_samples + frame_size
+                    self.next_samples += frame_size
+                elif is_speech:
+                    if self.speech_start is None:
+                        self.speech_start = self.classified_samples
+                    self.speech_end = self.classified_samples + frame_size
+                    self.speech_samples += frame_size
+                    had_speech = True
+                self.classified_samples += frame_size
+
+            if self.cut_at is not None:
+                # A finished utterance is waiting to be transcribed
+                return None
+
+            if self.backpressure and self.speech_start is not None:
+                # The client has been asked to pause and won't send the audio
+                # that would end this utterance, so cut it now to drain the buffer
+                self._force_segment(self.classified_samples - self.speech_start)
+                return "processing"
+
+            if had_speech:
+                self.is_speaking = True
+                self.speculated = False
+                limit = int(self.max_utterance * SAMPLE_RATE)
+                if self.classified_samples - self.speech_start >= limit:
+                    self._force_segment(limit)
+                    return "processing"
+                return "listening"
+
+            if not self.is_speaking:
+                # No speech yet: only keep a short pre-roll so background
+                # noise doesn't fill the buffer
+                self._drop_leading_silence()
+                return None
+
+            silence = (self.classified_samples - self.speech_end) / SAMPLE_RATE
+            if silence > self.silence_threshold:
+                # Silence detected after speech; record how much audio we waited
+                self.is_speaking = False
+                self.cut_at = self.classified_samples
+                self.cut_forced = False
+                REGISTRY.observe('vad_trigger', silence)
+                return "processing"
+
+            if (self.speculation_pause is not None and not self.speculated
+                    and silence >= self.speculation_pause):
+                # A short pause: the caller may start work on the utterance early
+                self.speculated = True
+                return "speculating"
+
+            return None
+
+    def _force_segment(self, limit: int):
+        """Pick a cut point at the quietest frame near the utterance limit."""
+        search_end = self.speech_start + limit
+        search_start = max(self.speech_start + 1, search_end - int(self.segment_search * SAMPLE_RATE))
+        self.cut_at = self.buffer.lowest_energy_point(search_start, search_end, self.vad.frame_size)
+        self.cut_forced = True
+        self.forced_segments += 1
+        logger.info("Utterance reached %.1fs, forcing a segment cut", limit / SAMPLE_RATE)
+
+    def _drop_leading_silence(self):
+        """Discard audio that lies before the pre-roll window."""
+        excess = self.classified_samples - int(self.pre_roll * SAMPLE_RATE)
+        if excess > 0:
+            self.buffer.discard(excess)
+            self.classified_samples -= excess
+            # Positions are offsets into the buffer, so they move with it
+            if self.speech_end is not None and self.speech_end > excess:
+                self.speech_start = max(0, self.speech_start - excess)
+                self.speech_end -= excess
+            elif self.speech_start is not None:
+                self._reset_positions()
+
+    def _update_backpressure(self):
+        fill = self.buffer.fill_ratio
+        if not self.backpressure and fill >= self.high_watermark:
+            self.backpressure = True
+            self._backpressure_changed = True
+        elif self.backpressure and fill <= self.low_watermark:
+            self.backpressure = False
+            self._backpressure_changed = True
+
+    def pop_backpressure_signal(self):
+        """Return {'pause': bool, 'fill': float} once per backpressure change."""
+        with self.lock:
+            if not self._backpressure_changed:
+                return None
+            self._backpressure_changed = False
+            return {'pause': self.backpressure, 'fill': round(self.buffer.fill_ratio, 3)}
+
+    def utterance_key(self):
+        """
+        Identify the utterance currently buffered. The key changes whenever
+        more speech is detected, so work done on an earlier key is stale.
+        """
+        with self.lock:
+            return self._key()
+
+    def _key(self):
+        # The silence cut doesn't change what was said, so it isn't part of the key
+        return (self.utterance_id, self.speech_start, self.speech_end, self.cut_at if self.cut_forced else None)
+
+    def peek_utterance(self):
+        """
+        Return (key, audio) for the utterance as take_utterance() would trim
+        it, without consuming it. Audio is None if there isn't enough speech.
+        """
+        with self.lock:
+            key = self._key()
+            if (self.cut_at is not None or self.speech_start is None
+                    or self.speech_samples < self.min_speech * SAMPLE_RATE):
+                return key, None
+            pad = int(self.padding * SAMPLE_RATE)
+            end = min(self.speech_end + pad, len(self.buffer))
+            return key, self.buffer.read(max(0, self.speech_start - pad), end)
+
+    def take_utterance(self):
+        """
+        Return the buffered utterance with leading and trailing silence
+        trimmed (keeping a little padding). Audio past a pending utterance's
+        cut point stays buffered as the start of the next one.
+        """
+        with self.lock:
+            if len(self.buffer) == 0:
+                return None
+
+            pad = int(self.padding * SAMPLE_RATE)
+            speech_start, speech_end = self.speech_start, self.speech_end
+            speech_samples = self.speech_samples
+
+            if self.cut_at is not None:
+                return self._take_pending(pad)
+
+            audio_data = None
+            if speech_start is not None and speech_samples >= self.min_speech * SAMPLE_RATE:
+                audio_data = self.buffer.read(max(0, speech_start - pad), speech_end + pad)
+
+            # Keep only the partial frame the VAD hasn't classified yet
+            self.buffer.discard(self.classified_samples)
+            self._reset_positions()
+            self.utterance_id += 1
+            self.is_speaking = False
+            self._update_backpressure()
+
+            if audio_data is None:
+                logger.debug("No speech detected in buffer, skipping transcription")
+            return audio_data
+
+    def _take_pending(self, pad):
+        """Take the utterance that ends at cut_at and rebase what follows it."""
+        cut, forced = self.cut_at, self.cut_forced
+        audio_data = None
+        if forced:
+            audio_data = self.buffer.read(max(0, self.speech_start - pad), cut)
+        elif self.speech_samples >= self.min_speech * SAMPLE_RATE:
+            audio_data = self.buffer.read(max(0, self.speech_start - pad), min(self.speech_end + pad, cut))
+        self.buffer.discard(cut)
+        self.classified_samples -= cut
+
+        # After a forced cut the remainder starts mid-speech; speech that
+        # arrived while the utterance waited starts the next one as well
+        start = end = None
+        samples = 0
+        if forced and self.speech_end > cut:
+            start, end = 0, self.speech_end - cut
+            samples = end
+        if self.next_start is not None:
+            start = self.next_start - cut if start is None else start
+            end = self.next_end - cut
+            samples += self.next_samples
+        classified = self.classified_samples
+        self._reset_positions()
+        self.classified_samples = classified
+        self.speech_start, self.speech_end, self.speech_samples = start, end, samples
+        self.is_speaking = start is not None
+        self.cut_at = None
+        self.cut_forced = False
+        self.utterance_id += 1
+        self._update_backpressure()
+
+        if audio_data is None:
+            logger.debug("No speech detected in buffer, skipping transcription")
+        return audio_data
+
+    def memory_stats(self):
+        """Return buffer memory usage for this stream."""
+        return {
+            'capacity_bytes': self.buffer.nbytes,
+            'used_bytes': self.buffer.used_bytes,
+            'fill_ratio': round(self.buffer.fill_ratio, 3),
+            'dropped_samples': self.buffer.dropped_samples,
+            'forced_segments': self.forced_segments,
+            'backpressure': self.backpressure,
+            'encoding': self.decoder.encoding,
+            'wire_bytes_per_second': round(self.decoder.bytes_per_second)
+        }
+
 
 class SpeechRecognizer:
     """Speech recognition handler using OpenAI's Whisper model"""
     
-    def __init__(self, model_name="tiny"):
-        """Initialize the speech recognizer with the specified model"""
-        print(f"Loading Whisper model: {model_name}")
-        self.model = whisper.load_model(model_name)
+    SAMPLE_RATE = SAMPLE_RATE
+
+    def __init__(self, model_name="tiny", model_manager=None, speculation_pause=None,
+                 refine_model=None, word_timestamps=False, profile="default", language=None,
+                 shed_model=None):
+        """
+        Initialize the speech recognizer. Whisper models are loaded lazily
+        by the model manager; pass one in to route between model sizes.
+        With speculation_pause set, add_audio_chunk returns "speculating"
+        once per pause of that many seconds, before the full silence window.
+        With refine_model set, segments that decoded with low confidence
+        are decoded again with that model instead of the whole utterance.
+        profile names an entry of DECODING_PROFILES; language, if given,
+        is used for every utterance instead of being detected.
+        Under load, a degraded transcription skips refinement and word
+        timings and decodes with shed_model, if given.
+        """
+        self.model_manager = model_manager or ModelManager(short_model=model_name)
         
         # Settings for speech detection
-        self.audio_buffer = []
-        self.is_speaking = False
-        self.last_audio_time = 0
         self.SILENCE_THRESHOLD = 1.0  # seconds of silence before processing
-        self.ENERGY_THRESHOLD = 0.005  # lower threshold for speech detection
+        self.MAX_UTTERANCE = 30.0  # seconds before an utterance is force-segmented
+        self.SPECULATION_PAUSE = speculation_pause  # seconds of pause before speculating (None = off)
         self.streaming = False  # Flag for streaming mode
-    
-    def add_audio_chunk(self, data):
-        """Add an audio chunk to the buffer and detect speech/silence"""
+
+        # Settings for segment output
+        self.REFINE_MODEL = refine_model  # larger model for low-confidence segments (None = off)
+        self.REFINE_LOGPROB = LOW_LOGPROB  # segments below this average log-probability are re-decoded
+        self.REFINE_PADDING = 0.1  # seconds of context kept around a re-decoded segment
+        self.WORD_TIMESTAMPS = word_timestamps  # also keep per-word timings (costs extra decode time)
+        self.SHED_MODEL = shed_model  # model for degraded transcriptions (None = usual routing)
+
+        # Decoding cost controls
+        options = dict(DECODING_PROFILES[profile])
+        self.PROFILE = profile
+        self.PIN_LANGUAGE = options.pop("pin_language", False)  # reuse the stream's first detected language
+        self.PROMPT_CHARS = options.pop("prompt_chars", 0)  # previous text passed as initial_prompt (0 = off)
+        self.LANGUAGE = language  # fixed language for every stream (None = detect)
+        self.DECODE_OPTIONS = options  # passed through to the model manager
+
+        # One audio stream per connection
+        self.streams = {}
+        self._streams_lock = threading.Lock()
+
+    def get_stream(self, stream_id="default") -> AudioStream:
+        """Return the audio stream for stream_id, creating it if needed."""
+        with self._streams_lock:
+            stream = self.streams.get(stream_id)
+            if stream is None:
+                stream = AudioStream(
+                    silence_threshold=self.SILENCE_THRESHOLD,
+                    max_utterance=self.MAX_UTTERANCE,
+                    speculation_pause=self.SPECULATION_PAUSE
+                )
+                self.streams[stream_id] = stream
+            return stream
+
+    def configure_stream(self, stream_id, encoding, sample_rate=SAMPLE_RATE):
+        """Set the wire format the client will send for stream_id."""
+        stream = self.get_stream(stream_id)
+        with stream.lock:
+            stream.decoder = AudioDecoder(encoding, sample_rate)
+
+    def close_stream(self, stream_id="default"):
+        """Release the buffer held for stream_id."""
+        with self._streams_lock:
+            self.streams.pop(stream_id, None)
+
+    def memory_stats(self):
+        """Return per-stream buffer memory usage and the total."""
+        with self._streams_lock:
+            streams = {stream_id: stream.memory_stats() for stream_id, stream in self.streams.items()}
+        return {
+            'streams': streams,
+            'total_capacity_bytes': sum(s['capacity_bytes'] for s in streams.values()),
+            'total_used_bytes': sum(s['used_bytes'] for s in streams.values())
+        }
+
+    def utterance_key(self, stream_id="default"):
+        """Key of the utterance buffered for stream_id (see AudioStream.utterance_key)."""
+        return self.get_stream(stream_id).utterance_key()
+
+    def peek_utterance(self, stream_id="default"):
+        """Return (key, audio) for the buffered utterance without consuming it."""
+        return self.get_stream(stream_id).peek_utterance()
+
+    def take_utterance(self, stream_id="default"):
+        """
+        Take the finished utterance out of stream_id's buffer. Take it as
+        soon as "processing" is reported: the buffer keeps filling while
+        the utterance waits to be transcribed.
+        """
+        with span('buffer_concat'):
+            return self.get_stream(stream_id).take_utterance()
+
+    def decode_options(self, stream_id="default", degraded=False):
+        """Whisper options for the next utterance on stream_id."""
+        stream = self.get_stream(stream_id)
+        options = dict(self.DECODE_OPTIONS)
+        language = self.LANGUAGE or stream.language
+        if language:
+            options["language"] = language
+        if self.PROMPT_CHARS and stream.previous_text:
+            options["initial_prompt"] = stream.previous_text[-self.PROMPT_CHARS:]
+        if self.WORD_TIMESTAMPS and not degraded:
+            options["word_timestamps"] = True
+        if degraded and self.SHED_MODEL:
+            options["model_name"] = self.SHED_MODEL
+        return options
+
+    def remember(self, stream_id, result):
+        """Carry a final decode's language and text over to the stream's next utterance."""
+        stream = self.get_stream(stream_id)
+        text = result.get("text", "").strip()
+        if not text:
+            return
+        if self.PIN_LANGUAGE and stream.language is None and result.get("language"):
+            stream.language = result["language"]
+            logger.debug("Pinned language %s", stream.language)
+        stream.previous_text = text
+
+    def backpressure_signal(self, stream_id="default"):
+        """Return a backpressure change for the client, if there is one."""
+        stream = self.streams.get(stream_id)
+        return stream.pop_backpressure_signal() if stream else None
+
+    def add_audio_chunk(self, data, stream_id="default"):
+        """Add an audio chunk to the stream's buffer and detect speech/silence"""
         try:
-            audio_chunk = np.frombuffer(data, dtype=np.float32)
-            
-            # Skip if chunk is too small or empty
-            if len(audio_chunk) < 10:  
-                return None
+            with span('vad'):
+                stream = self.get_stream(stream_id)
+                audio_chunk = stream.decoder.decode(data)
                 
-            self.audio_buffer.append(audio_chunk)
-            
-            # Check if audio contains speech or silence
-            energy = np.mean(np.abs(audio_chunk))
-            current_time = time.time()
-            
-            if energy > self.ENERGY_THRESHOLD:
-                self.is_speaking = True
-                self.last_audio_time = current_time
-                return "listening"
-            elif self.is_speaking and (current_time - self.last_audio_time) > self.SILENCE_THRESHOLD:
-                # Silence detected after speech
-                self.is_speaking = False
-                return "processing"
-            
-            return None
+                # Skip if chunk is too small or empty
+                if len(audio_chunk) < 10:  
+                    return None
+
+                return stream.add_samples(audio_chunk)
         except Exception as e:
-            print(f"Error processing audio chunk: {str(e)}")
+            logger.warning("Error processing audio chunk: %s", e, extra=SAMPLED)
             return None
-    
-    def process_audio(self):
+
+    def process_audio(self, stream_id="default"):
         """Process the complete audio buffer and transcribe using Whisper"""
-        if not self.audio_buffer or len(self.audio_buffer) < 3:  # Need at least some chunks to process
-            print("Audio buffer too small, skipping transcription")
-            return None
-        
         try:
-            # Combine audio chunks
-            audio_data = np.concatenate(self.audio_buffer)
+            # Combine audio chunks, trimmed to the detected speech
+            with span('buffer_concat'):
+                audio_data = self.get_stream(stream_id).take_utterance()
             
             # Validate audio data
-            if len(audio_data) < 1000:  # Audio too short to process
-                print("Audio too short to transcribe")
-                self.audio_buffer = []  # Clear buffer for next recording
+            if audio_data is None or len(audio_data) < 1000:  # Audio too short to process
+                logger.debug("Audio too short to transcribe")
                 return None
-                
-            # Clear buffer for next recording
-            self.audio_buffer = []
-            
-            # Save as temporary WAV file
-            with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
-                temp_filename = temp_file.name
-                sf.write(temp_filename, audio_data, 16000)
             
-            # Transcribe with Whisper
-            result = self.model.transcribe(temp_filename, fp16=False)
+            # Transcribe with Whisper, straight from memory
+            with span('whisper_decode'):
+                result = self.model_manager.transcribe(audio_data, **self.decode_options(stream_id))
+            self.remember(stream_id, result)
             transcription = result["text"].strip()
             
-            print(f"Transcription: {transcription}")
-            
-            # Clean up temp file
-            if os.path.exists(temp_filename):
-                os.remove(temp_filename)
+            logger.debug("Transcription (%s): %s", result['model'], transcription)
                 
             return transcription if transcription else None
                 
         except Exception as e:
-            print(f"Error during transcription: {str(e)}")
-            # Clear buffer on error
-            self.audio_buffer = []
+            logger.exception("Error during transcription")
             return None
             
-    def transcribe_with_stream(self, socketio):
-        """Process the audio buffer and stream the transcription using Whisper"""
-        if not self.audio_buffer or len(self.audio_buffer) < 3:
-            print("Audio buffer too small, skipping transcription")
-            return None
-        
+    def refine(self, audio_data, segments: Segments, language=None) -> int:
+        """
+        Re-decode the low-confidence segments of an utterance with the
+        refine model, keeping a new text only if it scores better.
+        Returns the number of segments replaced.
+        """
+        indices = segments.low_confidence(self.REFINE_LOGPROB)
+        if not self.REFINE_MODEL or segments.model == self.REFINE_MODEL or len(indices) == 0:
+            return 0
+
+        pad = int(self.REFINE_PADDING * SAMPLE_RATE)
+        replaced = 0
+        start = time.perf_counter()
+        with span('whisper_refine'):
+            for index in indices:
+                row = segments.rows[index]
+                begin = max(0, int(row["start"] * SAMPLE_RATE) - pad)
+                end = min(len(audio_data), int(row["end"] * SAMPLE_RATE) + pad)
+                if end - begin < SAMPLE_RATE // 5:
+                    continue
+                result = self.model_manager.transcribe(audio_data[begin:end], model_name=self.REFINE_MODEL,
+                                                       language=language)
+                text = result["text"].strip()
+                parts = result.get("segments") or []
+                if not text or not parts:
+                    continue
+                avg_logprob = float(np.mean([part["avg_logprob"] for part in parts]))
+                if avg_logprob > row["avg_logprob"]:
+                    # Whisper segment texts start with a space
+                    segments.replace_text(index, " " + text, avg_logprob)
+                    replaced += 1
+        if segments.decode_seconds is not None:
+            segments.decode_seconds += time.perf_counter() - start
+        logger.debug("Re-decoded %d of %d low-confidence segments with %s",
+                     replaced, len(indices), self.REFINE_MODEL)
+        return replaced
+
+    def transcribe_with_stream(self, socketio, stream_id="default", to=None, speculation=None, degraded=False,
+                               audio_data=None):
+        """
+        Process the audio buffer and stream the transcription using Whisper.
+        The preliminary transcription is sent only to `to` (a Socket.IO sid)
+        when given, otherwise broadcast. A speculation started on this same
+        utterance supplies the decode instead of running Whisper again.
+        degraded sheds optional work when the server is overloaded.
+        audio_data is an utterance already taken with take_utterance();
+        without it the buffered utterance is taken here.
+        Returns the utterance's Segments, or None if nothing was said.
+        """
         try:
-            print("Starting transcription process...")
-            # Combine audio chunks
-            audio_data = np.concatenate(self.audio_buffer)
+            # Combine audio chunks, trimmed to the detected speech
+            if audio_data is None:
+                audio_data = self.take_utterance(stream_id)
             
             # Validate audio data
-            if len(audio_data) < 1000:  # Audio too short to process
-                print("Audio too short to transcribe")
-                self.audio_buffer = []  # Clear buffer for next recording
+            if audio_data is None or len(audio_data) < 1000:  # Audio too short to process
+                logger.debug("Audio too short to transcribe")
                 return None
-                
-            # Save as temporary WAV file
-            with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
-                temp_filename = temp_file.name
-                sf.write(temp_filename, audio_data, 16000)
             
             # We don't emit status here - app.py handles the status flow
             
             # Transcribe with Whisper (using regular transcribe for now, as streaming isn't directly supported)
-            print("Calling Whisper model to transcribe...")
-            result = self.model.transcribe(
-                temp_filename, 
-                fp16=False,
-                # We can't actually stream with the standard Whisper API, but we get the transcription quickly
-                # In a production app, you'd want to use a real streaming implementation
-            )
+            # We can't actually stream with the standard Whisper API, but we get the transcription quickly
+            # In a production app, you'd want to use a real streaming implementation
+            result = None
+            if speculation is not None:
+                # Usually finished already: it started during the silence window
+                try:
+                    with span('speculation_wait'):
+                        result = speculation.transcription()
+                except Exception as e:
+                    logger.warning("Speculative transcription unavailable, decoding again: %s", e)
+            if result is None:
+                with span('whisper_decode'):
+                    result = self.model_manager.transcribe(audio_data, **self.decode_options(stream_id, degraded))
+            self.remember(stream_id, result)
             
-            transcription = result["text"].strip()
+            segments = Segments.from_whisper(result, audio_duration=len(audio_data) / SAMPLE_RATE)
+            transcription = segments.text
             
             # Emit the transcription immediately, before processing
             if transcription:
-                print(f"Emitting preliminary transcription: {transcription}")
-                socketio.emit('transcription', {'text': transcription, 'final': False})
+                socketio.emit('transcription', {'text': transcription, 'final': False}, to=to)
                 # Don't emit status here - let app.py handle the status flow
+                if not degraded:
+                    self.refine(audio_data, segments, result.get("language"))
                 
-            print(f"Transcription (streamed): {transcription}")
-            
-            # Clean up temp file
-            if os.path.exists(temp_filename):
-                os.remove(temp_filename)
-            
-            # Reset buffer for next recording
-            self.audio_buffer = []
+            logger.debug("Transcription (streamed, %s): %s", result['model'], transcription)
                 
-            return transcription if transcription else None
+            return segments if transcription else None
                 
         except Exception as e:
-            print(f"Error during streaming transcription: {str(e)}")
-            # Clear buffer on error
-            self.audio_buffer = []
-            return None 
\ No newline at end of file
+            logger.exception("Error during streaming transcription")
+            return None
@@ -25,6 +25,20 @@ document.addEventListener('DOMContentLoaded', () => {
     let currentTranscriptionMessage = null;
     let isThinking = false;
     let currentStatus = 'ready';
+    let sendPaused = false;
+    let audioEncoding = 'f32le';  // negotiated with the server on connect
+    let opusEncoder = null;
+    let opusTimestamp = 0;
+    let opusBatch = [];  // packets encoded since the last message
+    let opusBatchDuration = 0;  // microseconds of audio in opusBatch
+    let captureRate = null;  // the rate the browser really captures at, once known
+    let speechContext = null;  // plays the assistant's synthesized speech
+    let speechPlayhead = 0;  // time the last queued speech frame finishes
+    
+    // Capture settings
+    const SAMPLE_RATE = 16000;
+    const BATCH_SIZE = 3200;  // 200 ms per message
+    const OPUS_BATCH_DURATION = 200000;  // microseconds of Opus packets per message
     
     // Initialize debug panel toggle
     debugToggle.addEventListener('click', () => {
@@ -110,13 +124,31 @@ document.addEventListener('DOMContentLoaded', () => {
     function connectSocket() {
         // Get the current host
         const host = window.location.host;
-        socket = io(`http://${host}`);
+        // Go straight to WebSocket so the connection stays pinned to one server
+        // process; the polling fallback relies on the proxy's sticky routing
+        socket = io(`http://${host}`, { transports: ['websocket', 'polling'] });
         
-        socket.on('connect', () => {
+        socket.on('connect', async () => {
             console.log('Connected to server');
             addDebugInfo('connect', { status: 'connected' });
             updateStatus('ready', 'Ready to listen');
             reconnectAttempts = 0;
+            
+            // Offer the wire formats this browser can produce. After a reconnect,
+            // give the rate it really captures at, not the one it asked for
+            const encodings = await detectEncodings();
+            socket.emit('audio_config', { encodings: encodings, sample_rate: captureRate || SAMPLE_RATE });
+        });
+        
+        socket.on('session', (data) => {
+            // The server binds each connection to a conversation session
+            addDebugInfo('session', data);
+            document.getElementById('session-id').textContent = data.session_id;
+        });
+        
+        socket.on('audio_config', (data) => {
+            addDebugInfo('audio_config', data);
+            audioEncoding = data.encoding;
         });
         
         socket.on('disconnect', () => {
@@ -181,6 +213,18 @@ document.addEventListener('DOMContentLoaded', () => {
                 if (!isRecording && micButton.classList.contains('muted')) {
                     startRecording();
                 }
+            } else if (data.status === 'busy') {
+                // The server had no room to transcribe that utterance
+                updateStatus('busy', 'Server busy, please say that again in a moment');
+                isProcessing = false;
+                micButton.disabled = false;
+                processingOverlay.classList.remove('active');
+                
+                setTimeout(() => {
+                    if (currentStatus === 'busy') {
+                        updateStatus('ready', 'Ready to listen');
+                    }
+                }, (data.retry_after || 3) * 1000);
             }
         });
         
@@ -244,6 +288,21 @@ document.addEventListener('DOMContentLoaded', () => {
             }
         });
         
+        socket.on('backpressure', (data) => {
+            // Server buffer is filling up: stop sending until it drains
+            addDebugInfo('backpressure', data);
+            sendPaused = data.pause;
+        });
+        
+        socket.on('tts_audio', (frame) => {
+            // Synthesized reply audio, streamed sentence by sentence
+            if (frame.final) {
+                addDebugInfo('tts_audio', { frames: frame.seq });
+                return;
+            }
+            playSpeechFrame(frame);
+        });
+        
         socket.on('debug', (data) => {
             addDebugInfo(data.event, data);
         });
@@ -281,7 +340,7 @@ document.addEventListener('DOMContentLoaded', () => {
         updateStatusBadge(status);
         
         // Remove all status classes
-        statusIndicator.parentElement.classList.remove('listening', 'processing', 'thinking', 'error');
+        statusIndicator.parentElement.classList.remove('listening', 'processing', 'thinking', 'error', 'busy');
         
         if (status !== 'ready') {
             statusIndicator.parentElement.classList.add(status);
@@ -294,7 +353,7 @@ document.addEventListener('DOMContentLoaded', () => {
         console.log(`Updating status badge to: ${status}`);
         
         // Remove all status classes
-        statusBadge.classList.remove('listening', 'transcribing', 'thinking', 'processing', 'error');
+        statusBadge.classList.remove('listening', 'transcribing', 'thinking', 'processing', 'error', 'busy');
         
         // Add the appropriate class
         if (status !== 'ready') {
@@ -320,6 +379,9 @@ document.addEventListener('DOMContentLoaded', () => {
             case 'error':
                 badgeText = 'Error';
                 break;
+            case 'busy':
+                badgeText = 'Server Busy';
+                break;
         }
         
         statusBadge.textContent = badgeText;
@@ -341,6 +403,139 @@ document.addEventListener('DOMContentLoaded', () => {
         chatContainer.scrollTop = chatContainer.scrollHeight;
     }
     
+    // Work out which audio encodings this browser can send, most compact first
+    async function detectEncodings() {
+        const encodings = [];
+        if (window.AudioEncoder) {
+            try {
+                const support = await AudioEncoder.isConfigSupported({
+                    codec: 'opus', sampleRate: SAMPLE_RATE, numberOfChannels: 1
+                });
+                if (support.supported) {
+                    encodings.push('opus');
+                }
+            } catch (err) {
+                console.log('Opus encoding not available:', err);
+            }
+        }
+        encodings.push('pcm_s16le', 'f32le');
+        return encodings;
+    }
+    
+    // Convert float samples in [-1, 1] to 16-bit PCM
+    function floatToPCM16(samples) {
+        const out = new Int16Array(samples.length);
+        for (let i = 0; i < samples.length; i++) {
+            const s = Math.max(-1, Math.min(1, samples[i]));
+            out[i] = s < 0 ? s * 0x8000 : s * 0x7fff;
+        }
+        return out;
+    }
+    
+    // Set up a WebCodecs Opus encoder for audio captured at sampleRate. Its
+    // ~20 ms packets are sent in batches, like the PCM formats
+    function startOpusEncoder(sampleRate) {
+        opusTimestamp = 0;
+        opusBatch = [];
+        opusBatchDuration = 0;
+        opusEncoder = new AudioEncoder({
+            output: (chunk) => {
+                const packet = new Uint8Array(chunk.byteLength);
+                chunk.copyTo(packet);
+                opusBatch.push(packet);
+                opusBatchDuration += chunk.duration || 20000;
+                if (opusBatchDuration >= OPUS_BATCH_DURATION) {
+                    sendOpusBatch();
+                }
+            },
+            error: (err) => {
+                console.error('Opus encoder error:', err);
+                addDebugInfo('opus_error', { message: err.message });
+            }
+        });
+        opusEncoder.configure({
+            codec: 'opus',
+            sampleRate: sampleRate,
+            numberOfChannels: 1,
+            bitrate: 24000
+        });
+    }
+    
+    // Send the batched Opus packets as one message, each prefixed with its
+    // 16-bit little-endian length
+    function sendOpusBatch() {
+        if (opusBatch.length && socket && socket.connected && !sendPaused) {
+            const size = opusBatch.reduce((total, packet) => total + 2 + packet.byteLength, 0);
+            const message = new Uint8Array(size);
+            let offset = 0;
+            for (const packet of opusBatch) {
+                message[offset] = packet.byteLength & 0xff;
+                message[offset + 1] = packet.byteLength >> 8;
+                message.set(packet, offset + 2);
+                offset += 2 + packet.byteLength;
+            }
+            socket.emit('audio_data', message.buffer);
+        }
+        opusBatch = [];
+        opusBatchDuration = 0;
+    }
+    
+    // Queue one pcm_s16le frame of the assistant's speech right after the previous one
+    function playSpeechFrame(frame) {
+        if (!speechContext) {
+            speechContext = new (window.AudioContext || window.webkitAudioContext)();
+        }
+        const pcm = new Int16Array(frame.data);
+        const buffer = speechContext.createBuffer(1, pcm.length, frame.sample_rate);
+        const channel = buffer.getChannelData(0);
+        for (let i = 0; i < pcm.length; i++) {
+            channel[i] = pcm[i] / 32768;
+        }
+        const source = speechContext.createBufferSource();
+        source.buffer = buffer;
+        source.connect(speechContext.destination);
+        const startAt = Math.max(speechContext.currentTime + 0.05, speechPlayhead);
+        source.start(startAt);
+        speechPlayhead = startAt + buffer.duration;
+    }
+    
+    function isPlayingSpeech() {
+        return speechContext !== null && speechPlayhead > speechContext.currentTime;
+    }
+    
+    // Send one captured batch in the negotiated format
+    function sendAudio(buffer) {
+        if (!isRecording) return;
+        
+        // Skip sending if socket is not connected or the server asked us to pause
+        if (!socket || !socket.connected || sendPaused) {
+            return;
+        }
+        
+        // Don't let the microphone pick up the assistant's own voice
+        if (isPlayingSpeech()) {
+            return;
+        }
+        
+        if (audioEncoding === 'opus' && opusEncoder) {
+            const samples = new Float32Array(buffer);
+            // The browser may not have honoured the requested capture rate
+            const audioData = new AudioData({
+                format: 'f32',
+                sampleRate: audioContext.sampleRate,
+                numberOfFrames: samples.length,
+                numberOfChannels: 1,
+                timestamp: opusTimestamp,
+                data: samples
+            });
+            opusTimestamp += Math.round(samples.length * 1e6 / audioContext.sampleRate);
+            opusEncoder.encode(audioData);
+            audioData.close();
+        } else {
+            socket.emit('audio_data', buffer);
+        }
+    }
+    
     // Start recording audio
     async function startRecording() {
         if (isRecording || isProcessing) return;
@@ -357,35 +552,42 @@ document.addEventListener('DOMContentLoaded', () => {
             
             // Create audio context
             audioContext = new (window.AudioContext || window.webkitAudioContext)({
-                sampleRate: 16000
+                sampleRate: SAMPLE_RATE
             });
             
-            const source = audioContext.createMediaStreamSource(audioStream);
+            // Some browsers ignore the requested rate; tell the server what we really
+            // capture. Opus is always decoded at 16 kHz, whatever rate it was encoded from
+            captureRate = audioContext.sampleRate;
+            if (audioContext.sampleRate !== SAMPLE_RATE && audioEncoding !== 'opus') {
+                socket.emit('audio_config', { encodings: [audioEncoding], sample_rate: audioContext.sampleRate });
+            }
             
-            // Create script processor node to process audio data
-            processorNode = audioContext.createScriptProcessor(4096, 1, 1);
+            const source = audioContext.createMediaStreamSource(audioStream);
             
-            processorNode.onaudioprocess = (e) => {
-                if (!isRecording) return;
-                
-                // Convert audio data to Float32Array
-                const inputData = e.inputBuffer.getChannelData(0);
-                
-                // Skip sending if socket is not connected
-                if (!socket || !socket.connected) {
-                    return;
-                }
-                
-                // Only send if there's actual audio data (not silence)
-                const energy = Math.sqrt(inputData.reduce((acc, val) => acc + val * val, 0) / inputData.length);
-                if (energy > 0.001) {
-                    socket.emit('audio_data', inputData);
-                }
-            };
+            // Capture in an AudioWorklet where available, falling back to
+            // the deprecated ScriptProcessorNode on older browsers
+            const frameFormat = audioEncoding === 'pcm_s16le' ? 'pcm_s16le' : 'f32le';
+            if (audioEncoding === 'opus') {
+                startOpusEncoder(audioContext.sampleRate);
+            }
             
-            // Connect nodes
-            source.connect(processorNode);
-            processorNode.connect(audioContext.destination);
+            if (audioContext.audioWorklet) {
+                await audioContext.audioWorklet.addModule('/static/js/pcm-worklet.js');
+                processorNode = new AudioWorkletNode(audioContext, 'pcm-capture', {
+                    numberOfOutputs: 0,
+                    processorOptions: { batchSize: BATCH_SIZE, format: frameFormat }
+                });
+                processorNode.port.onmessage = (e) => sendAudio(e.data);
+                source.connect(processorNode);
+            } else {
+                processorNode = audioContext.createScriptProcessor(4096, 1, 1);
+                processorNode.onaudioprocess = (e) => {
+                    const inputData = e.inputBuffer.getChannelData(0);
+                    sendAudio(frameFormat === 'pcm_s16le' ? floatToPCM16(inputData).buffer : inputData.slice().buffer);
+                };
+                source.connect(processorNode);
+                processorNode.connect(audioContext.destination);
+            }
             
             // Update UI
             isRecording = true;
@@ -420,10 +622,22 @@ document.addEventListener('DOMContentLoaded', () => {
         
         // Disconnect processor node
         if (processorNode) {
+            if (processorNode.port) {
+                processorNode.port.onmessage = null;
+            }
             processorNode.disconnect();
             processorNode = null;
         }
         
+        // Send what is batched and close the Opus encoder
+        if (opusEncoder) {
+            sendOpusBatch();
+            if (opusEncoder.state !== 'closed') {
+                opusEncoder.close();
+            }
+            opusEncoder = null;
+        }
+        
         // Close audio context
         if (audioContext) {
             if (audioContext.state !== 'closed') {
@@ -0,0 +1,44 @@
+// AudioWorklet processor that captures microphone audio off the main thread
+// and posts it in fixed-size batches, either as 16-bit PCM or raw float32.
+class PCMCaptureProcessor extends AudioWorkletProcessor {
+    constructor(options) {
+        super();
+        const opts = (options && options.processorOptions) || {};
+        this.batchSize = opts.batchSize || 3200;
+        this.format = opts.format || 'pcm_s16le';
+        this.buffer = new Float32Array(this.batchSize);
+        this.offset = 0;
+    }
+
+    process(inputs) {
+        const input = inputs[0];
+        if (input && input[0]) {
+            const channel = input[0];
+            for (let i = 0; i < channel.length; i++) {
+                this.buffer[this.offset++] = channel[i];
+                if (this.offset === this.batchSize) {
+                    this.flush();
+                }
+            }
+        }
+        return true;
+    }
+
+    flush() {
+        let out;
+        if (this.format === 'pcm_s16le') {
+            out = new Int16Array(this.batchSize);
+            for (let i = 0; i < this.batchSize; i++) {
+                const s = Math.max(-1, Math.min(1, this.buffer[i]));
+                out[i] = s < 0 ? s * 0x8000 : s * 0x7fff;
+            }
+        } else {
+            out = this.buffer.slice();
+        }
+        // Transfer the underlying buffer instead of copying it
+        this.port.postMessage(out.buffer, [out.buffer]);
+        this.offset = 0;
+    }
+}
+
+registerProcessor('pcm-capture', PCMCaptureProcessor);
@@ -0,0 +1,33 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+# The app's modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def app_module(tmp_path_factory):
+    """app.py imported once for the whole run, with its stores in a scratch directory."""
+    root = tmp_path_factory.mktemp("app")
+    rag_db = root / "rag.db"
+    rag_db.touch()
+    env = {
+        "DATABASE_PATH": str(root / "speech_app.db"),
+        "ARCHIVE_DIR": str(root / "archive"),
+        "RAG_DB_PATH": str(rag_db),
+        "WARM_UP": "0",
+        "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "test-key"),
+    }
+    saved = {name: os.environ.get(name) for name in env}
+    os.environ.update(env)
+    try:
+        yield importlib.import_module("app")
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
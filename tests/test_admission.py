@@ -0,0 +1,91 @@
+import threading
+import time
+
+import admission as admission_module
+from admission import BUSY, NORMAL, RateLimiter, TranscriptionAdmission
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_speculative_job_takes_only_a_free_slot_at_full_quality():
+    admission = TranscriptionAdmission(max_in_flight=2, max_queued=2, degrade_at=1)
+    with admission.admit(speculative=True) as ticket:
+        assert ticket is not None and not ticket.degraded
+        assert admission.stats()["in_flight"] == 1
+        with admission.admit() as other:
+            assert other is not None
+            # Both slots are taken: a speculation doesn't queue behind real turns
+            with admission.admit(speculative=True) as third:
+                assert third is None
+    stats = admission.stats()
+    assert stats["in_flight"] == 0
+    assert stats["speculative_skipped"] == 1
+    assert stats["rejected"] == 0
+
+
+def test_token_bucket_refills_at_its_rate_up_to_the_burst(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(admission_module.time, "monotonic", clock)
+    limiter = RateLimiter(rate=100, burst=300)
+
+    assert limiter.allow("sid", 300)
+    assert not limiter.allow("sid", 50)
+    clock.now += 0.5
+    assert limiter.allow("sid", 50) and not limiter.allow("sid", 1)
+    clock.now += 60
+    assert limiter.allow("sid", 300) and not limiter.allow("sid", 1)
+    # Buckets are per connection
+    assert limiter.allow("other", 300)
+    stats = limiter.stats()
+    assert stats["rejected_chunks"] == 3 and stats["rejected_bytes"] == 52
+
+
+def test_throttling_is_reported_when_it_starts_and_when_it_ends():
+    limiter = RateLimiter(rate=100, burst=100)
+    assert not limiter.limit_changed("sid", True)
+    assert limiter.limit_changed("sid", False)
+    assert not limiter.limit_changed("sid", False)
+    assert limiter.limit_changed("sid", True)
+
+
+def test_queued_job_is_degraded_and_times_out_without_a_slot():
+    admission = TranscriptionAdmission(max_in_flight=1, max_queued=1, queue_timeout=0.05)
+    first = admission.acquire()
+    assert first is not None and not first.degraded
+    assert admission.acquire() is None
+    assert admission.stats()["timed_out"] == 1
+
+    threading.Timer(0.02, admission.release, [first]).start()
+    admission.queue_timeout = 5
+    queued = admission.acquire()
+    assert queued is not None and queued.degraded and queued.waited > 0
+    admission.release(queued)
+
+
+def test_job_is_rejected_when_the_queue_is_full():
+    admission = TranscriptionAdmission(max_in_flight=1, max_queued=1, queue_timeout=5)
+    running = admission.acquire()
+    waiter = threading.Thread(target=lambda: admission.release(admission.acquire()))
+    waiter.start()
+    while admission.stats()["waiting"] < 1:
+        time.sleep(0.01)
+
+    assert admission.level() == BUSY
+    assert admission.acquire() is None
+    admission.release(running)
+    waiter.join(5)
+    stats = admission.stats()
+    assert (stats["rejected"], stats["timed_out"], stats["in_flight"]) == (1, 0, 0)
+    assert admission.level() == NORMAL
+
+
+def test_job_is_degraded_once_load_reaches_degrade_at():
+    admission = TranscriptionAdmission(max_in_flight=3, degrade_at=2)
+    with admission.admit() as first, admission.admit() as second:
+        assert not first.degraded and second.degraded
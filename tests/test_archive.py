@@ -0,0 +1,71 @@
+import glob
+import gzip
+import json
+import os
+import subprocess
+import sys
+from datetime import timedelta
+
+import pytest
+
+from archive import ArchiveReader, _archive_lock, export_closed_sessions
+from database import create_session, end_session, init_db, store_interaction
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    return init_db(str(tmp_path / "speech_app.db"))
+
+
+def close_session(session_factory, user_id, transcript):
+    session = create_session(session_factory, user_id)
+    store_interaction(session_factory, session.id, transcript)
+    end_session(session_factory, session.id)
+    return session
+
+
+def test_exports_in_the_same_second_write_separate_files(session_factory, tmp_path):
+    archive_dir = str(tmp_path / "archive")
+    sessions = [create_session(session_factory, user) for user in ("alice", "bob")]
+    for session in sessions:
+        end_session(session_factory, session.id)
+        export_closed_sessions(session_factory, archive_dir, older_than=timedelta(0), vacuum=False)
+
+    assert len(glob.glob(os.path.join(archive_dir, "date=*", "*.jsonl.gz"))) == 2
+    assert {s["user_id"] for s in ArchiveReader(archive_dir).iter_sessions()} == {"alice", "bob"}
+
+
+def test_export_waits_for_another_process_holding_the_lock(session_factory, tmp_path):
+    archive_dir = str(tmp_path / "archive")
+    close_session(session_factory, "alice", "hello")
+    script = ("import sys; from datetime import timedelta; from archive import export_closed_sessions;"
+              "from database import init_db;"
+              "export_closed_sessions(init_db(sys.argv[1]), sys.argv[2], older_than=timedelta(0), vacuum=False)")
+    with _archive_lock(archive_dir):
+        process = subprocess.Popen([sys.executable, "-c", script, str(tmp_path / "speech_app.db"), archive_dir],
+                                   cwd=ROOT)
+        with pytest.raises(subprocess.TimeoutExpired):
+            process.wait(timeout=1)
+        assert not glob.glob(os.path.join(archive_dir, "date=*", "*.jsonl.gz"))
+    assert process.wait(timeout=30) == 0
+    assert [s["user_id"] for s in ArchiveReader(archive_dir).iter_sessions()] == ["alice"]
+
+
+def test_reader_skips_corrupt_files(session_factory, tmp_path, caplog):
+    archive_dir = str(tmp_path / "archive")
+    close_session(session_factory, "alice", "hello")
+    export_closed_sessions(session_factory, archive_dir, older_than=timedelta(0), vacuum=False)
+    partition = os.path.dirname(glob.glob(os.path.join(archive_dir, "date=*", "*.jsonl.gz"))[0])
+
+    with open(os.path.join(partition, "sessions-not-gzip.jsonl.gz"), "wb") as f:
+        f.write(b"not gzip at all")
+    data = gzip.compress(json.dumps({"id": 99, "start_time": None}).encode() + b"\n" * 100)
+    with open(os.path.join(partition, "sessions-truncated.jsonl.gz"), "wb") as f:
+        f.write(data[:len(data) // 2])
+    with gzip.open(os.path.join(partition, "sessions-bad-json.jsonl.gz"), "wt") as f:
+        f.write("{not json\n")
+
+    assert [s["user_id"] for s in ArchiveReader(archive_dir).iter_sessions()] == ["alice"]
+    assert caplog.text.count("corrupt archive file") == 3
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from audio_codec import TARGET_SAMPLE_RATE, Resampler, resample, split_opus_packets
+
+
+def frame(*packets):
+    return b"".join(len(packet).to_bytes(2, "little") + packet for packet in packets)
+
+
+def test_split_opus_packets_returns_each_packet():
+    packets = [b"\x01" * 60, b"", b"\x02" * 300]
+    assert split_opus_packets(bytearray(frame(*packets))) == packets
+
+
+@pytest.mark.parametrize("data", [frame(b"abc")[:-1], b"\x05"])
+def test_split_opus_packets_rejects_truncated_messages(data):
+    with pytest.raises(ValueError):
+        split_opus_packets(data)
+
+
+def tone(frequency, rate, seconds=1.0):
+    return np.sin(2 * np.pi * frequency * np.arange(int(rate * seconds)) / rate).astype(np.float32)
+
+
+def level_db(samples):
+    return 20 * np.log10(np.sqrt(2 * np.mean(samples[200:-200] ** 2)) + 1e-12)
+
+
+@pytest.mark.parametrize("rate", [8000, 22050, 44100, 48000])
+def test_streamed_chunks_resample_like_one_signal(rate):
+    audio = np.random.default_rng(0).standard_normal(rate).astype(np.float32)
+    whole = resample(audio, rate, TARGET_SAMPLE_RATE)
+    assert len(whole) == TARGET_SAMPLE_RATE
+
+    resampler = Resampler(rate, TARGET_SAMPLE_RATE)
+    bounds = np.cumsum(np.random.default_rng(1).integers(1, 3000, size=100))
+    streamed = np.concatenate([resampler.process(chunk) for chunk in np.split(audio, bounds[bounds < rate])])
+    assert TARGET_SAMPLE_RATE - 64 < len(streamed) <= TARGET_SAMPLE_RATE
+    np.testing.assert_allclose(streamed, whole[:len(streamed)], atol=1e-5)
+
+
+@pytest.mark.parametrize("rate", [44100, 48000])
+def test_resampling_keeps_speech_and_filters_out_aliases(rate):
+    assert abs(level_db(resample(tone(1000, rate), rate, TARGET_SAMPLE_RATE))) < 0.1
+    assert abs(level_db(resample(tone(5000, rate), rate, TARGET_SAMPLE_RATE))) < 0.5
+    # Above the new Nyquist frequency, a tone would fold back into the speech band
+    assert level_db(resample(tone(9000, rate), rate, TARGET_SAMPLE_RATE)) < -50
+    assert level_db(resample(tone(12000, rate), rate, TARGET_SAMPLE_RATE)) < -60
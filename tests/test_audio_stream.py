@@ -0,0 +1,90 @@
+import numpy as np
+
+from speechrecognition import SAMPLE_RATE, AudioStream
+
+CHUNK = int(0.2 * SAMPLE_RATE)
+
+
+def tone(seconds, amplitude=0.3):
+    """Voiced-like audio: a few harmonics, which the VAD classifies as speech."""
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (amplitude * sum(np.sin(2 * np.pi * 180 * k * t) / k for k in range(1, 5))).astype(np.float32)
+
+
+def quiet(seconds, seed=0):
+    return (np.random.default_rng(seed).standard_normal(int(seconds * SAMPLE_RATE)) * 1e-4).astype(np.float32)
+
+
+def feed(stream, audio):
+    """Send audio in 200 ms chunks; return the statuses that came back."""
+    return [stream.add_samples(audio[i:i + CHUNK]) for i in range(0, len(audio), CHUNK)]
+
+
+def feed_until_processing(stream, seed=1):
+    for _ in range(50):
+        if stream.add_samples(quiet(0.2, seed)) == "processing":
+            return
+    raise AssertionError("silence never ended the utterance")
+
+
+def test_chunk_between_processing_and_take_keeps_utterance():
+    stream = AudioStream()
+    feed(stream, quiet(0.6))
+    feed(stream, tone(2.0))
+    feed_until_processing(stream)
+
+    # More audio arrives before the workflow takes the utterance
+    assert stream.add_samples(quiet(0.2, seed=2)) is None
+
+    audio = stream.take_utterance()
+    assert audio is not None
+    # The whole 2 s of speech plus padding, not a trimmed remnant
+    assert 1.9 < len(audio) / SAMPLE_RATE < 2.8
+    assert np.sqrt(np.mean(audio ** 2)) > 0.05
+
+
+def test_speech_while_pending_starts_next_utterance():
+    stream = AudioStream()
+    feed(stream, quiet(0.6))
+    feed(stream, tone(1.0))
+    feed_until_processing(stream)
+
+    feed(stream, tone(1.0))
+    first = stream.take_utterance()
+    assert 0.9 < len(first) / SAMPLE_RATE < 1.8
+
+    feed_until_processing(stream)
+    second = stream.take_utterance()
+    assert second is not None
+    assert 0.9 < len(second) / SAMPLE_RATE < 1.8
+
+
+def test_trimming_leading_silence_keeps_offsets_inside_buffer():
+    stream = AudioStream()
+    for _ in range(20):
+        feed(stream, quiet(0.2))
+        assert stream.speech_start is None
+        assert stream.classified_samples <= len(stream.buffer)
+
+
+def test_forced_cut_comes_before_backpressure():
+    stream = AudioStream()
+    statuses = []
+    for i in range(0, int(40 * SAMPLE_RATE), CHUNK):
+        statuses.append(stream.add_samples(tone(0.2)))
+        if stream.backpressure:
+            break
+    assert "processing" in statuses
+    assert stream.cut_forced
+
+
+def test_backpressure_forces_a_cut_so_a_paused_client_recovers():
+    stream = AudioStream()
+    stream.max_utterance = 1000.0  # never reached: only backpressure can end the utterance
+    status = None
+    while not stream.backpressure:
+        status = stream.add_samples(tone(0.2))
+    assert status == "processing"
+
+    assert stream.take_utterance() is not None
+    assert stream.pop_backpressure_signal()["pause"] is False
@@ -0,0 +1,89 @@
+import threading
+import time
+
+import cache
+from cache import SingleFlight, TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_expire_after_their_ttl(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+    entries = TTLCache(ttl_seconds=10)
+    entries.set("key", "value")
+
+    clock.now += 9.9
+    assert entries.get("key") == "value"
+    clock.now += 0.1
+    assert entries.get("key") is None and entries.peek("key") is None
+    stats = entries.stats()
+    assert (stats["hits"], stats["misses"], stats["expirations"], stats["size"]) == (1, 1, 1, 0)
+
+
+def test_least_recently_used_entry_is_evicted():
+    entries = TTLCache(max_entries=2)
+    entries.set("a", 1)
+    entries.set("b", 2)
+    entries.get("a")
+    entries.set("c", 3)
+    assert entries.peek("b") is None and entries.peek("a") == 1 and entries.stats()["evictions"] == 1
+
+
+def test_concurrent_calls_with_the_same_key_run_once():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        release.wait(5)
+        return "result"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("key", slow))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    while flight.coalesced < 4:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert results == ["result"] * 5 and len(calls) == 1
+    assert flight.do("key", lambda: "again") == "again"
+
+
+def test_waiters_receive_the_leaders_exception():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    errors = []
+
+    def failing():
+        started.set()
+        release.wait(5)
+        raise ValueError("boom")
+
+    def call():
+        try:
+            flight.do("key", failing)
+        except ValueError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait(5)
+    waiter = threading.Thread(target=call)
+    waiter.start()
+    while flight.coalesced < 1:
+        time.sleep(0.01)
+    release.set()
+    leader.join(5)
+    waiter.join(5)
+    assert len(errors) == 2 and errors[0] is errors[1]
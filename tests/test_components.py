@@ -0,0 +1,23 @@
+from components import LOADING, READY, ComponentRegistry
+
+
+def test_component_with_warm_step_is_loading_until_warmed():
+    registry = ComponentRegistry()
+    warmed = []
+    component = registry.register("model", object, warm=warmed.append)
+
+    component.get()
+    assert component.state == LOADING and not registry.readiness()["ready"]
+    registry.warm_up()
+    assert component.state == READY and len(warmed) == 1
+
+
+def test_component_is_ready_once_built_when_warm_up_is_disabled():
+    registry = ComponentRegistry(warm_steps=False)
+    warmed = []
+    component = registry.register("model", object, warm=warmed.append)
+
+    assert not registry.readiness()["ready"]
+    component.get()
+    assert component.state == READY and registry.readiness()["ready"]
+    assert not warmed
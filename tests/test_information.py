@@ -0,0 +1,41 @@
+from datetime import timedelta
+
+import pytest
+
+import archive
+from archive import export_closed_sessions
+from database import create_session, end_session, store_interaction
+
+PASSWORD = "1234"
+
+
+def test_password_is_not_sent_back_to_the_browser(app_module):
+    client = app_module.app.test_client()
+    page = client.post("/information", data={"password": PASSWORD}).get_data(as_text=True)
+    assert "Database Information" in page and PASSWORD not in page
+
+    # The filter form carries no password; the session cookie keeps the dashboard open
+    filtered = client.post("/information", data={"from": "2000-01-01", "to": ""}).get_data(as_text=True)
+    assert "Sessions:" in filtered or "No sessions found" in filtered
+    assert "Invalid password" in app_module.app.test_client().post(
+        "/information", data={"from": "2000-01-01"}).get_data(as_text=True)
+    assert "Invalid password" in client.post("/information", data={"password": "wrong"}).get_data(as_text=True)
+    assert "Invalid password" in client.post("/information", data={"from": ""}).get_data(as_text=True)
+
+
+def test_session_both_archived_and_live_is_listed_once(app_module, monkeypatch):
+    Session = app_module.Session
+    session = create_session(Session, "crash-user")
+    store_interaction(Session, session.id, "archived before the crash")
+    end_session(Session, session.id)
+
+    # Crash after the archive is flushed but before the rows are deleted
+    def crash(db_session, session_ids):
+        raise RuntimeError("crashed")
+    monkeypatch.setattr(archive, "_delete_sessions", crash)
+    with pytest.raises(RuntimeError):
+        export_closed_sessions(Session, app_module.archive_dir, older_than=timedelta(0), vacuum=False)
+    assert any(s["id"] == session.id for s in app_module.archive_reader.iter_sessions())
+
+    page = app_module.app.test_client().post("/information", data={"password": PASSWORD}).get_data(as_text=True)
+    assert page.count(f"Session #{session.id} ") == 1
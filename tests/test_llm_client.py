@@ -0,0 +1,142 @@
+import asyncio
+
+import httpx
+import pytest
+
+import llm_client
+from llm_client import CircuitBreaker, CircuitOpenError, LLMClient, LLMError
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def client_with(handler, **kwargs):
+    client = LLMClient(base_url="http://llm.test/v1", backoff_base=0, **kwargs)
+    client._client = httpx.AsyncClient(base_url=client.base_url, transport=httpx.MockTransport(handler))
+    client._semaphore = asyncio.Semaphore(client.max_concurrency)
+    return client
+
+
+def half_open_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.state == "half_open"
+    return breaker
+
+
+def test_cancelled_trial_call_lets_the_next_trial_through():
+    async def hang(request):
+        await asyncio.sleep(10)
+
+    breaker = half_open_breaker()
+    client = client_with(hang, breaker=breaker)
+
+    async def cancel_trial():
+        task = asyncio.ensure_future(client.chat([{"role": "user", "content": "hi"}]))
+        await asyncio.sleep(0.05)
+        assert breaker.trial_in_flight
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_trial())
+    assert not breaker.trial_in_flight
+    assert breaker.allow()
+
+
+def test_malformed_json_is_an_llm_error():
+    client = client_with(lambda request: httpx.Response(200, content=b"<html>oops</html>"))
+    with pytest.raises(LLMError):
+        asyncio.run(client.chat([{"role": "user", "content": "hi"}]))
+    assert client.breaker.state == "closed"
+
+
+def sequence(*statuses):
+    """A handler answering with each status in turn, recording every request."""
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        status = statuses[len(requests) - 1]
+        return httpx.Response(status, json={"choices": [{"message": {"content": "ok"}}]},
+                              headers={"retry-after": "0"} if status == 429 else None)
+
+    return handler, requests
+
+
+def test_transient_failures_are_retried():
+    handler, requests = sequence(503, 429, 200)
+    client = client_with(handler, max_retries=3)
+    assert asyncio.run(client.chat([{"role": "user", "content": "hi"}])) == "ok"
+    assert len(requests) == 3 and client.retries == 2
+    assert client.breaker.state == "closed"
+
+
+def test_client_errors_are_not_retried():
+    handler, requests = sequence(400, 200)
+    client = client_with(handler, max_retries=3)
+    with pytest.raises(LLMError) as error:
+        asyncio.run(client.chat([{"role": "user", "content": "hi"}]))
+    assert error.value.status == 400 and len(requests) == 1
+
+
+def test_retries_stop_after_max_retries():
+    handler, requests = sequence(*[503] * 10)
+    client = client_with(handler, max_retries=2)
+    with pytest.raises(LLMError) as error:
+        asyncio.run(client.chat([{"role": "user", "content": "hi"}]))
+    assert error.value.status == 503 and len(requests) == 3
+
+
+def test_backoff_is_full_jitter_under_the_cap(monkeypatch):
+    client = LLMClient(backoff_base=0.5, backoff_max=8.0)
+    monkeypatch.setattr(llm_client.random, "uniform", lambda low, high: high)
+    assert [client._backoff(attempt) for attempt in range(6)] == [0.5, 1.0, 2.0, 4.0, 8.0, 8.0]
+    assert client._backoff(0, retry_after=3) == 3
+    assert client._backoff(0, retry_after=60) == 8.0
+
+
+def test_breaker_opens_then_half_opens_then_closes(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(llm_client.time, "monotonic", clock)
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+
+    breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    clock.now += 30
+    assert breaker.state == "half_open"
+    assert breaker.allow() and not breaker.allow()  # a single trial call
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+    assert breaker.times_opened == 1
+
+
+def test_failed_trial_reopens_the_breaker(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(llm_client.time, "monotonic", clock)
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+    assert breaker.times_opened == 2
+
+
+def test_open_breaker_fails_fast():
+    handler, requests = sequence(200)
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    client = client_with(handler, breaker=breaker)
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(client.chat([{"role": "user", "content": "hi"}]))
+    assert not requests
@@ -0,0 +1,98 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from model_manager import SAMPLE_RATE, ModelManager
+
+
+class FakeModel:
+    """Records how many decodes run on it at once, like Whisper's shared kv-cache hooks would suffer."""
+
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def transcribe(self, audio, **options):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            self.calls += 1
+        time.sleep(0.02)
+        with self._lock:
+            self.active -= 1
+        return {"text": "hello", "segments": []}
+
+
+def manager_with_fake_models(pool_size):
+    manager = ModelManager(pool_size=pool_size)
+    loaded = []
+
+    def load(name):
+        loaded.append(FakeModel())
+        return loaded[-1]
+
+    manager._load = load
+    return manager, loaded
+
+
+def test_concurrent_decodes_never_share_an_instance():
+    manager, loaded = manager_with_fake_models(pool_size=2)
+    audio = np.zeros(SAMPLE_RATE, dtype=np.float32)
+    threads = [threading.Thread(target=manager.transcribe, args=(audio,)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(loaded) == 2
+    assert sum(model.calls for model in loaded) == 8
+    assert all(model.max_active == 1 for model in loaded)
+    assert manager.stats()["tiny"]["instances"] == 2
+
+
+def test_warm_up_loads_and_warms_every_instance_once():
+    manager, loaded = manager_with_fake_models(pool_size=3)
+    manager.warm_up()
+    manager.warm_up()
+    assert len(loaded) == 3
+    assert [model.calls for model in loaded] == [1, 1, 1]
+    assert manager.stats()["tiny"]["warm"]
+
+
+def test_failed_load_frees_its_slot():
+    manager = ModelManager(pool_size=1)
+    attempts = []
+
+    def load(name):
+        attempts.append(name)
+        if len(attempts) == 1:
+            raise RuntimeError("out of memory")
+        return FakeModel()
+
+    manager._load = load
+    audio = np.zeros(SAMPLE_RATE, dtype=np.float32)
+    with pytest.raises(RuntimeError):
+        manager.transcribe(audio)
+    assert manager.transcribe(audio)["text"] == "hello"
+
+
+def test_no_speech_probe_runs_only_while_the_language_is_unknown():
+    manager, loaded = manager_with_fake_models(pool_size=1)
+    probes = []
+
+    def probe(model, audio, language, fp16):
+        probes.append(language)
+        return "en", 0.1
+
+    manager.probe = probe
+    audio = np.zeros(SAMPLE_RATE, dtype=np.float32)
+
+    manager.transcribe(audio, no_speech_skip=0.6)
+    assert probes == [None]
+    # Pinned: the probe would be an extra encoder pass on top of the decode
+    manager.transcribe(audio, no_speech_skip=0.6, language="en")
+    assert probes == [None]
@@ -0,0 +1,71 @@
+from response_cache import ResponseCache
+
+SYSTEM = {"role": "system", "content": "You are a helpful assistant."}
+
+
+def conversation(*turns):
+    roles = ["user", "assistant"]
+    return [SYSTEM] + [{"role": roles[i % 2], "content": text} for i, text in enumerate(turns)]
+
+
+def test_sessions_with_different_histories_do_not_share_replies():
+    cache = ResponseCache()
+    alice = conversation("My name is Alice, book the 12th", "Booked the 12th for Alice.", "thanks")
+    bob = conversation("My name is Bob, book the 20th", "Booked the 20th for Bob.", "thanks")
+
+    lookup = cache.lookup(alice, scope=1)
+    assert not lookup.hit
+    cache.store(lookup, "You're welcome, Alice!", 0.5)
+
+    assert not cache.lookup(bob, scope=2).hit
+    assert cache.lookup(alice, scope=1).text == "You're welcome, Alice!"
+
+
+def test_same_history_in_another_session_is_not_shared():
+    cache = ResponseCache()
+    messages = conversation("book the 12th", "Booked the 12th.", "thanks")
+    cache.store(cache.lookup(messages, scope=1), "You're welcome!", 0.5)
+    assert not cache.lookup(messages, scope=2).hit
+
+
+def test_turns_with_history_need_a_scope():
+    cache = ResponseCache()
+    assert cache.key(conversation("hi", "Hello!", "thanks")) is None
+
+
+def test_opening_turns_are_shared():
+    cache = ResponseCache()
+    cache.store(cache.lookup(conversation("Hello!"), scope=1), "Hi! How can I help?", 0.5)
+    assert cache.lookup(conversation("hello"), scope=2).text == "Hi! How can I help?"
+
+
+def test_similarity_only_matches_within_scope():
+    vectors = {"thanks": [1.0, 0.0], "thank you": [0.99, 0.1]}
+    cache = ResponseCache(embed=lambda text: vectors.get(text, [0.0, 1.0]))
+    history = ("book the 12th", "Booked the 12th.")
+    cache.store(cache.lookup(conversation(*history, "thanks"), scope=1), "You're welcome!", 0.5)
+
+    assert cache.lookup(conversation(*history, "thank you"), scope=1).similarity > 0.95
+    assert not cache.lookup(conversation(*history, "thank you"), scope=2).hit
+
+
+def test_followup_repeats_hit_within_a_session_as_history_grows():
+    cache = ResponseCache()
+    first = conversation("book the 12th", "Shall I confirm?", "yes")
+    cache.store(cache.lookup(first, scope=1), "Confirmed!", 0.5)
+
+    later = conversation("book the 12th", "Shall I confirm?", "yes", "Confirmed!",
+                         "and the 13th", "Shall I confirm?", "Yes.")
+    assert cache.lookup(later, scope=1).text == "Confirmed!"
+    assert not cache.lookup(later, scope=2).hit
+
+
+def test_stats_report_hit_rate_by_turn_type():
+    cache = ResponseCache()
+    cache.store(cache.lookup(conversation("hello"), scope=1), "Hi!", 0.5)
+    cache.lookup(conversation("hello"), scope=2)
+    cache.lookup(conversation("hi", "Hi!", "thanks"), scope=1)
+
+    turns = cache.stats()["turns"]
+    assert turns["opening"] == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+    assert turns["followup"] == {"hits": 0, "misses": 1, "hit_rate": 0.0}
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from segments import Segments
+
+WHISPER_RESULT = {
+    "text": " Héllo there. Book a table.",
+    "segments": [
+        {"start": 0.0, "end": 1.2, "text": " Héllo there.", "avg_logprob": -0.2, "no_speech_prob": 0.01,
+         "tokens": [1, 2, 3],
+         "words": [{"start": 0.0, "end": 0.5, "word": " Héllo", "probability": 0.9},
+                   {"start": 0.6, "end": 1.2, "word": " there.", "probability": 0.8}]},
+        {"start": 1.2, "end": 2.5, "text": " Book a table.", "avg_logprob": -1.4, "no_speech_prob": 0.1,
+         "words": [{"start": 1.3, "end": 1.6, "word": " Book", "probability": 0.4}]},
+    ],
+}
+
+
+def test_pack_and_unpack_round_trip():
+    segments = Segments.from_whisper(WHISPER_RESULT, audio_duration=2.5)
+    restored = Segments.from_bytes(segments.to_bytes(), audio_duration=2.5)
+
+    assert restored.texts == segments.texts and restored.word_texts == segments.word_texts
+    assert np.array_equal(restored.rows, segments.rows) and np.array_equal(restored.words, segments.words)
+    assert restored.to_dict() == segments.to_dict()
+    assert restored.text == "Héllo there. Book a table."
+    assert list(restored.low_confidence()) == [1]
+
+
+def test_refined_segment_round_trips_without_its_words():
+    segments = Segments.from_whisper(WHISPER_RESULT)
+    segments.replace_text(1, " Book a table for two.", avg_logprob=-0.3)
+    restored = Segments.from_bytes(segments.to_bytes())
+
+    assert restored.text == "Héllo there. Book a table for two."
+    assert [s.get("refined") for s in restored.to_dict()] == [False, True]
+    assert "words" not in restored.to_dict()[1] and len(restored.to_dict()[0]["words"]) == 2
+
+
+def test_empty_and_text_only_results_round_trip():
+    assert Segments.from_bytes(Segments.from_whisper({"text": ""}).to_bytes()).to_dict() == []
+    restored = Segments.from_bytes(Segments.from_whisper({"text": " hi"}, audio_duration=0.8).to_bytes())
+    assert restored.text == "hi" and restored.to_dict()[0]["end"] == pytest.approx(0.8)
+
+
+def test_unknown_blob_is_rejected():
+    with pytest.raises(ValueError):
+        Segments.from_bytes(b"XX\x01\x00\x00\x00\x00")
@@ -0,0 +1,69 @@
+import importlib.util
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_http(command, port, env, tmp_path):
+    """Start command with no TTY and return once HTTP answers on port, or fail with its output."""
+    log = open(tmp_path / "server.log", "w+")
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdin=subprocess.DEVNULL, stdout=log,
+                               stderr=subprocess.STDOUT, start_new_session=True)
+    try:
+        deadline = time.monotonic() + 60
+        status = None
+        while status is None and process.poll() is None and time.monotonic() < deadline:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=2) as response:
+                    status = response.status
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.5)
+        log.seek(0)
+        assert status == 200, f"exited with {process.poll()}:\n{log.read()[-2000:]}"
+    finally:
+        # serve.py stops its children on SIGTERM
+        if process.poll() is None:
+            process.send_signal(signal.SIGTERM)
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                os.killpg(process.pid, signal.SIGKILL)
+        log.close()
+
+
+def server_env(tmp_path, **overrides):
+    env = dict(os.environ, DATABASE_PATH=str(tmp_path / "speech_app.db"), ARCHIVE_DIR=str(tmp_path / "archive"),
+               RAG_DB_PATH=str(tmp_path / "rag.db"), WARM_UP="0",
+               OPENAI_API_KEY=os.getenv("OPENAI_API_KEY", "test-key"), **overrides)
+    env.pop("SOCKETIO_MESSAGE_QUEUE", None)
+    return env
+
+
+def test_web_process_starts_as_serve_runs_it(tmp_path):
+    """serve.py runs app.py with debug off and no terminal, as under systemd or docker."""
+    port = free_port()
+    env = server_env(tmp_path, APP_DEBUG="0", PORT=str(port), TRANSCRIPTION_BROKER=f"127.0.0.1:{free_port()}")
+    wait_for_http([sys.executable, os.path.join(ROOT, "app.py")], port, env, tmp_path)
+
+
+@pytest.mark.skipif(importlib.util.find_spec("whisper") is None, reason="transcription workers need whisper")
+def test_serve_starts_without_a_tty(tmp_path):
+    port = free_port()
+    command = [sys.executable, os.path.join(ROOT, "serve.py"), "--web-workers", "1", "--transcription-workers", "1",
+               "--base-port", str(port), "--broker", f"127.0.0.1:{free_port()}"]
+    wait_for_http(command, port, server_env(tmp_path), tmp_path)
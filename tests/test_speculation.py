@@ -0,0 +1,20 @@
+from speculation import SpeculativeRunner
+
+
+def run_speculation(text):
+    runner = SpeculativeRunner(transcribe=lambda audio, **options: {"text": text},
+                               draft_reply=lambda session_id, text: f"reply to {text}", max_workers=1)
+    speculation = runner.start("stream", "key", b"audio", session_id=1)
+    assert runner.claim("stream", "key") is speculation
+    speculation.reply(timeout=5)
+    return speculation
+
+
+def test_draft_is_reused_for_the_transcript_it_was_drafted_from():
+    speculation = run_speculation(" Book a table for two. ")
+    assert speculation.reply_for("Book a table  for two.") == "reply to Book a table for two."
+
+
+def test_draft_is_discarded_when_the_transcript_changed():
+    speculation = run_speculation("Book a table for two.")
+    assert speculation.reply_for("Book a table for ten.") is None
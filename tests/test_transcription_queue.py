@@ -0,0 +1,14 @@
+import queue
+
+from transcription_queue import RemoteTranscriber, start_local_broker
+
+
+def test_broadcast_reaches_every_other_web_process():
+    address = start_local_broker()
+    inboxes = [queue.Queue() for _ in range(3)]
+    transcribers = [RemoteTranscriber(address, on_message=inbox.put) for inbox in inboxes]
+
+    assert transcribers[0].broadcast(("forget_cached", [7], ["my number is 555 0100"])) == 2
+    for inbox in inboxes[1:]:
+        assert inbox.get(timeout=5) == ("forget_cached", [7], ["my number is 555 0100"])
+    assert inboxes[0].empty()
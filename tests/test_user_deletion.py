@@ -0,0 +1,77 @@
+import time
+from datetime import timedelta
+
+from cache import normalize_text
+
+USER = "user-42"
+PASSWORD = "1234"
+
+
+class FakeRAG:
+    """Stands in for rag.RAG, whose sqlite-vec extension may not load here."""
+
+    def __init__(self, interaction_ids):
+        self.interaction_ids = set(interaction_ids)
+
+    def delete_interactions(self, interaction_ids):
+        removed = self.interaction_ids & set(interaction_ids)
+        self.interaction_ids -= removed
+        return len(removed)
+
+
+def test_deletion_empties_every_store(app_module):
+    from archive import export_closed_sessions
+    from database import Entity, count_user_data, create_session, end_session, store_entities, store_interaction
+
+    Session = app_module.Session
+    archived = create_session(Session, USER)
+    store_interaction(Session, archived.id, "my number is 555 0100")
+    end_session(Session, archived.id)
+    export_closed_sessions(Session, app_module.archive_dir, older_than=timedelta(0))
+
+    live = create_session(Session, USER)
+    hello = store_interaction(Session, live.id, "Hello, I'm Alice")
+    reply = store_interaction(Session, live.id, "Hi Alice!", role="assistant")
+    booking = store_interaction(Session, live.id, "Book a table for the 12th")
+    store_entities(Session, booking.id, {"name": "Alice", "date": "12th"})
+
+    # The app shares its RAG store with deletion jobs
+    assert app_module.deletion_jobs.rag is app_module.rag_store
+    rag = FakeRAG([hello.id, reply.id, booking.id])
+    app_module.deletion_jobs.rag = rag
+
+    extractor = app_module.entity_extractor
+    extractor.cache.set(normalize_text(booking.transcript), {"date": "12th"})
+    responses = app_module.assistant_responder.cache
+    opening = [{"role": "system", "content": "You are a helpful assistant."},
+               {"role": "user", "content": hello.transcript}]
+    responses.store(responses.lookup(opening), "Hi Alice!", 0.5)
+    later = opening + [{"role": "assistant", "content": reply.transcript},
+                       {"role": "user", "content": "thanks"}]
+    responses.store(responses.lookup(later, scope=live.id), "You're welcome, Alice!", 0.5)
+
+    client = app_module.app.test_client()
+    response = client.delete(f"/users/{USER}/data", data={"password": PASSWORD})
+    assert response.status_code == 202
+    job_id = response.get_json()["id"]
+    deadline = time.monotonic() + 10
+    while True:
+        progress = client.get(f"/deletions/{job_id}", query_string={"password": PASSWORD}).get_json()
+        if progress["state"] in ("done", "failed") or time.monotonic() > deadline:
+            break
+        time.sleep(0.05)
+
+    assert progress["state"] == "done", progress["error"]
+    assert count_user_data(Session, USER) == {"sessions": 0, "interactions": 0}
+    db_session = Session()
+    try:
+        assert db_session.query(Entity).count() == 0
+    finally:
+        db_session.close()
+    assert not [s for s in app_module.archive_reader.iter_sessions() if s["user_id"] == USER]
+    assert not rag.interaction_ids
+    assert len(extractor.cache) == 0
+    assert len(responses.entries) == 0 and not responses._vectors
+    assert progress["deleted"]["archived_sessions"] == 1
+    assert progress["deleted"]["embeddings"] == 3
+    assert progress["deleted"]["cache_entries"] == 3
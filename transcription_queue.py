@@ -0,0 +1,264 @@
+"""
+Shared transcription queue for running Whisper in separate worker processes.
+
+A broker holds one job queue and one result queue per web process. Web
+processes submit audio through a RemoteTranscriber (a drop-in for
+ModelManager.transcribe), and any number of worker processes pull jobs,
+decode them with their own ModelManager and send the result back.
+Web processes can also broadcast small messages to each other (e.g. to
+purge a deleted user's cached data); they arrive on the same result
+queues with no job id.
+
+    python transcription_queue.py broker --address 127.0.0.1:5600
+    python transcription_queue.py worker --address 127.0.0.1:5600
+
+For tests, start_local_broker() runs the broker on a thread in the
+current process instead.
+"""
+import argparse
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from multiprocessing.managers import BaseManager
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+from model_manager import ModelStats, SAMPLE_RATE, model_manager_from_env
+
+DEFAULT_AUTHKEY = b"speech-recognition"
+
+logger = logging.getLogger(__name__)
+
+_jobs = queue.Queue()
+_results: Dict[str, queue.Queue] = {}
+_results_lock = threading.Lock()
+
+
+def _get_jobs():
+    return _jobs
+
+
+def _get_results(client_id):
+    with _results_lock:
+        return _results.setdefault(client_id, queue.Queue())
+
+
+class _Bus:
+    """Fans a message out to every web process's result queue."""
+
+    def publish(self, sender_id, message) -> int:
+        with _results_lock:
+            targets = [results for client_id, results in _results.items() if client_id != sender_id]
+        for results in targets:
+            results.put((None, True, message))
+        return len(targets)
+
+
+_bus = _Bus()
+
+
+def _get_bus():
+    return _bus
+
+
+class QueueBroker(BaseManager):
+    """Manager exposing the shared job queue, per-client result queues and the broadcast bus."""
+
+
+QueueBroker.register('get_jobs', callable=_get_jobs)
+QueueBroker.register('get_results', callable=_get_results)
+QueueBroker.register('get_bus', callable=_get_bus)
+
+
+def parse_address(address: str) -> Tuple[str, int]:
+    host, port = address.rsplit(':', 1)
+    return host, int(port)
+
+
+def serve_broker(address: str, authkey: bytes = DEFAULT_AUTHKEY):
+    """Run the broker in the foreground until interrupted."""
+    broker = QueueBroker(address=parse_address(address), authkey=authkey)
+    server = broker.get_server()
+    logger.info("Transcription broker listening on %s", address)
+    server.serve_forever()
+
+
+def start_local_broker(address: str = "127.0.0.1:0", authkey: bytes = DEFAULT_AUTHKEY) -> str:
+    """Start a broker on a daemon thread in this process and return its address."""
+    broker = QueueBroker(address=parse_address(address), authkey=authkey)
+    server = broker.get_server()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.address
+    return f"{host}:{port}"
+
+
+def connect(address: str, authkey: bytes = DEFAULT_AUTHKEY, retries: int = 20) -> QueueBroker:
+    """Connect to a broker, retrying while it starts up."""
+    broker = QueueBroker(address=parse_address(address), authkey=authkey)
+    for attempt in range(retries):
+        try:
+            broker.connect()
+            return broker
+        except ConnectionRefusedError:
+            if attempt == retries - 1:
+                raise
+            time.sleep(0.5)
+
+
+def run_worker(address: str, authkey: bytes = DEFAULT_AUTHKEY, model_manager=None):
+    """Pull transcription jobs from the broker forever."""
+    broker = connect(address, authkey)
+    jobs = broker.get_jobs()
+    manager = model_manager or model_manager_from_env()
+    manager.warm_up()
+    worker_id = f"{os.getpid()}"
+    logger.info("Transcription worker %s ready", worker_id)
+
+    result_queues = {}
+    while True:
+        job_id, client_id, enqueued_at, audio, model_name, options = jobs.get()
+        started_at = time.time()
+        try:
+            result = manager.transcribe(audio, model_name=model_name, **options)
+            result["worker"] = worker_id
+            result["queue_seconds"] = started_at - enqueued_at
+            reply = (job_id, True, result)
+        except Exception as e:
+            reply = (job_id, False, str(e))
+
+        results = result_queues.get(client_id)
+        if results is None:
+            results = result_queues[client_id] = broker.get_results(client_id)
+        results.put(reply)
+
+
+class RemoteTranscriber:
+    """
+    Submits transcription jobs to worker processes through the broker.
+    Has the same transcribe()/stats() surface the recognizer uses on a
+    local ModelManager. on_message, if given, is called with each message
+    another web process broadcast().
+    """
+
+    def __init__(self, address: str, authkey: bytes = DEFAULT_AUTHKEY, timeout: float = 120.0,
+                 on_message: Optional[Callable[[Any], None]] = None):
+        self.address = address
+        self.timeout = timeout
+        self.on_message = on_message
+        self.client_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+        self._broker = connect(address, authkey)
+        self._jobs = self._broker.get_jobs()
+        self._bus = self._broker.get_bus()
+        self._results = self._broker.get_results(self.client_id)
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.stats_by_model: Dict[str, ModelStats] = {}
+        self.queue_seconds = 0.0
+
+        self._dispatcher = threading.Thread(target=self._dispatch_results, daemon=True)
+        self._dispatcher.start()
+
+    def _dispatch_results(self):
+        while True:
+            try:
+                job_id, ok, payload = self._results.get()
+            except (EOFError, OSError) as e:
+                logger.error("Lost connection to transcription broker: %s", e)
+                self._fail_pending(RuntimeError("Transcription broker unavailable"))
+                return
+            if job_id is None:
+                self._handle_message(payload)
+                continue
+            with self._lock:
+                future = self._pending.pop(job_id, None)
+            if future is None:
+                continue  # caller already timed out
+            if ok:
+                future.set_result(payload)
+            else:
+                future.set_exception(RuntimeError(payload))
+
+    def broadcast(self, message) -> int:
+        """Send a picklable message to every other connected web process; returns how many."""
+        return self._bus.publish(self.client_id, message)
+
+    def _handle_message(self, message):
+        if self.on_message is None:
+            return
+        try:
+            self.on_message(message)
+        except Exception:
+            logger.exception("Error handling broadcast message")
+
+    def _fail_pending(self, error: Exception):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_exception(error)
+
+    def transcribe(self, audio: np.ndarray, model_name: Optional[str] = None, **options) -> Dict[str, Any]:
+        job_id = uuid.uuid4().hex
+        future = Future()
+        with self._lock:
+            self._pending[job_id] = future
+
+        self._jobs.put((job_id, self.client_id, time.time(),
+                        audio.astype(np.float32, copy=False), model_name, options))
+        try:
+            result = future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            with self._lock:
+                self._pending.pop(job_id, None)
+            raise
+
+        with self._lock:
+            stats = self.stats_by_model.setdefault(result["model"], ModelStats())
+            stats.record(len(audio) / SAMPLE_RATE, result["decode_seconds"])
+            self.queue_seconds += result.get("queue_seconds", 0.0)
+        return result
+
+    def warm_up(self, names=None):
+        """Workers warm their own models on startup."""
+
+    def warm_up_async(self, names=None):
+        return None
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                name: {
+                    "remote": True,
+                    "calls": stats.calls,
+                    "audio_seconds": round(stats.audio_seconds, 3),
+                    "decode_seconds": round(stats.decode_seconds, 3),
+                    "real_time_factor": (round(stats.real_time_factor, 3)
+                                         if stats.real_time_factor is not None else None)
+                }
+                for name, stats in self.stats_by_model.items()
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Transcription broker and workers")
+    parser.add_argument("role", choices=["broker", "worker"])
+    parser.add_argument("--address", default=os.getenv("TRANSCRIPTION_BROKER", "127.0.0.1:5600"))
+    args = parser.parse_args()
+
+    from logging_setup import configure_logging
+    configure_logging()
+    authkey = os.getenv("TRANSCRIPTION_BROKER_AUTHKEY", DEFAULT_AUTHKEY.decode()).encode()
+    if args.role == "broker":
+        serve_broker(args.address, authkey)
+    else:
+        run_worker(args.address, authkey)
+
+
+if __name__ == "__main__":
+    main()
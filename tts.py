@@ -0,0 +1,270 @@
+"""
+Text-to-speech for assistant replies, streamed to the browser.
+
+The reply is split into sentences as LLM tokens arrive. Each sentence
+is synthesized on a worker pool while the next tokens are still
+streaming, and the audio goes out in order as 16 kHz pcm_s16le frames on
+the requesting socket ('tts_audio' events). Common phrases are served
+from a cache instead of being synthesized again.
+
+The default engine is pyttsx3, run in worker processes: pyttsx3 keeps
+one engine per process and is not thread-safe. Another engine can be
+plugged in as a `synthesize(text) -> (float32 samples, sample_rate)`
+callable, which then runs on threads.
+"""
+import importlib.util
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from audio_codec import PCM_S16LE, resample
+from cache import TTLCache
+from metrics import record
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_SAMPLE_RATE = 16000
+
+class SentenceChunker:
+    """
+    Accumulates streamed text and releases complete sentences. Long runs
+    without sentence punctuation are split at a clause or word boundary
+    so synthesis can start before the sentence ends.
+    """
+
+    SENTENCE_END = re.compile(r"(?<=[.!?])[\"')\]]*\s+")
+
+    def __init__(self, min_chars: int = 12, max_chars: int = 200):
+        self.min_chars = min_chars  # shorter fragments wait to be joined with the next sentence
+        self.max_chars = max_chars
+        self._pending = ""
+
+    def feed(self, text: str) -> List[str]:
+        self._pending += text
+        sentences = []
+        while True:
+            match = None
+            for candidate in self.SENTENCE_END.finditer(self._pending):
+                if candidate.start() >= self.min_chars:
+                    match = candidate
+                    break
+            if match is not None:
+                sentences.append(self._pending[:match.start()].strip())
+                self._pending = self._pending[match.end():]
+                continue
+            if len(self._pending) > self.max_chars:
+                sentences.append(self._split_long())
+                continue
+            return [s for s in sentences if s]
+
+    def flush(self) -> List[str]:
+        rest, self._pending = self._pending.strip(), ""
+        return [rest] if rest else []
+
+    def _split_long(self) -> str:
+        window = self._pending[:self.max_chars]
+        cut = max(window.rfind(", "), window.rfind("; "), window.rfind(": "))
+        if cut < self.min_chars:
+            cut = window.rfind(" ")
+        if cut < self.min_chars:
+            cut = self.max_chars
+        head, self._pending = self._pending[:cut + 1], self._pending[cut + 1:]
+        return head.strip()
+
+
+_engine = None
+
+
+def _init_pyttsx3_worker():
+    global _engine
+    import pyttsx3
+    _engine = pyttsx3.init()
+
+
+def _pyttsx3_synthesize(text: str):
+    """Render text to a temporary WAV file with this worker's engine and read it back."""
+    import soundfile as sf
+
+    fd, path = tempfile.mkstemp(suffix=".wav")
+    os.close(fd)
+    try:
+        _engine.save_to_file(text, path)
+        _engine.runAndWait()
+        audio, rate = sf.read(path, dtype="float32")
+    finally:
+        os.remove(path)
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
+    return audio, rate
+
+
+def _cache_key(text: str) -> str:
+    # Punctuation changes intonation, so unlike the entity cache only whitespace is normalized
+    return " ".join(text.split())
+
+
+class TTSService:
+    """Synthesizes sentences on a worker pool, with a cache of rendered phrases."""
+
+    def __init__(self, workers: int = 2, synthesize: Optional[Callable] = None,
+                 cache_size: int = 256, cache_ttl: float = 86400.0, frame_ms: int = 200,
+                 enabled: bool = True):
+        self.frame_samples = OUTPUT_SAMPLE_RATE * frame_ms // 1000
+        self.cache = TTLCache(max_entries=cache_size, ttl_seconds=cache_ttl)
+        self.synthesized = 0
+        self.synthesis_seconds = 0.0
+        self._lock = threading.Lock()
+
+        if not enabled:
+            self.available = False
+            self.executor = None
+        elif synthesize is not None:
+            self.available = True
+            self._synthesize = synthesize
+            self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tts")
+        else:
+            self.available = importlib.util.find_spec("pyttsx3") is not None
+            self._synthesize = _pyttsx3_synthesize
+            self.executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_pyttsx3_worker) \
+                if self.available else None
+
+    def synthesize_async(self, text: str) -> Future:
+        """Future for the 16 kHz pcm_s16le rendering of text."""
+        key = _cache_key(text)
+        cached = self.cache.get(key)
+        if cached is not None:
+            future = Future()
+            future.set_result(cached)
+            return future
+
+        started = time.perf_counter()
+        result = Future()
+        job = self.executor.submit(self._synthesize, text)
+
+        def finished(job):
+            try:
+                audio, rate = job.result()
+                pcm = (np.clip(resample(np.asarray(audio, dtype=np.float32), rate, OUTPUT_SAMPLE_RATE),
+                               -1.0, 1.0) * 32767).astype("<i2").tobytes()
+            except Exception as e:
+                result.set_exception(e)
+                return
+            with self._lock:
+                self.synthesized += 1
+                self.synthesis_seconds += time.perf_counter() - started
+            self.cache.set(key, pcm)
+            result.set_result(pcm)
+
+        job.add_done_callback(finished)
+        return result
+
+    def warm(self, phrases):
+        """Synthesize common phrases in the background so they are cached before first use."""
+        if self.available:
+            for phrase in phrases:
+                self.synthesize_async(phrase)
+
+    def open_stream(self, send: Callable[[Dict], None], started_at: Optional[float] = None) -> "TTSStream":
+        """Start streaming one reply; send(frame) delivers each 'tts_audio' payload."""
+        return TTSStream(self, send, started_at)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            synthesized, seconds = self.synthesized, self.synthesis_seconds
+        return {
+            "available": self.available,
+            "synthesized": synthesized,
+            "avg_synthesis_seconds": round(seconds / synthesized, 3) if synthesized else None,
+            "cache": self.cache.stats(),
+        }
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class TTSStream:
+    """
+    One reply being spoken. Sentences are synthesized concurrently but
+    sent strictly in order; the time from `started_at` to the first frame
+    is recorded as the 'tts_first_audio' stage.
+    """
+
+    def __init__(self, service: TTSService, send: Callable[[Dict], None], started_at: Optional[float] = None):
+        self.service = service
+        self.send = send
+        self.started_at = started_at if started_at is not None else time.perf_counter()
+        self.chunker = SentenceChunker()
+        self.first_audio_seconds = None
+        self.done = threading.Event()
+        self._pending: List[Future] = []
+        self._finished = False
+        self._seq = 0
+        self._sentence = 0
+        self._lock = threading.Lock()
+
+    def feed(self, text: str):
+        """Add streamed reply text; complete sentences start synthesizing right away."""
+        for sentence in self.chunker.feed(text):
+            self._enqueue(sentence)
+
+    def finish(self):
+        """No more text is coming. Returns immediately; `done` is set once all audio is sent."""
+        for sentence in self.chunker.flush():
+            self._enqueue(sentence)
+        with self._lock:
+            self._finished = True
+        self._pump()
+
+    def _enqueue(self, sentence: str):
+        future = self.service.synthesize_async(sentence)
+        with self._lock:
+            self._pending.append(future)
+        future.add_done_callback(lambda _: self._pump())
+
+    def _pump(self):
+        """Send every leading sentence whose audio is ready."""
+        with self._lock:
+            while self._pending and self._pending[0].done():
+                future = self._pending.pop(0)
+                sentence = self._sentence
+                self._sentence += 1
+                try:
+                    pcm = future.result()
+                except Exception as e:
+                    logger.warning("Speech synthesis failed for sentence %d: %s", sentence, e)
+                    continue
+                self._send_frames(sentence, pcm)
+
+            if self._finished and not self._pending and not self.done.is_set():
+                self.send({"seq": self._seq, "final": True})
+                self.done.set()
+
+    def _send_frames(self, sentence: int, pcm: bytes):
+        frame_bytes = self.service.frame_samples * 2
+        for offset in range(0, len(pcm), frame_bytes):
+            if self.first_audio_seconds is None:
+                self.first_audio_seconds = time.perf_counter() - self.started_at
+                record("tts_first_audio", self.first_audio_seconds)
+            self.send({
+                "seq": self._seq,
+                "sentence": sentence,
+                "encoding": PCM_S16LE,
+                "sample_rate": OUTPUT_SAMPLE_RATE,
+                "data": pcm[offset:offset + frame_bytes],
+                "final": False,
+            })
+            self._seq += 1
+
+
+def tts_service_from_env() -> TTSService:
+    """TTS_WORKERS synthesis processes; TTS_ENABLED=0 turns speech output off."""
+    return TTSService(workers=int(os.getenv("TTS_WORKERS", "2")),
+                      enabled=os.getenv("TTS_ENABLED", "1") == "1")
@@ -0,0 +1,187 @@
+"""
+Background deletion of everything stored for a user (GDPR erasure).
+
+A job removes the user's entities, interactions and sessions from the
+live database in small batched transactions (see
+database.delete_user_data), their embeddings from the RAG store and
+their transcripts and replies from in-memory caches as each batch goes,
+and finally their sessions from the archive files. Free pages are then
+released so deleted rows don't linger in the file.
+
+Jobs run one at a time on a background thread and can be polled for
+progress. Every step is idempotent, so a failed job can be submitted
+again.
+
+    python user_deletion.py <user_id>
+"""
+import argparse
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from sqlalchemy.orm import sessionmaker
+
+from archive import DEFAULT_ARCHIVE_DIR, incremental_vacuum, purge_user_sessions
+from database import count_user_data, delete_user_data, get_user_sessions, init_db
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class DeletionJob:
+    """
+    One user's deletion. progress() can be polled from any thread.
+    forget_cached(session_ids, texts), if given, drops cache entries that
+    came from the user's sessions or transcripts and returns how many.
+    """
+
+    def __init__(self, user_id: str, session_factory: sessionmaker, rag=None,
+                 archive_dir: Optional[str] = None, batch_size: int = 500, pause: float = 0.01,
+                 forget_cached: Optional[Callable[[Iterable[int], Iterable[str]], int]] = None):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.session_factory = session_factory
+        self.rag = rag
+        self.forget_cached = forget_cached
+        self.archive_dir = archive_dir
+        self.batch_size = batch_size
+        self.pause = pause  # seconds between batches, so other writers get the lock
+
+        self.state = QUEUED
+        self.error: Optional[str] = None
+        self.expected: Dict[str, int] = {}
+        self.deleted = {"sessions": 0, "interactions": 0, "entities": 0, "embeddings": 0,
+                        "cache_entries": 0, "archived_sessions": 0}
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def run(self):
+        self.started_at = time.time()
+        self.state = RUNNING
+        try:
+            self.expected = count_user_data(self.session_factory, self.user_id)
+            session_ids = [s.id for s in get_user_sessions(self.session_factory, self.user_id)]
+            delete_user_data(
+                self.session_factory, self.user_id,
+                batch_size=self.batch_size,
+                pause=self.pause,
+                on_interactions=self._delete_embeddings if self.rag is not None else None,
+                on_transcripts=self._forget_texts if self.forget_cached is not None else None,
+                on_progress=self._update
+            )
+            if self.forget_cached is not None:
+                self._forget(self.forget_cached(session_ids, ()))
+            if self.archive_dir:
+                archived = purge_user_sessions(self.archive_dir, self.user_id)
+                with self._lock:
+                    self.deleted["archived_sessions"] = archived
+            incremental_vacuum(self.session_factory)
+            self.state = DONE
+        except Exception as e:
+            self.error = str(e)
+            self.state = FAILED
+            logger.exception("User deletion job %s failed", self.id)
+        finally:
+            self.finished_at = time.time()
+        logger.info("User deletion job %s %s: %s", self.id, self.state, self.deleted)
+
+    def _delete_embeddings(self, interaction_ids):
+        removed = self.rag.delete_interactions(interaction_ids)
+        with self._lock:
+            self.deleted["embeddings"] += removed
+
+    def _forget_texts(self, texts):
+        self._forget(self.forget_cached((), texts))
+
+    def _forget(self, removed: int):
+        with self._lock:
+            self.deleted["cache_entries"] += removed
+
+    def _update(self, counts: Dict[str, int]):
+        with self._lock:
+            self.deleted.update(counts)
+
+    def progress(self) -> Dict[str, Any]:
+        with self._lock:
+            deleted = dict(self.deleted)
+        expected = self.expected.get("interactions", 0) + self.expected.get("sessions", 0)
+        done = deleted["interactions"] + deleted["sessions"]
+        return {
+            "id": self.id,
+            "state": self.state,
+            "deleted": deleted,
+            "expected": dict(self.expected),
+            "percent": 100.0 if self.state == DONE else round(100.0 * done / expected, 1) if expected else 0.0,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+        }
+
+
+class DeletionJobs:
+    """
+    Runs deletion jobs one at a time on a background thread. Running them
+    serially keeps batches from competing with each other for SQLite's
+    write lock; live traffic gets the lock between batches.
+    """
+
+    def __init__(self, session_factory: sessionmaker, rag=None, archive_dir: Optional[str] = None,
+                 batch_size: int = 500, pause: float = 0.01,
+                 forget_cached: Optional[Callable[[Iterable[int], Iterable[str]], int]] = None):
+        self.session_factory = session_factory
+        self.rag = rag
+        self.forget_cached = forget_cached
+        self.archive_dir = archive_dir
+        self.batch_size = batch_size
+        self.pause = pause
+        self.jobs: Dict[str, DeletionJob] = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="user-deletion")
+        self._lock = threading.Lock()
+
+    def submit(self, user_id: str) -> DeletionJob:
+        """Queue a deletion, or return the one already pending for this user."""
+        with self._lock:
+            for job in self.jobs.values():
+                if job.user_id == user_id and job.state in (QUEUED, RUNNING):
+                    return job
+            job = DeletionJob(user_id, self.session_factory, self.rag, self.archive_dir,
+                              self.batch_size, self.pause, self.forget_cached)
+            self.jobs[job.id] = job
+        self._executor.submit(job.run)
+        return job
+
+    def get(self, job_id: str) -> Optional[DeletionJob]:
+        with self._lock:
+            return self.jobs.get(job_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Delete everything stored for a user")
+    parser.add_argument("user_id")
+    parser.add_argument("--db", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "speech_app.db"))
+    parser.add_argument("--archive-dir", default=os.getenv("ARCHIVE_DIR", DEFAULT_ARCHIVE_DIR))
+    parser.add_argument("--rag-db", help="also delete embeddings from this RAG database")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    from logging_setup import configure_logging
+    configure_logging()
+    rag = None
+    if args.rag_db:
+        from rag import RAG
+        rag = RAG(args.rag_db)
+    job = DeletionJob(args.user_id, init_db(args.db), rag, args.archive_dir, args.batch_size, pause=0)
+    job.run()
+    logger.info("Deletion finished: %s", job.progress())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import numpy as np
+
+
+class VoiceActivityDetector:
+    """
+    Frame-level voice activity detector.
+
+    Audio is cut into short frames (20 ms by default) and each frame is
+    classified from its log energy and spectral flatness against an
+    adaptive noise floor. Stationary background noise raises the floor
+    instead of being mistaken for speech, and quiet speakers still
+    trigger as long as they are clearly above the room's own level.
+    """
+
+    def __init__(
+            self,
+            sample_rate: int = 16000,
+            frame_ms: int = 20,
+            margin_db: float = 9.0,
+            min_energy_db: float = -60.0,
+            initial_floor_db: float = -50.0,
+            max_flatness: float = 0.7,
+            onset_frames: int = 3,
+            hangover_frames: int = 8,
+            noise_adapt_rate: float = 0.05
+    ):
+        self.sample_rate = sample_rate
+        self.frame_size = int(sample_rate * frame_ms / 1000)
+        self.margin_db = margin_db            # dB above the noise floor that counts as speech
+        self.min_energy_db = min_energy_db    # absolute floor, below this is always silence
+        self.initial_floor_db = initial_floor_db  # cap on the first noise estimate
+        self.max_flatness = max_flatness      # noise is spectrally flat, voiced speech is not
+        self.onset_frames = onset_frames      # consecutive speech frames needed to start
+        self.hangover_frames = hangover_frames  # frames to stay "in speech" after it drops
+        self.noise_adapt_rate = noise_adapt_rate
+
+        self._window = np.hanning(self.frame_size).astype(np.float32)
+        self.reset()
+
+    def reset(self):
+        """Forget the noise estimate and any partial frame."""
+        self.noise_floor_db = None
+        self._remainder = np.zeros(0, dtype=np.float32)
+        self._onset = 0
+        self._hangover = 0
+        self.in_speech = False
+
+    def frame_features(self, frames: np.ndarray):
+        """Return (energy_db, spectral_flatness) for a 2-D array of frames."""
+        energy = np.mean(frames * frames, axis=1)
+        energy_db = 10.0 * np.log10(energy + 1e-12)
+
+        spectrum = np.abs(np.fft.rfft(frames * self._window, axis=1)) + 1e-10
+        geometric_mean = np.exp(np.mean(np.log(spectrum), axis=1))
+        flatness = geometric_mean / np.mean(spectrum, axis=1)
+        return energy_db, flatness
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        """
+        Classify every complete frame in samples (plus any carry-over from
+        the previous call). Returns one boolean per frame; leftover samples
+        that don't fill a frame are kept for the next call.
+        """
+        samples = np.concatenate([self._remainder, samples.astype(np.float32, copy=False)])
+        n_frames = len(samples) // self.frame_size
+        self._remainder = samples[n_frames * self.frame_size:]
+        if n_frames == 0:
+            return np.zeros(0, dtype=bool)
+
+        frames = samples[:n_frames * self.frame_size].reshape(n_frames, self.frame_size)
+        energy_db, flatness = self.frame_features(frames)
+
+        decisions = np.zeros(n_frames, dtype=bool)
+        for i in range(n_frames):
+            decisions[i] = self._update(energy_db[i], flatness[i])
+        return decisions
+
+    def _update(self, energy_db: float, flatness: float) -> bool:
+        if self.noise_floor_db is None:
+            # Capped so a stream that starts mid-word doesn't take speech as the floor
+            self.noise_floor_db = min(energy_db, self.initial_floor_db)
+
+        above_floor = energy_db - self.noise_floor_db
+        candidate = energy_db > self.min_energy_db and (
+            (above_floor > self.margin_db and flatness < self.max_flatness)
+            # Loud enough that even flat (fricative) frames count
+            or above_floor > 2 * self.margin_db
+        )
+
+        if candidate:
+            if flatness >= self.max_flatness:
+                # A sudden jump in flat noise (fan, traffic) passes the loudness
+                # test, so keep nudging the floor up until it stops doing so
+                self.noise_floor_db += self.noise_adapt_rate * (energy_db - self.noise_floor_db)
+            self._onset += 1
+            if self._onset >= self.onset_frames:
+                self.in_speech = True
+                self._hangover = self.hangover_frames
+        else:
+            self._onset = 0
+            if self._hangover > 0:
+                self._hangover -= 1
+            else:
+                self.in_speech = False
+
+            # Track the noise floor only on non-speech frames. Drop quickly
+            # when the room gets quieter, rise slowly when it gets louder.
+            if energy_db < self.noise_floor_db:
+                self.noise_floor_db = energy_db
+            elif not self.in_speech:
+                self.noise_floor_db += self.noise_adapt_rate * (energy_db - self.noise_floor_db)
+            # Digital silence shouldn't drag the floor so low that any hiss reads as speech
+            self.noise_floor_db = max(self.noise_floor_db, self.min_energy_db - self.margin_db)
+
+        return self.in_speech
+
+    @property
+    def pending_samples(self) -> int:
+        """Samples received but not yet classified (less than one frame)."""
+        return len(self._remainder)